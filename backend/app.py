@@ -1,24 +1,34 @@
-from flask import Flask, request, render_template, redirect, session, url_for, flash, jsonify
+from flask import Flask, request, render_template, redirect, session, url_for, flash, jsonify, Response, stream_with_context
 from flask_cors import CORS  
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from preprocess import preprocess_pt  
-from gemini_client import classify_email_gemini, generate_reply_gemini  
-from utils import extract_email_text
+from preprocess import preprocess_batch, preprocess_pt, preload, status_carregamento  
+from classifier import aprender_edicao, classificar_e_responder, iterar_classificacoes
+from classification_cache import classification_cache
+from reply_cache import reply_cache
+from gemini_resilience import GeminiIndisponivel, estatisticas as estatisticas_gemini
+from utils import ArquivoInvalido, extract_email_text
+from inbox import iterar_mensagens
+from inbox_sync import adicionar_sem_duplicar, avancar_marca, baixar_novas
 from models import EmailRecord
 from models import User  
+from models import InboxJob
+from models import OutboundEmail
+from jobs import submeter_job_inbox
+from outbox import enfileirar_email, garantir_workers, notificar
+from local_classifier import treinar_do_historico
+from smtp_pool import smtp_pool, validar_credenciais
+from imap_pool import imap_pool
+from similarity import DISTANCIA_MAXIMA_INDEXAVEL, indexar_pendentes, similares_do_registro
 from database import db
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import json
 import os
-import smtplib
 import secrets
 from dotenv import load_dotenv
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from bs4 import BeautifulSoup
-import imaplib
-import email
 
 # Carrega variáveis de ambiente do .env
 load_dotenv()
@@ -39,16 +49,64 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
 db.init_app(app)
 migrate = Migrate(app, db)
 
-# Configurar CORS para produção
-CORS(app, origins=[
+# Configurar CORS para produção (as mesmas origens valem para as rotas assíncronas de asgi.py)
+ORIGENS_CORS = [
     "http://localhost:3000",  # Desenvolvimento local
     "https://email-classifier-backend-9s0r.onrender.com", # URL do backend em Produção (Não implemetado ainda)
     "*"  
-], supports_credentials=True)
+]
+CORS(app, origins=ORIGENS_CORS, supports_credentials=True, expose_headers=["X-Next-Cursor"])
+
+# Modo de chamada ao Gemini: "separado" (classificação + resposta) ou "combinado" (uma chamada)
+app.config['GEMINI_MODE'] = os.getenv('GEMINI_MODE', 'separado')
+
+# Máximo de emails (textos + arquivos) aceitos por requisição em /api/classify/batch
+BATCH_MAX_EMAILS = int(os.getenv('BATCH_MAX_EMAILS', 100))
+# Arquivos do lote extraídos em threads. Só há processo separado por PDF com PDF_TIMEOUT > 0 (utils.py);
+# com o padrão (0), o pdfminer roda nestas threads sob o GIL e o ganho fica na leitura/gravação dos uploads
+BATCH_EXTRACT_WORKERS = int(os.getenv('BATCH_EXTRACT_WORKERS', 4))
+
+# Carrega os modelos de NLP já na importação quando solicitado (ex.: gunicorn com preload_app)
+if os.getenv('PRELOAD_NLP', 'false').lower() == 'true':
+    preload()
+
+# Paginação de /api/respostas
+RESPOSTAS_PAGE_SIZE = int(os.getenv('RESPOSTAS_PAGE_SIZE', 50))
+RESPOSTAS_MAX_PAGE_SIZE = int(os.getenv('RESPOSTAS_MAX_PAGE_SIZE', 200))
+
+# Campos que podem ser projetados na listagem de respostas
+CAMPOS_RESPOSTA = {
+    "id": EmailRecord.id,
+    "email_content": EmailRecord.email_text,
+    "suggested_response": EmailRecord.suggested_response,
+    "category": EmailRecord.classification,
+    "confidence": EmailRecord.confidence,
+    "created_at": EmailRecord.created_at,
+}
+CAMPOS_RESPOSTA_PADRAO = ["id", "email_content", "suggested_response", "category", "confidence"]
+
+def reaproveitar_edicao(registro):
+    """Ensina ao cache de respostas a versão editada pelo usuário; falhas não impedem a edição."""
+    try:
+        usuario = User.query.get(registro.user_id)
+        aprender_edicao(registro.classification, preprocess_pt(registro.email_text), registro.email_text,
+                        usuario.nome, registro.suggested_response, registro.user_id)
+    except Exception as e:
+        print(f"Erro ao atualizar cache de respostas: {str(e)}")
 
 # Define a chave secreta para uso de mensagens flash
 app.secret_key = os.environ.get("SECRET_KEY", "secret_key_fallback")
 
+# Sessões SMTP/IMAP livres são encerradas (QUIT/LOGOUT) quando o processo termina
+atexit.register(smtp_pool.fechar_todas)
+atexit.register(imap_pool.fechar_todas)
+
+@app.before_request
+def iniciar_outbox():
+    # Os workers da outbox são iniciados no próprio processo que atende as requisições
+    # (após o fork, quando o servidor usa preload_app)
+    garantir_workers(app)
+
 @app.route("/", methods=["GET"])
 def home():
     """Endpoint de teste para verificar se a API está funcionando"""
@@ -61,7 +119,22 @@ def home():
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check para monitoramento"""
-    return jsonify({"status": "healthy"}), 200
+    return jsonify({"status": "healthy", "nlp": status_carregamento()}), 200
+
+@app.route("/api/cache/stats", methods=["GET"])
+def cache_stats():
+    """Estatísticas dos caches de classificação e de respostas (hits, misses e ocupação)"""
+    return jsonify({**classification_cache.estatisticas(), "respostas": reply_cache.estatisticas()}), 200
+
+@app.route("/api/pools/stats", methods=["GET"])
+def pools_stats():
+    """Uso dos pools de sessões SMTP e IMAP deste processo (abertas, livres, em uso, reaproveitadas)"""
+    return jsonify({"smtp": smtp_pool.estatisticas(), "imap": imap_pool.estatisticas()}), 200
+
+@app.route("/api/gemini/stats", methods=["GET"])
+def gemini_stats():
+    """Estado do circuit breaker e métricas das chamadas ao Gemini (sucessos, falhas, retentativas)"""
+    return jsonify(estatisticas_gemini()), 200
 
 @app.route("/api/register", methods=["POST"])
 def register():
@@ -80,13 +153,7 @@ def register():
 
     # Valida as credenciais SMTP (teste de login)
     try:
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(email, smtp_password)  # tenta logar com e-mail + smtp_password
-        server.quit()
+        validar_credenciais(email, smtp_password)  # tenta logar com e-mail + smtp_password
     except Exception as e:
         print(f"Erro SMTP: {e}")
         return jsonify({"error": "Falha ao validar credenciais SMTP. Verifique sua senha de aplicativo."}), 401
@@ -133,7 +200,10 @@ def classify_api():
         # Verifica se um arquivo foi enviado
         if 'file' in request.files and request.files['file'].filename != "":
             file = request.files['file']
-            texto_original = extract_email_text(file)
+            try:
+                texto_original = extract_email_text(file)
+            except ArquivoInvalido as e:
+                return jsonify({"error": str(e)}), 400
         # Senão, pega o texto do formulário
         elif 'email_text' in request.form:
             texto_original = request.form.get('email_text', '')
@@ -148,12 +218,6 @@ def classify_api():
                 "error": "Por favor, insira o texto do email ou faça o upload de um arquivo."
             }), 400
 
-        # Pré-processa o texto do email
-        texto_limpo = preprocess_pt(texto_original)
-        
-        # Classifica o email usando o modelo Gemini
-        categoria = classify_email_gemini(texto_limpo)
-        
         user_id = session.get("user_id")
         if not user_id:
             return jsonify({"error": "Usuário não autenticado"}), 401
@@ -163,22 +227,21 @@ def classify_api():
             return jsonify({"error": "Usuário não encontrado"}), 404
 
         remetente = usuario.nome
+
+        # Pré-processa o texto do email
+        texto_limpo = preprocess_pt(texto_original)
         
-        # Gera uma resposta automática baseada na classificação
-        resposta = generate_reply_gemini(categoria, texto_original, remetente)
-        
-        if any(palavra in texto_original.lower() for palavra in ["suporte", "reclamação", "solicitação", "feliz", "projeto", "prazo", "parabéns", "urgente"]):
-            confidence = 0.90
-        elif len(texto_original.split()) > 100:
-            confidence = 0.85
-        else:
-            confidence = 0.75
+        # Classifica o email e gera a resposta automática (cache + Gemini, conforme GEMINI_MODE)
+        # A confiança vem do próprio classificador (logprobs do Gemini ou probabilidade do modelo local)
+        categoria, resposta, confidence = classificar_e_responder(texto_limpo, texto_original, remetente, usuario.id)
         
         # Persistência no banco
         record = EmailRecord(
+            user_id=usuario.id,
             email_text=texto_original,
             classification=categoria,
-            suggested_response=resposta
+            suggested_response=resposta,
+            confidence=confidence
         )
         db.session.add(record)
         db.session.commit()
@@ -192,6 +255,10 @@ def classify_api():
             "email_content": texto_original
         })
         
+    except GeminiIndisponivel as e:
+        print(f"Gemini indisponível na classificação: {str(e)}")
+        return jsonify({"error": "Serviço de IA temporariamente indisponível. Tente novamente em instantes."}), 503
+
     except Exception as e:
         # Log do erro para debugging
         print(f"Erro na classificação: {str(e)}")
@@ -199,6 +266,121 @@ def classify_api():
             "error": f"Erro interno do servidor: {str(e)}"
         }), 500
 
+def _ler_arquivo_do_lote(file):
+    """Extrai o texto de um arquivo do lote. Retorna (texto, erro)."""
+    try:
+        texto = extract_email_text(file)
+    except ArquivoInvalido as e:
+        return None, str(e)
+    except Exception as e:
+        print(f"Erro ao extrair o arquivo {file.filename}: {str(e)}")
+        return None, "Falha ao ler o arquivo"
+    if not texto.strip():
+        return None, "Arquivo vazio ou em formato não suportado (use .txt, .eml ou .pdf)"
+    return texto, None
+
+def _entradas_do_lote():
+    """
+    Lê os itens de /api/classify/batch, em um de dois formatos:
+    - JSON: array de textos (ou de objetos {"email_text": ...}), solto ou em {"emails": [...]};
+    - multipart: textos em "email_text" e arquivos em "files" (ou "file"), ambos repetíveis;
+      os textos vêm antes dos arquivos na numeração dos itens.
+    Retorna uma lista de dicts com "texto" ou "erro" (e "filename" para arquivos), ou None se
+    a requisição não tiver nenhum item.
+    """
+    if request.files or request.form:
+        entradas = [{"texto": texto} for texto in request.form.getlist("email_text")]
+        arquivos = [f for f in request.files.getlist("files") + request.files.getlist("file") if f.filename]
+        if len(entradas) + len(arquivos) > BATCH_MAX_EMAILS:
+            # Não extrai nada de uma requisição que será recusada
+            return entradas + [{"filename": f.filename} for f in arquivos]
+        if arquivos:
+            with ThreadPoolExecutor(max_workers=max(1, min(BATCH_EXTRACT_WORKERS, len(arquivos)))) as pool:
+                for file, (texto, erro) in zip(arquivos, pool.map(_ler_arquivo_do_lote, arquivos)):
+                    entradas.append({"filename": file.filename, "texto": texto, "erro": erro})
+        return entradas or None
+
+    data = request.get_json(silent=True)
+    emails = data if isinstance(data, list) else data.get("emails") if isinstance(data, dict) else None
+    if not isinstance(emails, list) or not emails:
+        return None
+    return [{"texto": item.get("email_text") if isinstance(item, dict) else item} for item in emails]
+
+@app.route("/api/classify/batch", methods=["POST"])
+def classify_batch_api():
+    """
+    Classifica vários emails em uma requisição: array JSON de textos ou upload de vários arquivos
+    (ver _entradas_do_lote). Todos os itens passam pelo mesmo pipeline — pré-processamento em lote,
+    classificação em lote no Gemini e respostas com concorrência limitada — e os registros são
+    gravados juntos, com um único commit. Cada item do resultado traz o índice de entrada e os
+    dados da classificação ou o erro daquele item.
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    entradas = _entradas_do_lote()
+    if not entradas:
+        return jsonify({"error": "Envie uma lista de emails ou arquivos"}), 400
+    if len(entradas) > BATCH_MAX_EMAILS:
+        return jsonify({"error": f"Máximo de {BATCH_MAX_EMAILS} emails por requisição"}), 400
+
+    usuario = User.query.get(user_id)
+    if not usuario:
+        return jsonify({"error": "Usuário não encontrado"}), 404
+
+    try:
+        resultados = [None] * len(entradas)
+        validos = []
+        for indice, entrada in enumerate(entradas):
+            base = {"index": indice}
+            if "filename" in entrada:
+                base["filename"] = entrada["filename"]
+            resultados[indice] = base
+
+            texto = entrada.get("texto")
+            if entrada.get("erro"):
+                base["error"] = entrada["erro"]
+            elif not isinstance(texto, str) or not texto.strip():
+                base["error"] = "Texto do email vazio ou inválido"
+            else:
+                validos.append(indice)
+
+        textos = [entradas[i]["texto"] for i in validos]
+        itens = list(zip(textos, preprocess_batch(textos)))
+        registros = {}
+        for posicao, categoria, resposta, confianca, erro in iterar_classificacoes(itens, usuario.nome, app, usuario.id):
+            indice = validos[posicao]
+            if erro is not None:
+                resultados[indice]["error"] = str(erro)
+                continue
+            registros[indice] = EmailRecord(
+                user_id=usuario.id,
+                email_text=textos[posicao],
+                classification=categoria,
+                suggested_response=resposta,
+                confidence=confianca
+            )
+
+        # Todos os registros em um único flush (INSERT em lote) e um único commit
+        db.session.add_all(registros.values())
+        db.session.commit()
+
+        for indice, registro in registros.items():
+            resultados[indice].update({
+                "id": registro.id,
+                "category": registro.classification,
+                "confidence": registro.confidence,
+                "suggested_response": registro.suggested_response
+            })
+
+        return jsonify({"resultados": resultados}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro na classificação em lote: {str(e)}")
+        return jsonify({"error": f"Erro interno do servidor: {str(e)}"}), 500
+
 @app.route("/api/respostas/<int:id>", methods=["PUT"])
 def atualizar_resposta(id):
     try:
@@ -209,21 +391,27 @@ def atualizar_resposta(id):
         if not nova_resposta:
             return jsonify({"error": "Campo 'suggested_response' é obrigatório"}), 400
 
-        # Busca o registro pelo ID
-        registro = EmailRecord.query.get(id)
+        user_id = session.get("user_id")
+        if not user_id:
+            return jsonify({"error": "Usuário não autenticado"}), 401
+
+        # Busca o registro pelo ID, entre os do usuário logado
+        registro = EmailRecord.query.filter_by(id=id, user_id=user_id).first()
         if not registro:
             return jsonify({"error": "Registro não encontrado"}), 404
 
         # Atualiza a resposta sugerida
         registro.suggested_response = nova_resposta
+        registro.edited = True
         db.session.commit()
+        reaproveitar_edicao(registro)
 
         return jsonify({
             "message": "Resposta atualizada com sucesso",
             "id": registro.id,
             "email_content": registro.email_text,
             "category": registro.classification,
-            "confidence": data.get("confidence"),  
+            "confidence": registro.confidence,
             "suggested_response": registro.suggested_response
         }), 200
 
@@ -233,31 +421,113 @@ def atualizar_resposta(id):
 
 @app.route("/api/respostas", methods=["GET"])
 def listar_respostas():
-    '''Endpoint para listar todas as respostas sugeridas armazenadas no banco de dados.'''
+    '''
+    Endpoint para listar as respostas sugeridas do usuário logado, da mais recente para a mais antiga, com paginação por cursor.
+    Parâmetros opcionais: limit, cursor (id do último item da página anterior), fields (campos separados
+    por vírgula), category, since e until (datas ISO). O cursor da próxima página vem no header X-Next-Cursor.
+    '''
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    try:
+        limite = min(max(int(request.args.get("limit", RESPOSTAS_PAGE_SIZE)), 1), RESPOSTAS_MAX_PAGE_SIZE)
+        cursor = request.args.get("cursor", type=int)
+        since = request.args.get("since")
+        until = request.args.get("until")
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+    except ValueError:
+        return jsonify({"error": "Parâmetros de paginação ou data inválidos"}), 400
+
+    campos = request.args.get("fields")
+    campos = [c.strip() for c in campos.split(",") if c.strip()] if campos else list(CAMPOS_RESPOSTA_PADRAO)
+    invalidos = [c for c in campos if c not in CAMPOS_RESPOSTA]
+    if invalidos:
+        return jsonify({"error": f"Campos inválidos: {', '.join(invalidos)}"}), 400
+    # O id é sempre retornado, pois é a chave do cursor
+    if "id" not in campos:
+        campos.insert(0, "id")
+
     try:
-        # Objeto para receber todos 
-        registros = EmailRecord.query.order_by(EmailRecord.id.desc()).all()
-
-        dados = [
-            {
-                "id": r.id,
-                "email_content": r.email_text,
-                "suggested_response": r.suggested_response,
-                "category": r.classification,
-            }
-            for r in registros
-        ]
-        return jsonify(dados), 200
+        # Projeção: só as colunas pedidas saem do banco (listas podem omitir os corpos grandes)
+        consulta = db.session.query(*[CAMPOS_RESPOSTA[c] for c in campos]).filter(EmailRecord.user_id == user_id)
+        if cursor is not None:
+            consulta = consulta.filter(EmailRecord.id < cursor)
+        if request.args.get("category"):
+            consulta = consulta.filter(EmailRecord.classification == request.args["category"])
+        if since:
+            consulta = consulta.filter(EmailRecord.created_at >= since)
+        if until:
+            consulta = consulta.filter(EmailRecord.created_at < until)
+
+        # Busca um item a mais para saber se existe próxima página
+        linhas = consulta.order_by(EmailRecord.id.desc()).limit(limite + 1).all()
+        tem_mais = len(linhas) > limite
+        linhas = linhas[:limite]
+
+        dados = []
+        for linha in linhas:
+            item = dict(zip(campos, linha))
+            if item.get("created_at"):
+                item["created_at"] = item["created_at"].isoformat()
+            dados.append(item)
+
+        resposta = jsonify(dados)
+        if tem_mais:
+            resposta.headers["X-Next-Cursor"] = str(dados[-1]["id"])
+        return resposta, 200
 
     except Exception as e:
         print(f"Erro ao buscar respostas: {str(e)}")
         return jsonify({"error": "Erro ao buscar respostas"}), 500
 
+@app.route("/api/respostas/<int:id>/similares", methods=["GET"])
+def listar_similares(id):
+    '''
+    Endpoint para listar os emails do usuário quase idênticos ao email informado (índice SimHash),
+    do mais parecido ao menos. Parâmetros opcionais: limit e max_distance (em bits, até 3).
+    '''
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    try:
+        limite = min(max(int(request.args.get("limit", 10)), 1), RESPOSTAS_MAX_PAGE_SIZE)
+        max_distancia = min(max(int(request.args.get("max_distance", DISTANCIA_MAXIMA_INDEXAVEL)), 0),
+                            DISTANCIA_MAXIMA_INDEXAVEL)
+    except ValueError:
+        return jsonify({"error": "Parâmetros inválidos"}), 400
+
+    registro = EmailRecord.query.filter_by(id=id, user_id=user_id).first()
+    if not registro:
+        return jsonify({"error": "Registro não encontrado"}), 404
+
+    try:
+        encontrados = similares_do_registro(registro, max_distancia, limite)
+        registros = {r.id: r for r in EmailRecord.query.filter(EmailRecord.id.in_([i for i, _ in encontrados]))}
+        return jsonify([{
+            "id": registro_id,
+            "distance": distancia,
+            "email_content": registros[registro_id].email_text,
+            "category": registros[registro_id].classification,
+            "suggested_response": registros[registro_id].suggested_response,
+            "created_at": registros[registro_id].created_at.isoformat(),
+        } for registro_id, distancia in encontrados]), 200
+
+    except Exception as e:
+        print(f"Erro ao buscar emails similares: {str(e)}")
+        return jsonify({"error": "Erro ao buscar emails similares"}), 500
+
 @app.route("/api/respostas/<int:id>", methods=["DELETE"])
 def deletar_resposta(id):
     '''Endpoint para deletar uma resposta sugerida pelo ID.'''
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
     try:
-        registro = EmailRecord.query.get(id)
+        registro = EmailRecord.query.filter_by(id=id, user_id=user_id).first()
 
         if not registro:
             return jsonify({"error": "Registro não encontrado"}), 404
@@ -273,9 +543,13 @@ def deletar_resposta(id):
 
 @app.route("/api/respostas", methods=["DELETE"])
 def deletar_respostas():
-    '''Endpoint para deletar todas as respostas sugeridas.'''
+    '''Endpoint para deletar todas as respostas sugeridas do usuário logado.'''
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
     try:
-        EmailRecord.query.delete()
+        EmailRecord.query.filter_by(user_id=user_id).delete()
         db.session.commit()
         return jsonify({"message": "Todas as respostas deletadas com sucesso"}), 200
 
@@ -304,38 +578,91 @@ def send_email():
     if not user:
         return jsonify({"error": "Usuário não encontrado"}), 404
 
-    smtp_user = user.email
-    smtp_password = user.smtp_password
-
     # Busca a resposta no banco
-    resposta = EmailRecord.query.get(response_id)
+    resposta = EmailRecord.query.filter_by(id=response_id, user_id=user.id).first()
     if not resposta:
         return jsonify({"error": "Resposta sugerida não encontrada"}), 404
 
-    body = resposta.suggested_response
+    try:
+        # Só grava na outbox; o envio acontece em background, com retentativas
+        mensagem = enfileirar_email(user.email, to, subject, resposta.suggested_response, user_id=user.id)
 
-    # Envio de e-mail usando SMTP Gmail
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
+        return jsonify({
+            "message": "E-mail enfileirado para envio",
+            "id": mensagem.id,
+            "status_url": url_for("status_envio", id=mensagem.id)
+        }), 202
 
-    try:
-        msg = MIMEMultipart()
-        msg["From"] = smtp_user
-        msg["To"] = to
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain"))
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao enfileirar e-mail: {str(e)}")
+        return jsonify({"error": "Erro ao enfileirar e-mail"}), 500
+
+@app.route("/api/send-email/bulk", methods=["POST"])
+def send_email_bulk():
+    '''
+    Endpoint para enviar várias respostas armazenadas em uma única sessão SMTP autenticada.
+    Recebe {"envios": [{"to", "subject", "response_id"}, ...]} e retorna o resultado de cada envio.
+    '''
+    data = request.get_json() or {}
+    envios = data.get("envios")
+
+    if not isinstance(envios, list) or not envios:
+        return jsonify({"error": "Parâmetros faltando"}), 400
 
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_user, smtp_password)
-        server.sendmail(smtp_user, to, msg.as_string())
-        server.quit()
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "Usuário não encontrado"}), 404
 
-        return jsonify({"message": "E-mail enviado com sucesso!"}), 200
+    # Carrega todas as respostas do usuário em uma única consulta
+    ids = [e.get("response_id") for e in envios if isinstance(e, dict)]
+    respostas = {r.id: r for r in EmailRecord.query.filter(EmailRecord.id.in_(ids), EmailRecord.user_id == user.id)}
+
+    resultados = [None] * len(envios)
+    enfileiradas = []
+    for indice, envio in enumerate(envios):
+        if not isinstance(envio, dict) or not envio.get("to") or not envio.get("subject"):
+            resultados[indice] = {"index": indice, "error": "Parâmetros faltando"}
+            continue
+        resposta = respostas.get(envio.get("response_id"))
+        if not resposta:
+            resultados[indice] = {"index": indice, "error": "Resposta sugerida não encontrada"}
+            continue
+        mensagem = enfileirar_email(user.email, envio["to"], envio["subject"], resposta.suggested_response,
+                                    user_id=user.id, commit=False)
+        enfileiradas.append((indice, mensagem))
 
+    try:
+        # Todas as mensagens entram na outbox em uma única transação; o worker as envia
+        # pela mesma sessão SMTP da conta
+        db.session.commit()
+        notificar()
     except Exception as e:
-        print(f"Erro ao enviar e-mail: {str(e)}")
-        return jsonify({"error": "Erro ao enviar e-mail"}), 500
+        db.session.rollback()
+        print(f"Erro ao enfileirar e-mails em lote: {str(e)}")
+        return jsonify({"error": "Erro ao enfileirar e-mails"}), 500
+
+    for indice, mensagem in enfileiradas:
+        resultados[indice] = {"index": indice, "id": mensagem.id, "message": "E-mail enfileirado para envio"}
+
+    return jsonify({"message": f"{len(enfileiradas)} de {len(envios)} e-mails enfileirados", "resultados": resultados}), 202
+
+@app.route("/api/outbox/<int:id>", methods=["GET"])
+def status_envio(id):
+    """Retorna o estado de um e-mail da outbox (pendente, enviando, enviado ou falhou)."""
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    mensagem = OutboundEmail.query.filter_by(id=id, user_id=user_id).first()
+    if not mensagem:
+        return jsonify({"error": "E-mail não encontrado"}), 404
+
+    return jsonify(mensagem.to_dict()), 200
 
 @app.route("/api/recuperar", methods=["POST"])
 def recuperar_senha():
@@ -356,30 +683,19 @@ def recuperar_senha():
     # Link de recuperação
     link = f"http://localhost:3000/resetar-senha?token={token}"
 
-    # Dados do remetente fixo
-    smtp_sender_email = os.getenv("SMTP_SENDER_EMAIL") 
-    smtp_sender_password = os.getenv("SMTP_SENDER_PASSWORD")
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
-
     try:
-        msg = MIMEMultipart()
-        msg["From"] = smtp_sender_email
-        msg["To"] = email
-        msg["Subject"] = "Recuperação de Senha - Classificador de Emails"
-        msg.attach(MIMEText(
+        # Enviado em background pela conta fixa do sistema (SMTP_SENDER_EMAIL)
+        enfileirar_email(
+            os.getenv("SMTP_SENDER_EMAIL"), email,
+            "Recuperação de Senha - Classificador de Emails",
             f"Olá,\n\nClique no link abaixo para redefinir sua senha:\n\n{link}\n\n"
-            "Esse link expira em 1 hora.\n\nEquipe AutoU.", "plain"))
-
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_sender_email, smtp_sender_password)
-        server.sendmail(smtp_sender_email, email, msg.as_string())
-        server.quit()
+            "Esse link expira em 1 hora.\n\nEquipe AutoU."
+        )
 
         return jsonify({"message": "Email de recuperação enviado com sucesso!"}), 200
 
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": f"Erro ao enviar o email: {str(e)}"}), 500
 
 @app.route("/api/resetar-senha", methods=["POST"])
@@ -417,20 +733,29 @@ def editar_resposta(id):
     if not nova_resposta:
         return jsonify({"error": "A nova resposta não foi fornecida."}), 400
 
-    email_record = EmailRecord.query.get(id)
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    email_record = EmailRecord.query.filter_by(id=id, user_id=user_id).first()
 
     if not email_record:
         return jsonify({"error": "Resposta sugerida não encontrada."}), 404
 
     email_record.suggested_response = nova_resposta
+    email_record.edited = True
     db.session.commit()
 
+    # A edição passa a ser a resposta de emails equivalentes do mesmo remetente
+    reaproveitar_edicao(email_record)
+
     return jsonify({"message": "Resposta atualizada com sucesso!"}), 200
 
 @app.route("/api/classificar-inbox", methods=["POST"])
 def classificar_caixa_entrada():
     """
-    Recebe um número X e classifica os últimos X e-mails reais do usuário logado.
+    Recebe um número X e classifica até X e-mails novos do usuário logado. A sincronização é
+    incremental (por UID): e-mails já classificados não são baixados nem classificados de novo.
     """
     data = request.get_json()
     quantidade = data.get("quantidade", 5)
@@ -445,86 +770,198 @@ def classificar_caixa_entrada():
     
     remetente = user.nome
 
-    def extrair_corpo_limpo(msg):
-        corpo = ""
-
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-
-                if "attachment" in content_disposition:
-                    continue
-
-                payload = part.get_payload(decode=True)
-                if payload:
-                    try:
-                        conteudo = payload.decode(errors="ignore")
-                        if content_type == "text/plain":
-                            return conteudo.strip()
-                        elif content_type == "text/html" and not corpo:
-                            corpo = BeautifulSoup(conteudo, "html.parser").get_text(separator="\n", strip=True)
-                    except Exception:
-                        continue
-        else:
-            payload = msg.get_payload(decode=True)
-            if payload:
-                try:
-                    conteudo = payload.decode(errors="ignore")
-                    if msg.get_content_type() == "text/plain":
-                        return conteudo.strip()
-                    elif msg.get_content_type() == "text/html":
-                        corpo = BeautifulSoup(conteudo, "html.parser").get_text(separator="\n", strip=True)
-                except Exception:
-                    pass
-
-        return corpo.strip()
-
     try:
-        mail = imaplib.IMAP4_SSL("imap.gmail.com")
-        mail.login(user.email, user.smtp_password)
-        mail.select("inbox")
-
-        result, data_ids = mail.search(None, "ALL")
-        ids = data_ids[0].split()[-quantidade:]
+        # Mensagens novas baixadas em um único FETCH por uma sessão IMAP reaproveitada do pool
+        # do usuário; o processamento (pipeline concorrente) acontece depois de devolvê-la
+        uids, message_ids, (uidvalidity, ultimo_uid), raws = baixar_novas(user, quantidade)
 
         registros = []
-
-        for email_id in ids:
-            result, msg_data = mail.fetch(email_id, "(RFC822)")
-            raw_email = msg_data[0][1]
-            msg = email.message_from_bytes(raw_email)
-
-            corpo = extrair_corpo_limpo(msg)
+        erros = []
+        primeira_falha = None
+        for indice, corpo, categoria, resposta, confianca, erro in iterar_mensagens(raws, remetente, app, user.id):
+            if erro is not None:
+                # Um e-mail com erro não derruba os demais: é informado e tentado de novo na próxima chamada
+                erros.append({"indice": indice, "error": str(erro)})
+                primeira_falha = uids[indice] if primeira_falha is None else primeira_falha
+                continue
             if not corpo:
                 continue
-
-            texto_limpo = preprocess_pt(corpo)
-            categoria = classify_email_gemini(texto_limpo)
-            resposta = generate_reply_gemini(categoria, corpo, remetente)
-
             novo = EmailRecord(
+                user_id=user.id,
                 email_text=corpo,
                 classification=categoria,
-                suggested_response=resposta
+                suggested_response=resposta,
+                confidence=confianca,
+                message_id=message_ids[uids[indice]]
             )
-            db.session.add(novo)
-            registros.append(novo)
+            if adicionar_sem_duplicar(novo):
+                registros.append(novo)
 
+        # Registros e marca d'água gravados juntos: se algo falhar, a próxima chamada tenta de novo.
+        # Como nos jobs e no stream, a marca para antes do primeiro e-mail com erro
+        avancar_marca(user.id, uidvalidity, ultimo_uid if primeira_falha is None else primeira_falha - 1)
         db.session.commit()
 
         return jsonify({
             "message": f"{len(registros)} e-mails classificados com sucesso!",
             "classificados": [
-                {"id": r.id, "categoria": r.classification, "resposta": r.suggested_response}
+                {"id": r.id, "categoria": r.classification, "confidence": r.confidence, "resposta": r.suggested_response}
                 for r in registros
-            ]
+            ],
+            "erros": erros
         })
 
     except Exception as e:
+        db.session.rollback()
         print(f"Erro ao acessar caixa de entrada: {str(e)}")
         return jsonify({"error": f"Erro ao acessar e-mails: {str(e)}"}), 500
     
+def _evento(tipo: str, dados: dict, formato: str) -> str:
+    """Serializa um evento do stream: SSE (event/data) ou uma linha de NDJSON com o campo "tipo"."""
+    if formato == "ndjson":
+        return json.dumps({"tipo": tipo, **dados}, ensure_ascii=False) + "\n"
+    return f"event: {tipo}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+@app.route("/api/classificar-inbox/stream", methods=["POST"])
+def classificar_caixa_entrada_stream():
+    """
+    Variante em streaming de /api/classificar-inbox: cada e-mail é gravado e enviado ao cliente
+    assim que fica pronto, em vez de esperar a execução inteira. Formato SSE (text/event-stream)
+    por padrão, ou NDJSON com ?format=ndjson ou Accept: application/x-ndjson.
+    Eventos: "inicio" (total), "email" (id, categoria, confidence, resposta), "erro" (por e-mail,
+    ou fatal sem índice) e "resumo" ao final.
+    """
+    data = request.get_json() or {}
+    quantidade = data.get("quantidade", 5)
+    formato = "ndjson" if (request.args.get("format") == "ndjson"
+                           or "application/x-ndjson" in request.headers.get("Accept", "")) else "sse"
+
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "Usuário não encontrado"}), 404
+
+    try:
+        # O download acontece antes de abrir o stream: falhas de IMAP ainda saem como erro HTTP
+        uids, message_ids, (uidvalidity, ultimo_uid), raws = baixar_novas(user, quantidade)
+    except Exception as e:
+        print(f"Erro ao acessar caixa de entrada: {str(e)}")
+        return jsonify({"error": f"Erro ao acessar e-mails: {str(e)}"}), 500
+
+    def gerar():
+        yield _evento("inicio", {"total": len(uids)}, formato)
+        classificados = ignorados = erros = 0
+        primeira_falha = None
+        try:
+            for indice, corpo, categoria, resposta, confianca, erro in iterar_mensagens(raws, user.nome, app, user.id):
+                if erro is not None:
+                    erros += 1
+                    primeira_falha = uids[indice] if primeira_falha is None else primeira_falha
+                    yield _evento("erro", {"indice": indice, "error": str(erro)}, formato)
+                    continue
+                registro = EmailRecord(
+                    user_id=user.id,
+                    email_text=corpo,
+                    classification=categoria,
+                    suggested_response=resposta,
+                    confidence=confianca,
+                    message_id=message_ids[uids[indice]]
+                ) if corpo else None
+                if registro is None or not adicionar_sem_duplicar(registro):
+                    ignorados += 1
+                    continue
+                # Cada e-mail é gravado antes de ser enviado: se o cliente desconectar, o que já foi
+                # recebido está salvo e o restante é baixado de novo na próxima sincronização
+                db.session.commit()
+                classificados += 1
+                yield _evento("email", {
+                    "indice": indice,
+                    "id": registro.id,
+                    "categoria": categoria,
+                    "confidence": confianca,
+                    "resposta": resposta
+                }, formato)
+
+            # Como nos jobs, a marca para antes do primeiro e-mail com erro para que ele seja tentado de novo
+            avancar_marca(user.id, uidvalidity, ultimo_uid if primeira_falha is None else primeira_falha - 1)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao classificar caixa de entrada (stream): {str(e)}")
+            yield _evento("erro", {"error": f"Erro ao classificar e-mails: {str(e)}"}, formato)
+
+        yield _evento("resumo", {
+            "message": f"{classificados} e-mails classificados com sucesso!",
+            "total": len(uids),
+            "classificados": classificados,
+            "ignorados": ignorados,
+            "erros": erros
+        }, formato)
+
+    return Response(
+        stream_with_context(gerar()),
+        mimetype="application/x-ndjson" if formato == "ndjson" else "text/event-stream",
+        # Sem buffer em proxies (ex.: nginx) para os eventos chegarem na hora
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/api/classificar-inbox/jobs", methods=["POST"])
+def criar_job_inbox():
+    """
+    Agenda a classificação dos últimos X e-mails em background e retorna o id do job imediatamente.
+    """
+    data = request.get_json() or {}
+    quantidade = data.get("quantidade", 5)
+
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "Usuário não encontrado"}), 404
+
+    try:
+        job = submeter_job_inbox(app, user.id, quantidade)
+        return jsonify({
+            "message": "Classificação agendada",
+            "job_id": job.id,
+            "status_url": url_for("status_job_inbox", job_id=job.id)
+        }), 202
+
+    except Exception as e:
+        print(f"Erro ao agendar job da caixa de entrada: {str(e)}")
+        return jsonify({"error": f"Erro ao agendar classificação: {str(e)}"}), 500
+
+@app.route("/api/classificar-inbox/jobs/<job_id>", methods=["GET"])
+def status_job_inbox(job_id):
+    """Retorna o progresso de um job de classificação, com o estado de cada mensagem."""
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Usuário não autenticado"}), 401
+
+    job = db.session.get(InboxJob, job_id)
+    if not job or job.user_id != user_id:
+        return jsonify({"error": "Job não encontrado"}), 404
+
+    return jsonify(job.to_dict()), 200
+
+@app.cli.command("treinar-classificador-local")
+def treinar_classificador_local():
+    """Treina o classificador local com o histórico de EmailRecord e os casos de teste."""
+    resumo = treinar_do_historico()
+    print(f"Classificador local treinado com {resumo['exemplos']} exemplos "
+          f"({resumo['produtivos']} produtivos, {resumo['improdutivos']} improdutivos) "
+          f"e salvo em {resumo['caminho']}")
+
+@app.cli.command("indexar-similares")
+def indexar_similares():
+    """Indexa no SimHash os registros criados antes do índice de quase-duplicatas."""
+    print(f"{indexar_pendentes()} registros indexados")
+
 # CONFIGURAÇÃO PARA PRODUÇÃO (NÃO IMPLEMENTADO AINDA)
 if __name__ == "__main__":
     # Pega a porta do ambiente (Render define automaticamente)
@@ -0,0 +1,288 @@
+"""
+Modo ASGI: as rotas dominadas por I/O (/api/classify, /api/classificar-inbox e /api/send-email)
+rodam no event loop, com o client assíncrono do Gemini, e um mesmo processo atende muitas
+requisições em andamento ao mesmo tempo. As demais rotas continuam no Flask (app.py), servidas
+por um pool de threads (a2wsgi). Sessão, banco e regras são os mesmos do modo síncrono.
+
+Uso:
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:application
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from werkzeug.datastructures import FileStorage
+
+from app import ORIGENS_CORS, app
+from classifier import classificar_e_responder_async, classificar_varios_async, em_thread
+from database import db
+from gemini_resilience import GeminiIndisponivel
+from inbox import extrair_corpos
+from inbox_sync import adicionar_sem_duplicar, avancar_marca, baixar_novas
+from models import EmailRecord, User
+from outbox import enfileirar_email, garantir_workers
+from preprocess import preprocess_batch, preprocess_pt
+from utils import ArquivoInvalido, extract_email_text
+
+# Threads que atendem as rotas que continuam no Flask
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 10))
+
+ROTAS_ASYNC = {"/api/classify", "/api/classificar-inbox", "/api/send-email"}
+
+
+def _usuario_da_sessao(request):
+    """Lê o user_id do cookie de sessão assinado pelo Flask (mesma chave e validade de app.py)."""
+    cookie = request.cookies.get(app.config["SESSION_COOKIE_NAME"])
+    serializador = app.session_interface.get_signing_serializer(app)
+    if not cookie or serializador is None:
+        return None
+    try:
+        dados = serializador.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return dados.get("user_id")
+
+
+async def _json(request) -> dict:
+    try:
+        dados = await request.json()
+    except ValueError:
+        return {}
+    return dados if isinstance(dados, dict) else {}
+
+
+def _nome_usuario(user_id: int):
+    usuario = db.session.get(User, user_id)
+    return usuario.nome if usuario else None
+
+
+def _gravar_classificacao(user_id: int, texto_original: str, categoria: str, resposta: str, confianca) -> int:
+    registro = EmailRecord(
+        user_id=user_id,
+        email_text=texto_original,
+        classification=categoria,
+        suggested_response=resposta,
+        confidence=confianca
+    )
+    db.session.add(registro)
+    db.session.commit()
+    return registro.id
+
+
+async def classify(request):
+    """Versão assíncrona de /api/classify (mesmos parâmetros e respostas)."""
+    try:
+        async with request.form() as form:
+            arquivo = form.get("file")
+            if arquivo is not None and not isinstance(arquivo, str) and arquivo.filename:
+                try:
+                    # A extração de PDF é bloqueante (e pode abrir um processo): roda em uma thread
+                    texto_original = await asyncio.to_thread(
+                        extract_email_text, FileStorage(stream=arquivo.file, filename=arquivo.filename)
+                    )
+                except ArquivoInvalido as e:
+                    return JSONResponse({"error": str(e)}, status_code=400)
+            elif "email_text" in form:
+                texto_original = form.get("email_text") or ""
+            else:
+                return JSONResponse({"error": "Nenhum texto ou arquivo fornecido"}, status_code=400)
+
+        if not texto_original.strip():
+            return JSONResponse({
+                "error": "Por favor, insira o texto do email ou faça o upload de um arquivo."
+            }, status_code=400)
+
+        user_id = _usuario_da_sessao(request)
+        if not user_id:
+            return JSONResponse({"error": "Usuário não autenticado"}, status_code=401)
+
+        remetente = await em_thread(app, _nome_usuario, user_id)
+        if remetente is None:
+            return JSONResponse({"error": "Usuário não encontrado"}, status_code=404)
+
+        texto_limpo = await asyncio.to_thread(preprocess_pt, texto_original)
+        categoria, resposta, confidence = await classificar_e_responder_async(
+            app, texto_limpo, texto_original, remetente, user_id
+        )
+        registro_id = await em_thread(app, _gravar_classificacao, user_id, texto_original, categoria, resposta,
+                                      confidence)
+
+        return JSONResponse({
+            "id": registro_id,
+            "category": categoria,
+            "confidence": confidence,
+            "suggested_response": resposta,
+            "email_content": texto_original
+        })
+
+    except GeminiIndisponivel as e:
+        print(f"Gemini indisponível na classificação: {str(e)}")
+        return JSONResponse({"error": "Serviço de IA temporariamente indisponível. Tente novamente em instantes."},
+                            status_code=503)
+
+    except Exception as e:
+        print(f"Erro na classificação: {str(e)}")
+        return JSONResponse({"error": f"Erro interno do servidor: {str(e)}"}, status_code=500)
+
+
+def _baixar_novas(user_id: int, quantidade: int):
+    return baixar_novas(db.session.get(User, user_id), quantidade)
+
+
+def _gravar_inbox(user_id: int, uids, message_ids, marca, corpos, resultados, primeira_falha=None) -> list[dict]:
+    """
+    Grava os registros e a marca d'água na mesma transação (como em /api/classificar-inbox).
+    Com algum e-mail com erro, a marca para antes do primeiro deles (`primeira_falha`, UID).
+    """
+    uidvalidity, ultimo_uid = marca
+    try:
+        registros = []
+        for indice, (categoria, resposta, confianca) in resultados.items():
+            novo = EmailRecord(
+                user_id=user_id,
+                email_text=corpos[indice],
+                classification=categoria,
+                suggested_response=resposta,
+                confidence=confianca,
+                message_id=message_ids[uids[indice]]
+            )
+            if adicionar_sem_duplicar(novo):
+                registros.append(novo)
+
+        avancar_marca(user_id, uidvalidity, ultimo_uid if primeira_falha is None else primeira_falha - 1)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return [
+        {"id": r.id, "categoria": r.classification, "confidence": r.confidence, "resposta": r.suggested_response}
+        for r in registros
+    ]
+
+
+async def classificar_caixa_entrada(request):
+    """Versão assíncrona de /api/classificar-inbox (mesmos parâmetros e respostas)."""
+    data = await _json(request)
+    quantidade = data.get("quantidade", 5)
+
+    user_id = _usuario_da_sessao(request)
+    if not user_id:
+        return JSONResponse({"error": "Usuário não autenticado"}, status_code=401)
+
+    remetente = await em_thread(app, _nome_usuario, user_id)
+    if remetente is None:
+        return JSONResponse({"error": "Usuário não encontrado"}, status_code=404)
+
+    try:
+        # Um único FETCH pela sessão IMAP do pool (imaplib), em uma thread; o que leva tempo —
+        # as chamadas ao Gemini — acontece depois, no event loop
+        uids, message_ids, marca, raws = await em_thread(app, _baixar_novas, user_id, quantidade)
+
+        corpos = await asyncio.to_thread(extrair_corpos, raws)
+        validos = [indice for indice, corpo in enumerate(corpos) if corpo]
+        textos = [corpos[indice] for indice in validos]
+        textos_limpos = await asyncio.to_thread(preprocess_batch, textos)
+
+        resultados = {}
+        erros = []
+        primeira_falha = None
+        classificados = await classificar_varios_async(app, list(zip(textos, textos_limpos)), remetente, user_id)
+        for indice, (categoria, resposta, confianca, erro) in zip(validos, classificados):
+            if erro is not None:
+                # Um e-mail com erro não derruba os demais: é informado e tentado de novo na próxima chamada
+                erros.append({"indice": indice, "error": str(erro)})
+                primeira_falha = uids[indice] if primeira_falha is None else primeira_falha
+                continue
+            resultados[indice] = (categoria, resposta, confianca)
+
+        registros = await em_thread(app, _gravar_inbox, user_id, uids, message_ids, marca, corpos, resultados,
+                                    primeira_falha)
+        return JSONResponse({
+            "message": f"{len(registros)} e-mails classificados com sucesso!",
+            "classificados": registros,
+            "erros": erros
+        })
+
+    except Exception as e:
+        print(f"Erro ao acessar caixa de entrada: {str(e)}")
+        return JSONResponse({"error": f"Erro ao acessar e-mails: {str(e)}"}, status_code=500)
+
+
+def _enfileirar_resposta(user_id: int, destinatario: str, assunto: str, response_id):
+    """Enfileira a resposta sugerida na outbox. Retorna (status HTTP, corpo)."""
+    user = db.session.get(User, user_id)
+    if not user:
+        return 404, {"error": "Usuário não encontrado"}
+
+    resposta = EmailRecord.query.filter_by(id=response_id, user_id=user.id).first()
+    if not resposta:
+        return 404, {"error": "Resposta sugerida não encontrada"}
+
+    try:
+        mensagem = enfileirar_email(user.email, destinatario, assunto, resposta.suggested_response, user_id=user.id)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao enfileirar e-mail: {str(e)}")
+        return 500, {"error": "Erro ao enfileirar e-mail"}
+
+    return 202, {
+        "message": "E-mail enfileirado para envio",
+        "id": mensagem.id,
+        "status_url": f"/api/outbox/{mensagem.id}"
+    }
+
+
+async def send_email(request):
+    """
+    Versão assíncrona de /api/send-email. O envio SMTP já acontece fora da requisição (outbox);
+    aqui só o registro na fila, em uma thread.
+    """
+    data = await _json(request)
+    to = data.get("to")
+    subject = data.get("subject")
+    response_id = data.get("response_id")
+
+    if not to or not subject or not response_id:
+        return JSONResponse({"error": "Parâmetros faltando"}, status_code=400)
+
+    user_id = _usuario_da_sessao(request)
+    if not user_id:
+        return JSONResponse({"error": "Usuário não autenticado"}, status_code=401)
+
+    status, corpo = await em_thread(app, _enfileirar_resposta, user_id, to, subject, response_id)
+    return JSONResponse(corpo, status_code=status)
+
+
+@asynccontextmanager
+async def _ciclo_de_vida(_):
+    # No Flask os workers da outbox sobem no before_request; aqui, na inicialização de cada processo
+    garantir_workers(app)
+    yield
+
+
+_rotas_async = Starlette(
+    routes=[
+        Route("/api/classify", classify, methods=["POST"]),
+        Route("/api/classificar-inbox", classificar_caixa_entrada, methods=["POST"]),
+        Route("/api/send-email", send_email, methods=["POST"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=ORIGENS_CORS, allow_credentials=True,
+                           allow_methods=["*"], allow_headers=["*"])],
+    lifespan=_ciclo_de_vida
+)
+_flask = WSGIMiddleware(app, workers=ASGI_WSGI_THREADS)
+
+
+async def application(scope, receive, send):
+    """Encaminha as rotas de ROTAS_ASYNC (e o lifespan) para o Starlette e o restante para o Flask."""
+    if scope["type"] == "http" and scope["path"] not in ROTAS_ASYNC:
+        await _flask(scope, receive, send)
+    else:
+        await _rotas_async(scope, receive, send)
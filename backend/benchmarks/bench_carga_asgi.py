@@ -0,0 +1,160 @@
+"""
+Benchmark de carga: requisições/s do modo síncrono (gunicorn gthread, app:app) contra o modo ASGI
+(gunicorn + UvicornWorker, asgi:application) com o mesmo número de workers.
+
+O Gemini é substituído por um servidor local com latência fixa (GEMINI_BASE_URL), para que o
+resultado meça a concorrência do servidor e não a variação da API. Cada requisição usa um texto
+diferente, para não cair nos caches de classificação e de respostas nem no índice de similaridade.
+
+Uso (a partir de backend/):
+    # 1. Gemini falso (latência por chamada, em segundos)
+    python benchmarks/bench_carga_asgi.py gemini-falso --porta 8089 --latencia 0.5
+
+    # 2. Servidor, em um dos modos (mesmo WEB_CONCURRENCY nos dois)
+    GEMINI_BASE_URL=http://127.0.0.1:8089 WEB_CONCURRENCY=2 gunicorn -c gunicorn.conf.py app:app
+    GEMINI_BASE_URL=http://127.0.0.1:8089 WEB_CONCURRENCY=2 gunicorn -c gunicorn.conf.py \\
+        -k uvicorn.workers.UvicornWorker asgi:application
+
+    # 3. Carga (com um usuário já cadastrado)
+    python benchmarks/bench_carga_asgi.py carga --url http://127.0.0.1:5000 --email u@x.com --senha ... \\
+        --concorrencia 64 --duracao 30
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import statistics
+import time
+
+import httpx
+
+PALAVRAS = (
+    "contrato relatório fatura boleto prazo reunião proposta pedido entrega suporte sistema acesso senha "
+    "cadastro pagamento nota fiscal orçamento cliente projeto cronograma atualização status chamado "
+    "erro falha servidor integração planilha documento assinatura renovação cancelamento reembolso "
+    "transferência conta banco agência cobrança vencimento desconto parcela estoque produto serviço"
+).split()
+
+
+def texto_aleatorio(numero: int) -> str:
+    palavras = random.sample(PALAVRAS, 12)
+    return f"Prezados, solicito {' '.join(palavras)} referente ao pedido {numero}. Aguardo retorno."
+
+
+# ---------------------------------------------------------------- Gemini falso
+
+def _resposta_gemini(corpo: dict) -> dict:
+    config = corpo.get("generationConfig") or {}
+    mime = config.get("responseMimeType")
+    prompt = corpo["contents"][0]["parts"][0]["text"]
+
+    if mime == "text/x.enum":
+        texto = "Produtivo"
+    elif mime == "application/json" and (config.get("responseSchema") or {}).get("type", "").lower() == "array":
+        total = len(re.findall(r"^Email \d+:", prompt, re.MULTILINE))
+        texto = json.dumps([{"indice": i, "categoria": "Produtivo"} for i in range(total)])
+    elif mime == "application/json":
+        texto = json.dumps({"categoria": "Produtivo", "resposta": "Prezado(a) cliente,\n\nRecebemos sua solicitação."})
+    else:
+        texto = "Prezado(a) cliente,\n\nRecebemos sua solicitação e retornaremos em breve.\n\nAtenciosamente."
+
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": texto}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(texto) // 4,
+                          "totalTokenCount": (len(prompt) + len(texto)) // 4},
+    }
+
+
+def gemini_falso(porta: int, latencia: float):
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    async def generate_content(request):
+        corpo = await request.json()
+        await asyncio.sleep(latencia)
+        return JSONResponse(_resposta_gemini(corpo))
+
+    app = Starlette(routes=[Route("/{versao}/models/{modelo}:generateContent", generate_content, methods=["POST"])])
+    uvicorn.run(app, host="127.0.0.1", port=porta, log_level="warning")
+
+
+# ---------------------------------------------------------------- Gerador de carga
+
+async def _cliente(client: httpx.AsyncClient, rota: str, fim: float, contador, latencias: list, status: dict,
+                   response_id):
+    while time.monotonic() < fim:
+        numero = next(contador)
+        inicio = time.monotonic()
+        try:
+            if rota == "send-email":
+                r = await client.post("/api/send-email", json={
+                    "to": "destino@example.com", "subject": f"Bench {numero}", "response_id": response_id
+                })
+            else:
+                r = await client.post(f"/api/{rota}", data={"email_text": texto_aleatorio(numero)})
+            chave = r.status_code
+        except httpx.HTTPError as e:
+            chave = type(e).__name__
+        latencias.append(time.monotonic() - inicio)
+        status[chave] = status.get(chave, 0) + 1
+
+
+async def carga(url: str, email: str, senha: str, rota: str, concorrencia: int, duracao: float):
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=120) as client:
+        r = await client.post("/api/login", json={"email": email, "senha": senha})
+        r.raise_for_status()
+
+        response_id = None
+        if rota == "send-email":
+            r = await client.post("/api/classify", data={"email_text": texto_aleatorio(0)})
+            r.raise_for_status()
+            response_id = r.json()["id"]
+
+        latencias, status = [], {}
+        contador = iter(range(1, 10 ** 9))
+        inicio = time.monotonic()
+        await asyncio.gather(*(
+            _cliente(client, rota, inicio + duracao, contador, latencias, status, response_id)
+            for _ in range(concorrencia)
+        ))
+        total = time.monotonic() - inicio
+
+    latencias.sort()
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000
+    print(f"rota=/api/{rota} concorrência={concorrencia} duração={total:.1f}s")
+    print(f"requisições={len(latencias)} req/s={len(latencias) / total:.1f}")
+    if latencias:
+        print(f"latência ms: média={statistics.mean(latencias) * 1000:.0f} p50={percentil(0.5):.0f} "
+              f"p95={percentil(0.95):.0f} p99={percentil(0.99):.0f}")
+    print(f"status: {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    falso = sub.add_parser("gemini-falso", help="servidor local que imita generateContent")
+    falso.add_argument("--porta", type=int, default=8089)
+    falso.add_argument("--latencia", type=float, default=0.5)
+
+    gerador = sub.add_parser("carga", help="gera carga contra o backend")
+    gerador.add_argument("--url", default="http://127.0.0.1:5000")
+    gerador.add_argument("--email", required=True)
+    gerador.add_argument("--senha", required=True)
+    gerador.add_argument("--rota", choices=["classify", "send-email"], default="classify")
+    gerador.add_argument("--concorrencia", type=int, default=64)
+    gerador.add_argument("--duracao", type=float, default=30)
+
+    args = parser.parse_args()
+    if args.comando == "gemini-falso":
+        gemini_falso(args.porta, args.latencia)
+    else:
+        asyncio.run(carga(args.url, args.email, args.senha, args.rota, args.concorrencia, args.duracao))
+
+
+if __name__ == "__main__":
+    main()
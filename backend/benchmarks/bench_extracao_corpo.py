@@ -0,0 +1,116 @@
+"""
+Micro-benchmark da extração de texto dos corpos de email.
+
+Compara o BeautifulSoup com html.parser (implementação antiga, se instalado), o lxml e o parser
+em streaming da biblioteca padrão sobre um corpus de mensagens: os casos de teste do repositório,
+emails de marketing sintéticos de vários tamanhos e, opcionalmente, arquivos .eml/.html de um diretório.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_extracao_corpo.py [diretorio_com_emails] [--repeticoes N]
+"""
+import argparse
+import email
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import email_body  # noqa: E402
+
+CASOS_TESTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "casos_teste")
+
+
+def email_marketing(blocos: int) -> str:
+    """HTML no estilo de newsletters: tabelas aninhadas, estilos inline, imagens e rastreadores."""
+    bloco = (
+        '<table width="100%" cellpadding="0" cellspacing="0" style="background:#fff;border:0">'
+        '<tr><td style="padding:12px;font-family:Arial,sans-serif;font-size:14px;color:#333">'
+        '<img src="https://exemplo.com/img.png" width="600" alt="Oferta">'
+        '<h2 style="margin:0">Promoção imperdível de {n}</h2>'
+        '<p style="line-height:1.4">Aproveite descontos de até 70% em toda a loja. '
+        'Frete grátis para compras acima de R$ 199,00 &amp; parcelamento em 10x.</p>'
+        '<a href="https://exemplo.com/c?id={n}" style="background:#e00;color:#fff;padding:8px">Comprar</a>'
+        '</td></tr></table>'
+    )
+    corpo = "".join(bloco.format(n=n) for n in range(blocos))
+    return (
+        "<html><head><style>td{{font-size:14px}} .x{{display:none}}</style></head><body>"
+        f"{corpo}<p>Para deixar de receber, clique aqui.</p>"
+        '<img src="https://exemplo.com/pixel.gif" width="1" height="1"></body></html>'
+    )
+
+
+def carregar_corpus(diretorio=None):
+    corpus = []
+    for nome in sorted(os.listdir(CASOS_TESTE_DIR)):
+        if nome.endswith(".txt"):
+            with open(os.path.join(CASOS_TESTE_DIR, nome), encoding="utf-8", errors="ignore") as f:
+                corpus.append((nome, f"<html><body><p>{f.read()}</p></body></html>"))
+
+    for blocos in (10, 100, 1000):
+        corpus.append((f"marketing_{blocos}_blocos", email_marketing(blocos)))
+
+    if diretorio:
+        for nome in sorted(os.listdir(diretorio)):
+            caminho = os.path.join(diretorio, nome)
+            if nome.endswith(".html"):
+                with open(caminho, encoding="utf-8", errors="ignore") as f:
+                    corpus.append((nome, f.read()))
+            elif nome.endswith(".eml"):
+                with open(caminho, "rb") as f:
+                    msg = email.message_from_bytes(f.read())
+                for part in msg.walk():
+                    if part.get_content_type() == "text/html" and part.get_payload(decode=True):
+                        corpus.append((nome, part.get_payload(decode=True).decode(errors="ignore")))
+                        break
+    return corpus
+
+
+def extratores():
+    disponiveis = {"stdlib": lambda html: email_body.normalizar_espacos(email_body._html_para_texto_stdlib(html))}
+    if email_body.lxml is not None:
+        disponiveis["lxml"] = lambda html: email_body.normalizar_espacos(email_body._html_para_texto_lxml(html))
+    try:
+        from bs4 import BeautifulSoup
+        disponiveis["bs4 (html.parser)"] = lambda html: BeautifulSoup(html, "html.parser").get_text(separator="\n", strip=True)
+    except ImportError:
+        pass
+    return disponiveis
+
+
+def medir(funcao, html, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(html)
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("diretorio", nargs="?", help="diretório com arquivos .eml ou .html adicionais")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = carregar_corpus(args.diretorio)
+    funcoes = extratores()
+
+    print(f"{'mensagem':<28} {'KB':>8} " + " ".join(f"{nome:>18}" for nome in funcoes))
+    totais = dict.fromkeys(funcoes, 0.0)
+    for nome, html in corpus:
+        tempos = {extrator: medir(funcao, html, args.repeticoes) for extrator, funcao in funcoes.items()}
+        for extrator, tempo in tempos.items():
+            totais[extrator] += tempo
+        print(f"{nome[:28]:<28} {len(html.encode()) / 1024:>8.1f} "
+              + " ".join(f"{tempos[extrator]:>15.2f} ms" for extrator in funcoes))
+
+    print(f"{'total':<28} {'':>8} " + " ".join(f"{totais[extrator]:>15.2f} ms" for extrator in funcoes))
+
+    # Efeito do limite de tamanho no caminho usado em produção
+    maior = max(corpus, key=lambda item: len(item[1]))[1]
+    tempo = medir(email_body.html_para_texto, maior, args.repeticoes)
+    print(f"\nhtml_para_texto (limite de {email_body.EMAIL_HTML_MAX_CHARS // 1024} KB) na maior mensagem: {tempo:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
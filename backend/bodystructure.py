@@ -0,0 +1,119 @@
+import base64
+import quopri
+import re
+
+# Tokens de uma resposta IMAP: parênteses, strings entre aspas e átomos (NIL, números, nomes)
+_TOKEN = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+_ESCAPE = re.compile(rb'\\(.)')
+
+
+def linhas_fetch(resposta):
+    """
+    Junta a resposta de um FETCH do imaplib em uma linha por mensagem. Literais ({n} + conteúdo,
+    que o imaplib entrega como tuplas) são reescritos como strings entre aspas.
+    """
+    linhas = []
+    for item in resposta:
+        if isinstance(item, tuple):
+            prefixo, literal = item
+            escapado = literal.replace(b"\\", b"\\\\").replace(b'"', b'\\"')
+            trecho = re.sub(rb"\{\d+\}$", b'"' + escapado + b'"', prefixo)
+        elif isinstance(item, bytes):
+            trecho = item
+        else:
+            continue
+        if re.match(rb"\d+ \(", trecho) or not linhas:
+            linhas.append(trecho)
+        else:
+            linhas[-1] += trecho
+    return linhas
+
+
+def _parse_lista(dados: bytes, pos: int):
+    itens = []
+    while True:
+        m = _TOKEN.match(dados, pos)
+        if not m:
+            raise ValueError("BODYSTRUCTURE malformado")
+        pos = m.end()
+        if m.group(1):
+            sublista, pos = _parse_lista(dados, pos)
+            itens.append(sublista)
+        elif m.group(2):
+            return itens, pos
+        elif m.group(3) is not None:
+            itens.append(_ESCAPE.sub(rb"\1", m.group(3)))
+        else:
+            itens.append(None if m.group(4).upper() == b"NIL" else m.group(4))
+
+
+def parse_bodystructure(linha: bytes):
+    """Extrai o BODYSTRUCTURE de uma linha de FETCH como listas aninhadas (NIL vira None)."""
+    inicio = linha.upper().find(b"BODYSTRUCTURE (")
+    if inicio < 0:
+        return None
+    estrutura, _ = _parse_lista(linha, inicio + len(b"BODYSTRUCTURE ("))
+    return estrutura
+
+
+def _texto(valor) -> str:
+    return valor.decode("ascii", errors="ignore").lower() if isinstance(valor, bytes) else ""
+
+
+def escolher_parte_texto(estrutura):
+    """
+    Escolhe a parte de texto do corpo, preferindo text/plain a text/html e ignorando anexos
+    e mensagens encaminhadas (message/rfc822).
+    Retorna (número da parte, subtipo, transfer-encoding, charset) ou None.
+    """
+    candidatas = []
+
+    def visitar(no, numero):
+        if not no:
+            return
+        if isinstance(no[0], list):
+            # multipart: as partes filhas vêm antes do subtipo
+            for indice, filho in enumerate(no, start=1):
+                if not isinstance(filho, list):
+                    break
+                visitar(filho, f"{numero}.{indice}" if numero else str(indice))
+            return
+
+        tipo, subtipo = _texto(no[0]), _texto(no[1])
+        if tipo != "text" or subtipo not in ("plain", "html"):
+            return
+        # Partes text/* têm o número de linhas antes da extensão: disposição no índice 9
+        disposicao = no[9] if len(no) > 9 else None
+        if isinstance(disposicao, list) and disposicao and _texto(disposicao[0]) == "attachment":
+            return
+
+        parametros = no[2] or []
+        charset = None
+        for chave, valor in zip(parametros[::2], parametros[1::2]):
+            if _texto(chave) == "charset":
+                charset = _texto(valor)
+        candidatas.append((numero or "1", subtipo, _texto(no[5]) or "7bit", charset))
+
+    visitar(estrutura, "")
+    for preferido in ("plain", "html"):
+        for candidata in candidatas:
+            if candidata[1] == preferido:
+                return candidata
+    return None
+
+
+def decodificar_parte(conteudo: bytes, encoding: str, charset: str) -> str:
+    """
+    Decodifica o conteúdo (possivelmente truncado) de uma parte: transfer-encoding e depois charset.
+    """
+    if encoding == "base64":
+        # Descarta o último bloco incompleto quando o conteúdo foi cortado no limite de bytes
+        limpo = re.sub(rb"[^A-Za-z0-9+/=]", b"", conteudo)
+        conteudo = base64.b64decode(limpo[:len(limpo) - len(limpo) % 4])
+    elif encoding == "quoted-printable":
+        conteudo = quopri.decodestring(conteudo)
+
+    try:
+        return conteudo.decode(charset or "utf-8", errors="ignore")
+    except LookupError:
+        return conteudo.decode("utf-8", errors="ignore")
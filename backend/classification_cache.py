@@ -0,0 +1,142 @@
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from database import db
+from models import ClassificationCacheEntry
+from utils import LRUCache
+
+# Configuração do cache de classificação (sobrescrevível via variáveis de ambiente)
+CACHE_MAX_ITENS = int(os.getenv("CLASSIFICATION_CACHE_SIZE", 2048))
+CACHE_TTL_SEGUNDOS = int(os.getenv("CLASSIFICATION_CACHE_TTL", 7 * 24 * 3600))
+# Números e códigos (contrato, chamado, pedido...)
+_IDENTIFICADOR = re.compile(r"\w*\d\w*")
+# A cada N gravações o tier do banco remove as entradas expiradas
+CACHE_PURGA_A_CADA = int(os.getenv("CLASSIFICATION_CACHE_PURGE_EVERY", 500))
+
+
+def chave_conteudo(texto_limpo: str) -> str:
+    """
+    Gera a chave do cache a partir da saída do preprocess_pt.
+    O texto é normalizado (minúsculas e espaços colapsados) antes do hash SHA-256,
+    para que variações apenas de formatação caiam na mesma entrada.
+    """
+    normalizado = re.sub(r"\s+", " ", texto_limpo.lower()).strip()
+    return hashlib.sha256(normalizado.encode("utf-8")).hexdigest()
+
+
+def identificadores(texto: str) -> set:
+    """
+    Números e códigos alfanuméricos do texto original (ex.: "XYZ 123" -> {"123"}, "NF2024A" -> {"nf2024a"}).
+    O preprocess_pt os descarta, então textos que só diferem neles têm a mesma chave_conteudo.
+    """
+    return {token.lower() for token in _IDENTIFICADOR.findall(texto or "")}
+
+
+class ClassificationCache:
+    """
+    Cache de classificações em dois níveis:
+    - memória: LRU limitado, local a cada processo;
+    - banco: tabela classification_cache, compartilhada entre processos e reinícios.
+    Entradas mais antigas que o TTL são tratadas como ausentes e removidas.
+    """
+
+    def __init__(self, max_itens: int = CACHE_MAX_ITENS, ttl_segundos: int = CACHE_TTL_SEGUNDOS):
+        self.ttl_segundos = ttl_segundos
+        self.memoria = LRUCache(max_itens, ttl_segundos)
+        self._lock = threading.Lock()
+        self._gravacoes = 0
+        self.hits_memoria = 0
+        self.hits_banco = 0
+        self.misses = 0
+
+    def _contar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def get(self, chave: str):
+        """Retorna (categoria, confiança) para a chave, ou None em caso de miss."""
+        item = self.memoria.get(chave)
+        if item is not None:
+            self._contar("hits_memoria")
+            return item
+
+        try:
+            limite = datetime.utcnow() - timedelta(seconds=self.ttl_segundos)
+            # Conexão própria: leituras e escritas do cache não interferem na sessão da requisição
+            with db.engine.connect() as conn:
+                linha = conn.execute(
+                    select(ClassificationCacheEntry.classification, ClassificationCacheEntry.confidence)
+                    .where(ClassificationCacheEntry.content_hash == chave)
+                    .where(ClassificationCacheEntry.created_at >= limite)
+                ).first()
+        except Exception as e:
+            print(f"Erro ao consultar cache de classificação: {str(e)}")
+            linha = None
+
+        if linha is None:
+            self._contar("misses")
+            return None
+
+        self._contar("hits_banco")
+        item = (linha[0], linha[1])
+        self.memoria.set(chave, item)
+        return item
+
+    def set(self, chave: str, categoria: str, confianca=None):
+        self.memoria.set(chave, (categoria, confianca))
+
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(delete(ClassificationCacheEntry).where(ClassificationCacheEntry.content_hash == chave))
+                conn.execute(insert(ClassificationCacheEntry).values(
+                    content_hash=chave,
+                    classification=categoria,
+                    confidence=confianca,
+                    created_at=datetime.utcnow()
+                ))
+        except Exception as e:
+            print(f"Erro ao gravar cache de classificação: {str(e)}")
+            return
+
+        with self._lock:
+            self._gravacoes += 1
+            purgar = self._gravacoes % CACHE_PURGA_A_CADA == 0
+        if purgar:
+            self.purgar_expirados()
+
+    def purgar_expirados(self) -> int:
+        """Remove do banco as entradas cujo TTL já expirou. Retorna a quantidade removida."""
+        limite = datetime.utcnow() - timedelta(seconds=self.ttl_segundos)
+        try:
+            with db.engine.begin() as conn:
+                resultado = conn.execute(
+                    delete(ClassificationCacheEntry).where(ClassificationCacheEntry.created_at < limite)
+                )
+                return resultado.rowcount
+        except Exception as e:
+            print(f"Erro ao purgar cache de classificação: {str(e)}")
+            return 0
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            hits = self.hits_memoria + self.hits_banco
+            total = hits + self.misses
+            return {
+                "hits_memoria": self.hits_memoria,
+                "hits_banco": self.hits_banco,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "itens_memoria": len(self.memoria),
+                "max_itens_memoria": self.memoria.max_itens,
+                "evictions_memoria": self.memoria.evictions,
+                "ttl_segundos": self.ttl_segundos,
+            }
+
+
+# Instância única usada pela aplicação
+classification_cache = ClassificationCache()
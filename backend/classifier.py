@@ -0,0 +1,367 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from classification_cache import chave_conteudo, classification_cache
+from local_classifier import classificar_local
+from reply_cache import chave_resposta, reply_cache
+from reply_templates import REPLY_TEMPLATES_IMPRODUTIVO, renderizar_improdutivo
+from similarity import reaproveitar_similar
+from gemini_resilience import GeminiIndisponivel
+from gemini_client import (
+    classify_and_reply_gemini,
+    classify_and_reply_gemini_async,
+    classify_email_gemini,
+    classify_email_gemini_async,
+    classify_emails_batch,
+    classify_emails_batch_async,
+    generate_reply_gemini,
+    generate_reply_gemini_async,
+)
+
+# Modos de chamada ao Gemini: duas chamadas (classificação + resposta) ou uma combinada
+MODO_SEPARADO = "separado"
+MODO_COMBINADO = "combinado"
+
+# Máximo de chamadas simultâneas ao Gemini ao processar vários emails
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", 4))
+
+
+def _categoria_sem_llm(texto_limpo: str, chave: str):
+    """
+    Tenta resolver a categoria sem chamar o Gemini: primeiro o classificador local
+    (quando confiante), depois o cache de classificação.
+    Retorna (categoria, confiança), ou None se nenhum resolver.
+    """
+    resultado = classificar_local(texto_limpo)
+    if resultado is not None:
+        return resultado
+    return classification_cache.get(chave)
+
+
+def _fallback_local(texto_limpo: str, erro: GeminiIndisponivel):
+    """
+    Com o Gemini indisponível, usa a previsão do classificador local mesmo abaixo do limiar.
+    O resultado não vai para o cache. Sem modelo local treinado, propaga o erro.
+    """
+    resultado = classificar_local(texto_limpo, limiar=0)
+    if resultado is None:
+        raise erro
+    print(f"Gemini indisponível, usando o classificador local: {str(erro)}")
+    return resultado
+
+
+def classificar(texto_limpo: str) -> tuple[str, float | None]:
+    """
+    Classifica um email já pré-processado. O classificador local e o cache respondem antes
+    do Gemini, então emails óbvios ou repetidos (felicitações, newsletters, avisos
+    automáticos) não geram chamada à API. Com o Gemini indisponível, recorre ao classificador local.
+    Retorna (categoria, confiança), com a confiança vinda do próprio classificador.
+    """
+    chave = chave_conteudo(texto_limpo)
+    resultado = _categoria_sem_llm(texto_limpo, chave)
+    if resultado is not None:
+        return resultado
+
+    try:
+        categoria, confianca = classify_email_gemini(texto_limpo)
+    except GeminiIndisponivel as e:
+        return _fallback_local(texto_limpo, e)
+    classification_cache.set(chave, categoria, confianca)
+    return categoria, confianca
+
+
+def responder(categoria: str, texto_limpo: str, texto_original: str, remetente: str, user_id: int = None) -> str:
+    """
+    Gera a resposta para um email já classificado, evitando o Gemini sempre que possível:
+    1. cache de respostas (inclui as respostas editadas pelos usuários);
+    2. para improdutivos, modelo local de agradecimento (REPLY_TEMPLATES_IMPRODUTIVO);
+    3. generate_reply_gemini, com o resultado guardado no cache.
+    O cache é separado por usuário (user_id).
+    """
+    chave = chave_resposta(categoria, texto_limpo, texto_original, remetente, user_id)
+    resposta = reply_cache.get(chave)
+    if resposta is not None:
+        return resposta
+
+    if categoria == "Improdutivo" and REPLY_TEMPLATES_IMPRODUTIVO:
+        reply_cache.registrar_template()
+        return renderizar_improdutivo(texto_limpo, remetente)
+
+    resposta = generate_reply_gemini(categoria, texto_original, remetente)
+    reply_cache.set(chave, categoria, remetente, resposta)
+    return resposta
+
+
+def aprender_edicao(categoria: str, texto_limpo: str, texto_original: str, remetente: str, resposta_editada: str,
+                    user_id: int = None):
+    """Guarda a resposta editada pelo usuário no cache, para ser reaproveitada em emails equivalentes dele."""
+    reply_cache.set(chave_resposta(categoria, texto_limpo, texto_original, remetente, user_id), categoria, remetente,
+                    resposta_editada, editada=True)
+
+
+def classificar_e_responder(texto_limpo: str, texto_original: str, remetente: str,
+                            user_id: int = None) -> tuple[str, str, float | None]:
+    """
+    Classifica o email e gera a resposta automática. Com user_id, um email anterior do usuário
+    quase idêntico (ver similarity.py) tem a classificação e a resposta reaproveitadas. Senão,
+    segue app.config["GEMINI_MODE"]:
+    - "separado": classificação (com cache) e resposta em chamadas distintas;
+    - "combinado": uma única chamada estruturada; se a saída falhar na validação ou o Gemini
+      estiver indisponível, recorre ao fluxo separado.
+    Retorna (categoria, resposta, confiança).
+    """
+    similar = reaproveitar_similar(user_id, texto_limpo, texto_original)
+    if similar is not None:
+        return similar
+
+    modo = current_app.config.get("GEMINI_MODE", MODO_SEPARADO)
+
+    if modo == MODO_COMBINADO:
+        chave = chave_conteudo(texto_limpo)
+        resultado = _categoria_sem_llm(texto_limpo, chave)
+        if resultado is not None:
+            # Categoria já conhecida: só falta a resposta
+            categoria, confianca = resultado
+            return categoria, responder(categoria, texto_limpo, texto_original, remetente, user_id), confianca
+        try:
+            categoria, resposta, confianca = classify_and_reply_gemini(texto_limpo, texto_original, remetente)
+            _guardar_combinado(chave, texto_limpo, texto_original, remetente, categoria, resposta, confianca, user_id)
+            return categoria, resposta, confianca
+        except ValueError as e:
+            print(f"Saída combinada inválida, usando fluxo separado: {str(e)}")
+        except GeminiIndisponivel as e:
+            # Circuito aberto ou prazo esgotado: o fluxo separado recorre ao classificador local
+            print(f"Gemini indisponível na chamada combinada, usando fluxo separado: {str(e)}")
+
+    categoria, confianca = classificar(texto_limpo)
+    return categoria, responder(categoria, texto_limpo, texto_original, remetente, user_id), confianca
+
+
+def _guardar_combinado(chave: str, texto_limpo: str, texto_original: str, remetente: str, categoria: str,
+                       resposta: str, confianca, user_id: int = None):
+    classification_cache.set(chave, categoria, confianca)
+    reply_cache.set(chave_resposta(categoria, texto_limpo, texto_original, remetente, user_id), categoria, remetente,
+                    resposta)
+
+
+def _categorias_sem_llm(textos_por_chave: dict) -> dict:
+    return {chave: _categoria_sem_llm(texto, chave) for chave, texto in textos_por_chave.items()}
+
+
+def classificar_lote(textos_limpos: list[str]) -> list[tuple]:
+    """
+    Classifica vários emails pré-processados. O que o classificador local ou o cache resolvem
+    não vai à API; os demais (sem repetição) seguem em lote para classify_emails_batch.
+    Retorna uma lista de (categoria, confiança) na ordem dos textos.
+    """
+    chaves = [chave_conteudo(texto) for texto in textos_limpos]
+    textos_por_chave = dict(zip(chaves, textos_limpos))
+    resultados = _categorias_sem_llm(textos_por_chave)
+
+    pendentes = [chave for chave, resultado in resultados.items() if resultado is None]
+    if pendentes:
+        try:
+            classificados = classify_emails_batch([textos_por_chave[chave] for chave in pendentes])
+        except GeminiIndisponivel as e:
+            for chave in pendentes:
+                resultados[chave] = _fallback_local(textos_por_chave[chave], e)
+        else:
+            for chave, (categoria, confianca) in zip(pendentes, classificados):
+                classification_cache.set(chave, categoria, confianca)
+                resultados[chave] = (categoria, confianca)
+
+    return [resultados[chave] for chave in chaves]
+
+
+def iterar_classificacoes(itens, remetente: str, app, user_id: int = None):
+    """
+    Classifica e responde vários emails, com no máximo GEMINI_CONCURRENCY chamadas simultâneas.
+    `itens` são pares (texto_original, texto_limpo). Com user_id, quase-duplicatas de emails
+    anteriores do usuário são resolvidas antes de tudo (ver similarity.py). No modo separado,
+    a classificação dos demais é feita em lote antes das respostas. Gera
+    (indice, categoria, resposta, confiança, erro) na ordem de entrada, assim que cada item fica pronto.
+    """
+    similares = [None] * len(itens)
+    if itens and user_id is not None:
+        try:
+            with app.app_context():
+                similares = [reaproveitar_similar(user_id, texto_limpo, texto_original)
+                             for texto_original, texto_limpo in itens]
+        except Exception as e:
+            print(f"Erro na busca de emails similares: {str(e)}")
+
+    classificados = [None] * len(itens)
+    pendentes = [indice for indice, similar in enumerate(similares) if similar is None]
+    if pendentes and app.config.get("GEMINI_MODE", MODO_SEPARADO) != MODO_COMBINADO:
+        try:
+            with app.app_context():
+                lote = classificar_lote([itens[indice][1] for indice in pendentes])
+            for indice, classificado in zip(pendentes, lote):
+                classificados[indice] = classificado
+        except Exception as e:
+            print(f"Erro na classificação em lote, classificando item a item: {str(e)}")
+
+    def _responder(texto_original, texto_limpo, similar, classificado):
+        if similar is not None:
+            return similar
+        # Cada thread precisa do seu próprio contexto de aplicação (acesso ao banco pelo cache)
+        with app.app_context():
+            if classificado is None:
+                return classificar_e_responder(texto_limpo, texto_original, remetente, user_id)
+            categoria, confianca = classificado
+            return categoria, responder(categoria, texto_limpo, texto_original, remetente, user_id), confianca
+
+    with ThreadPoolExecutor(max_workers=max(1, GEMINI_CONCURRENCY)) as pool:
+        futuros = [
+            pool.submit(_responder, texto_original, texto_limpo, similar, classificado)
+            for (texto_original, texto_limpo), similar, classificado in zip(itens, similares, classificados)
+        ]
+        for indice, futuro in enumerate(futuros):
+            try:
+                categoria, resposta, confianca = futuro.result()
+                yield indice, categoria, resposta, confianca, None
+            except Exception as e:
+                yield indice, None, None, None, e
+
+
+# Modo ASGI (asgi.py): as mesmas etapas, com as chamadas ao Gemini pelo client assíncrono. O que é
+# síncrono (banco, spaCy, modelo local) roda em threads, cada uma com o seu contexto de aplicação.
+
+async def em_thread(app, funcao, *args):
+    """Executa uma função síncrona em uma thread, dentro de um contexto de aplicação próprio."""
+    def executar():
+        with app.app_context():
+            return funcao(*args)
+    return await asyncio.to_thread(executar)
+
+
+async def responder_async(app, categoria: str, texto_limpo: str, texto_original: str, remetente: str,
+                          user_id: int = None) -> str:
+    """Versão assíncrona de responder."""
+    chave = chave_resposta(categoria, texto_limpo, texto_original, remetente, user_id)
+    resposta = await em_thread(app, reply_cache.get, chave)
+    if resposta is not None:
+        return resposta
+
+    if categoria == "Improdutivo" and REPLY_TEMPLATES_IMPRODUTIVO:
+        reply_cache.registrar_template()
+        return renderizar_improdutivo(texto_limpo, remetente)
+
+    resposta = await generate_reply_gemini_async(categoria, texto_original, remetente)
+    await em_thread(app, reply_cache.set, chave, categoria, remetente, resposta)
+    return resposta
+
+
+async def classificar_async(app, texto_limpo: str) -> tuple[str, float | None]:
+    """Versão assíncrona de classificar."""
+    chave = chave_conteudo(texto_limpo)
+    resultado = await em_thread(app, _categoria_sem_llm, texto_limpo, chave)
+    if resultado is not None:
+        return resultado
+
+    try:
+        categoria, confianca = await classify_email_gemini_async(texto_limpo)
+    except GeminiIndisponivel as e:
+        return await em_thread(app, _fallback_local, texto_limpo, e)
+    await em_thread(app, classification_cache.set, chave, categoria, confianca)
+    return categoria, confianca
+
+
+async def classificar_e_responder_async(app, texto_limpo: str, texto_original: str, remetente: str,
+                                        user_id: int = None) -> tuple[str, str, float | None]:
+    """Versão assíncrona de classificar_e_responder."""
+    similar = await em_thread(app, reaproveitar_similar, user_id, texto_limpo, texto_original)
+    if similar is not None:
+        return similar
+
+    if app.config.get("GEMINI_MODE", MODO_SEPARADO) == MODO_COMBINADO:
+        chave = chave_conteudo(texto_limpo)
+        resultado = await em_thread(app, _categoria_sem_llm, texto_limpo, chave)
+        if resultado is not None:
+            categoria, confianca = resultado
+            resposta = await responder_async(app, categoria, texto_limpo, texto_original, remetente, user_id)
+            return categoria, resposta, confianca
+        try:
+            categoria, resposta, confianca = await classify_and_reply_gemini_async(texto_limpo, texto_original, remetente)
+            await em_thread(app, _guardar_combinado, chave, texto_limpo, texto_original, remetente, categoria, resposta,
+                            confianca, user_id)
+            return categoria, resposta, confianca
+        except ValueError as e:
+            print(f"Saída combinada inválida, usando fluxo separado: {str(e)}")
+        except GeminiIndisponivel as e:
+            # Circuito aberto ou prazo esgotado: o fluxo separado recorre ao classificador local
+            print(f"Gemini indisponível na chamada combinada, usando fluxo separado: {str(e)}")
+
+    categoria, confianca = await classificar_async(app, texto_limpo)
+    return categoria, await responder_async(app, categoria, texto_limpo, texto_original, remetente, user_id), confianca
+
+
+async def classificar_lote_async(app, textos_limpos: list[str]) -> list[tuple]:
+    """Versão assíncrona de classificar_lote."""
+    chaves = [chave_conteudo(texto) for texto in textos_limpos]
+    textos_por_chave = dict(zip(chaves, textos_limpos))
+    resultados = await em_thread(app, _categorias_sem_llm, textos_por_chave)
+
+    pendentes = [chave for chave, resultado in resultados.items() if resultado is None]
+    if pendentes:
+        try:
+            classificados = await classify_emails_batch_async([textos_por_chave[chave] for chave in pendentes])
+        except GeminiIndisponivel as e:
+            for chave in pendentes:
+                resultados[chave] = await em_thread(app, _fallback_local, textos_por_chave[chave], e)
+        else:
+            for chave, (categoria, confianca) in zip(pendentes, classificados):
+                await em_thread(app, classification_cache.set, chave, categoria, confianca)
+                resultados[chave] = (categoria, confianca)
+
+    return [resultados[chave] for chave in chaves]
+
+
+def _reaproveitar_varios(user_id: int, itens) -> list:
+    return [reaproveitar_similar(user_id, texto_limpo, texto_original) for texto_original, texto_limpo in itens]
+
+
+async def classificar_varios_async(app, itens, remetente: str, user_id: int = None) -> list[tuple]:
+    """
+    Versão assíncrona de iterar_classificacoes, com as mesmas etapas (quase-duplicatas, lote,
+    respostas com no máximo GEMINI_CONCURRENCY chamadas simultâneas por requisição).
+    Retorna uma lista de (categoria, resposta, confiança, erro) na ordem de `itens`.
+    """
+    similares = [None] * len(itens)
+    if itens and user_id is not None:
+        try:
+            similares = await em_thread(app, _reaproveitar_varios, user_id, itens)
+        except Exception as e:
+            print(f"Erro na busca de emails similares: {str(e)}")
+
+    classificados = [None] * len(itens)
+    pendentes = [indice for indice, similar in enumerate(similares) if similar is None]
+    if pendentes and app.config.get("GEMINI_MODE", MODO_SEPARADO) != MODO_COMBINADO:
+        try:
+            lote = await classificar_lote_async(app, [itens[indice][1] for indice in pendentes])
+            for indice, classificado in zip(pendentes, lote):
+                classificados[indice] = classificado
+        except Exception as e:
+            print(f"Erro na classificação em lote, classificando item a item: {str(e)}")
+
+    limite = asyncio.Semaphore(max(1, GEMINI_CONCURRENCY))
+
+    async def _responder(texto_original, texto_limpo, similar, classificado):
+        if similar is not None:
+            return similar
+        async with limite:
+            if classificado is None:
+                return await classificar_e_responder_async(app, texto_limpo, texto_original, remetente, user_id)
+            categoria, confianca = classificado
+            resposta = await responder_async(app, categoria, texto_limpo, texto_original, remetente, user_id)
+            return categoria, resposta, confianca
+
+    resultados = await asyncio.gather(
+        *(_responder(texto_original, texto_limpo, similar, classificado)
+          for (texto_original, texto_limpo), similar, classificado in zip(itens, similares, classificados)),
+        return_exceptions=True
+    )
+    return [(None, None, None, r) if isinstance(r, Exception) else (*r, None) for r in resultados]
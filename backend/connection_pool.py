@@ -0,0 +1,184 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolEsgotado(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo de espera."""
+
+
+class ConnectionPool:
+    """
+    Pool genérico de conexões autenticadas, agrupadas por chave (ex.: conta do usuário).
+    - conexões ociosas por mais de `idle_timeout` segundos são fechadas;
+    - conexões reaproveitadas após `health_check_apos` segundos parado passam por um health check;
+    - o total de conexões abertas (livres + em uso) é limitado por `max_total`.
+    Subclasses implementam _conectar, _saudavel e _fechar.
+    """
+
+    def __init__(self, idle_timeout: float, health_check_apos: float, max_por_chave: int, max_total: int,
+                 espera_maxima: float = 30.0):
+        self.idle_timeout = idle_timeout
+        self.health_check_apos = health_check_apos
+        self.max_por_chave = max_por_chave
+        self.max_total = max_total
+        self.espera_maxima = espera_maxima
+        self._livres = {}  # chave -> lista de (conexão, instante do último uso)
+        self._em_uso = {}  # chave -> quantidade de conexões emprestadas
+        self._total = 0
+        self._cond = threading.Condition()
+        self.estatisticas_uso = {"criadas": 0, "reutilizadas": 0, "descartadas": 0, "expiradas": 0}
+
+    # Implementados pelas subclasses
+    def _conectar(self, credenciais):
+        raise NotImplementedError
+
+    def _saudavel(self, conexao) -> bool:
+        raise NotImplementedError
+
+    def _fechar(self, conexao):
+        raise NotImplementedError
+
+    def _fechar_silenciosamente(self, conexao):
+        try:
+            self._fechar(conexao)
+        except Exception:
+            pass
+
+    def _remover_ociosas(self, agora):
+        """Retira do pool as conexões ociosas além do timeout. Deve ser chamado com o lock adquirido."""
+        expiradas = []
+        for chave, livres in list(self._livres.items()):
+            ativas = [(c, t) for c, t in livres if agora - t < self.idle_timeout]
+            expiradas.extend(c for c, t in livres if agora - t >= self.idle_timeout)
+            if ativas:
+                self._livres[chave] = ativas
+            else:
+                del self._livres[chave]
+        self._total -= len(expiradas)
+        self.estatisticas_uso["expiradas"] += len(expiradas)
+        return expiradas
+
+    def _remover_ociosa_mais_antiga(self):
+        """Libera espaço fechando a conexão livre mais antiga de qualquer chave. Chamado com o lock adquirido."""
+        candidatas = [(livres[0][1], chave) for chave, livres in self._livres.items() if livres]
+        if not candidatas:
+            return None
+        _, chave = min(candidatas)
+        conexao, _ = self._livres[chave].pop(0)
+        if not self._livres[chave]:
+            del self._livres[chave]
+        self._total -= 1
+        self.estatisticas_uso["expiradas"] += 1
+        return conexao
+
+    def _contar(self, campo):
+        """Incrementa um contador de estatisticas_uso fora de um trecho que já tem o lock."""
+        with self._cond:
+            self.estatisticas_uso[campo] += 1
+
+    def _adquirir(self, chave, credenciais):
+        para_fechar = []
+        reutilizada = None
+        prazo = time.monotonic() + self.espera_maxima
+
+        with self._cond:
+            while True:
+                agora = time.monotonic()
+                para_fechar.extend(self._remover_ociosas(agora))
+
+                livres = self._livres.get(chave)
+                if livres:
+                    reutilizada = livres.pop()
+                    if not livres:
+                        del self._livres[chave]
+                    break
+
+                em_uso = self._em_uso.get(chave, 0)
+                if em_uso < self.max_por_chave:
+                    if self._total < self.max_total:
+                        self._total += 1
+                        break
+                    antiga = self._remover_ociosa_mais_antiga()
+                    if antiga is not None:
+                        para_fechar.append(antiga)
+                        self._total += 1
+                        break
+
+                restante = prazo - agora
+                if restante <= 0:
+                    raise PoolEsgotado("Limite de conexões abertas atingido")
+                self._cond.wait(restante)
+
+            self._em_uso[chave] = self._em_uso.get(chave, 0) + 1
+
+        for conexao in para_fechar:
+            self._fechar_silenciosamente(conexao)
+
+        if reutilizada is not None:
+            conexao, ultimo_uso = reutilizada
+            if time.monotonic() - ultimo_uso < self.health_check_apos or self._saudavel(conexao):
+                self._contar("reutilizadas")
+                return conexao
+            # Conexão caída: descarta e reconecta ocupando a mesma vaga
+            self._fechar_silenciosamente(conexao)
+            self._contar("descartadas")
+
+        try:
+            conexao = self._conectar(credenciais)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._em_uso[chave] -= 1
+                self._cond.notify()
+            raise
+        self._contar("criadas")
+        return conexao
+
+    def _devolver(self, chave, conexao):
+        with self._cond:
+            self._em_uso[chave] -= 1
+            self._livres.setdefault(chave, []).append((conexao, time.monotonic()))
+            self._cond.notify()
+
+    def _descartar(self, chave, conexao):
+        with self._cond:
+            self._em_uso[chave] -= 1
+            self._total -= 1
+            self.estatisticas_uso["descartadas"] += 1
+            self._cond.notify()
+        self._fechar_silenciosamente(conexao)
+
+    @contextmanager
+    def conexao(self, chave, credenciais):
+        """
+        Empresta uma conexão autenticada para `chave`. Se o bloco levantar exceção,
+        a conexão é descartada (pode estar em estado inconsistente); senão volta ao pool.
+        """
+        conexao = self._adquirir(chave, credenciais)
+        try:
+            yield conexao
+        except BaseException:
+            self._descartar(chave, conexao)
+            raise
+        self._devolver(chave, conexao)
+
+    def fechar_todas(self):
+        """Fecha as conexões livres (ex.: no encerramento do processo)."""
+        with self._cond:
+            livres = [c for lista in self._livres.values() for c, _ in lista]
+            self._livres.clear()
+            self._total -= len(livres)
+            self._cond.notify_all()
+        for conexao in livres:
+            self._fechar_silenciosamente(conexao)
+
+    def estatisticas(self) -> dict:
+        with self._cond:
+            return {
+                **self.estatisticas_uso,
+                "abertas": self._total,
+                "livres": sum(len(l) for l in self._livres.values()),
+                "em_uso": sum(self._em_uso.values()),
+                "max_total": self.max_total,
+            }
@@ -0,0 +1,159 @@
+import os
+import re
+from html.parser import HTMLParser
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # lxml é opcional: sem ele, usa o parser em streaming da biblioteca padrão
+    lxml = None
+
+# Limites para emails muito grandes (ex.: newsletters com HTML de vários MB)
+EMAIL_HTML_MAX_CHARS = int(os.getenv("EMAIL_HTML_MAX_CHARS", 512 * 1024))
+EMAIL_TEXT_MAX_CHARS = int(os.getenv("EMAIL_TEXT_MAX_CHARS", 20000))
+
+# Conteúdo que nunca é texto visível
+TAGS_IGNORADAS = {"script", "style", "head", "title", "noscript", "template", "svg"}
+# Tags que quebram linha no texto extraído
+TAGS_BLOCO = {
+    "address", "article", "blockquote", "br", "dd", "div", "dl", "dt", "footer", "form", "h1", "h2", "h3",
+    "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "td", "th",
+    "tr", "ul",
+}
+
+# Início de histórico citado em respostas e encaminhamentos (Gmail, Outlook, Apple Mail; pt e en)
+_INICIO_CITACAO = re.compile(
+    r"^\s*(?:"
+    r"Em [^\n]{0,200}(?:\n[^\n]{0,100})?escreveu:"
+    r"|On [^\n]{0,200}(?:\n[^\n]{0,100})?wrote:"
+    r"|-{2,}\s*(?:Mensagem original|Original Message|Forwarded message|Mensagem encaminhada)\s*-{2,}"
+    r"|(?:De|From):\s.+\n\s*(?:Enviad[ao](?: em)?|Sent|Data|Date):\s"
+    r"|_{20,}"
+    r")",
+    re.IGNORECASE | re.MULTILINE
+)
+# Assinaturas: delimitador padrão "-- " e rodapés automáticos de apps de email
+_INICIO_ASSINATURA = re.compile(
+    r"^(?:-- ?$|(?:Enviado do meu|Enviado de meu|Sent from my|Get Outlook for)\b.*$)",
+    re.IGNORECASE | re.MULTILINE
+)
+_LINHAS_EM_BRANCO = re.compile(r"\n\s*\n+")
+_ESPACOS = re.compile(r"[ \t\r\f\v\u00a0]+")
+
+
+class _ExtratorHTML(HTMLParser):
+    """Tokenizador em streaming da biblioteca padrão: acumula apenas o texto visível."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.partes = []
+        self._ignorando = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in TAGS_IGNORADAS:
+            self._ignorando += 1
+        elif tag in TAGS_BLOCO:
+            self.partes.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in TAGS_BLOCO:
+            self.partes.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in TAGS_IGNORADAS:
+            self._ignorando = max(0, self._ignorando - 1)
+        elif tag in TAGS_BLOCO:
+            self.partes.append("\n")
+
+    def handle_data(self, data):
+        if not self._ignorando:
+            self.partes.append(data)
+
+
+def _html_para_texto_lxml(html: str) -> str:
+    try:
+        raiz = lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        # Documento vazio ou string com declaração de encoding: o parser da biblioteca padrão resolve
+        return _html_para_texto_stdlib(html)
+    etree.strip_elements(raiz, *TAGS_IGNORADAS, etree.Comment, with_tail=False)
+    # Quebra de linha após cada bloco para não colar parágrafos e células de tabela
+    for elemento in raiz.iter(*TAGS_BLOCO):
+        elemento.tail = "\n" + (elemento.tail or "")
+    return raiz.text_content()
+
+
+def _html_para_texto_stdlib(html: str) -> str:
+    extrator = _ExtratorHTML()
+    extrator.feed(html)
+    extrator.close()
+    return "".join(extrator.partes)
+
+
+def normalizar_espacos(texto: str) -> str:
+    linhas = (_ESPACOS.sub(" ", linha).strip() for linha in texto.split("\n"))
+    return _LINHAS_EM_BRANCO.sub("\n\n", "\n".join(linhas)).strip()
+
+
+def html_para_texto(html: str) -> str:
+    """
+    Converte HTML em texto com lxml (ou com o parser em streaming da biblioteca padrão, se lxml
+    não estiver instalado). O HTML é truncado em EMAIL_HTML_MAX_CHARS caracteres antes do parsing.
+    """
+    html = html[:EMAIL_HTML_MAX_CHARS]
+    texto = _html_para_texto_lxml(html) if lxml is not None else _html_para_texto_stdlib(html)
+    return normalizar_espacos(texto)
+
+
+def remover_citacoes(texto: str) -> str:
+    """Remove histórico citado (respostas e encaminhamentos), linhas com '>' e a assinatura."""
+    inicio = _INICIO_CITACAO.search(texto)
+    if inicio and inicio.start() > 0:
+        texto = texto[:inicio.start()]
+
+    texto = "\n".join(linha for linha in texto.split("\n") if not linha.lstrip().startswith(">"))
+
+    assinatura = _INICIO_ASSINATURA.search(texto)
+    if assinatura and assinatura.start() > 0:
+        texto = texto[:assinatura.start()]
+    return texto.strip()
+
+
+def limpar_corpo(texto: str, html: bool = False) -> str:
+    """
+    Prepara o corpo de um email para o NLP: converte HTML, remove citações e assinatura e
+    limita o tamanho a EMAIL_TEXT_MAX_CHARS. Se a limpeza esvaziar o texto (ex.: email só com
+    uma citação), mantém o texto original.
+    """
+    texto = html_para_texto(texto) if html else normalizar_espacos(texto)
+    limpo = remover_citacoes(texto) or texto
+    return limpo[:EMAIL_TEXT_MAX_CHARS]
+
+
+def _decodificar(payload: bytes, charset) -> str:
+    try:
+        return payload.decode(charset or "utf-8", errors="ignore")
+    except LookupError:
+        return payload.decode("utf-8", errors="ignore")
+
+
+def extrair_corpo(msg) -> str:
+    """Extrai o corpo limpo de uma mensagem (email.message.Message), preferindo text/plain a text/html."""
+    html = None
+    for part in msg.walk():
+        if part.is_multipart() or "attachment" in str(part.get("Content-Disposition")):
+            continue
+        content_type = part.get_content_type()
+        if content_type not in ("text/plain", "text/html"):
+            continue
+
+        payload = part.get_payload(decode=True)
+        if not payload:
+            continue
+        conteudo = _decodificar(payload, part.get_content_charset())
+        if content_type == "text/plain":
+            return limpar_corpo(conteudo)
+        if html is None:
+            html = conteudo
+
+    return limpar_corpo(html, html=True) if html else ""
@@ -1,25 +1,66 @@
+import asyncio
+import json
+import math
 import os
 from google import genai
 from dotenv import load_dotenv
+from token_budget import ajustar, estimar_tokens, registrar_uso
+from gemini_resilience import executar, executar_async
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
+# Endpoint da API (configurável para apontar para um servidor local, ex.: o Gemini falso do benchmark de carga)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
 # Inicializa o client Gemini usando a chave de API do ambiente
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+client = genai.Client(
+    api_key=os.getenv("GEMINI_API_KEY"),
+    http_options={"base_url": GEMINI_BASE_URL} if GEMINI_BASE_URL else None
+)
 
 # Modelo Gemini utilizado para classificação e geração de resposta
 MODEL = "gemini-1.5-flash"
 
-def classify_email_gemini(texto_limpo: str) -> str:
+# Limites para o empacotamento de vários emails em uma única requisição
+BATCH_TOKEN_BUDGET = int(os.getenv("GEMINI_BATCH_TOKEN_BUDGET", 8000))
+BATCH_MAX_ITENS = int(os.getenv("GEMINI_BATCH_MAX_ITEMS", 50))
+
+def definir_cliente(novo_cliente):
     """
-    Classifica um email como 'Produtivo' ou 'Improdutivo' usando o modelo Gemini.
-    O prompt inclui exemplos claros para orientar a IA e restringe a resposta a apenas um dos dois termos.
+    Substitui o client usado nas chamadas (ex.: um client falso em testes, que só precisa
+    expor models.generate_content(model, contents, config) e, para o modo ASGI,
+    aio.models.generate_content com a mesma assinatura).
     """
-    prompt = f"""
-Classifique este email em 'Produtivo' ou 'Improdutivo':
+    global client
+    client = novo_cliente
+
+def _gerar(chamada: str, contents, config: dict | None = None):
+    """
+    Chama generate_content pela camada de resiliência (prazo por tentativa, retentativas e
+    circuit breaker; ver gemini_resilience.executar).
+    """
+    def tentativa(timeout_segundos):
+        return client.models.generate_content(model=MODEL, contents=contents,
+                                              config=_config_tentativa(config, timeout_segundos))
+
+    return executar(chamada, tentativa)
+
+async def _gerar_async(chamada: str, contents, config: dict | None = None):
+    """Versão assíncrona de _gerar, com o client assíncrono (client.aio) e gemini_resilience.executar_async."""
+    async def tentativa(timeout_segundos):
+        return await client.aio.models.generate_content(model=MODEL, contents=contents,
+                                                        config=_config_tentativa(config, timeout_segundos))
 
-Exemplos IMPRODUTIVO:
+    return await executar_async(chamada, tentativa)
+
+def _config_tentativa(config: dict | None, timeout_segundos: float) -> dict:
+    configuracao = dict(config or {})
+    configuracao["http_options"] = {"timeout": max(1, int(timeout_segundos * 1000))}
+    return configuracao
+
+# Exemplos few-shot compartilhados pelos prompts de classificação
+EXEMPLOS_CLASSIFICACAO = """Exemplos IMPRODUTIVO:
 Email: "Feliz Natal e próspero ano novo!"
 Classificação: Improdutivo
 
@@ -36,7 +77,54 @@ Email: "Olá, podem me enviar o relatório de vendas do mês passado?"
 Classificação: Produtivo
 
 Solicitações de suporte técnico, atualização sobre casos em aberto, dúvidas sobre o sistema são sempre classificam o email como PRODUTIVO.
+"""
+
+def _confiancas_rotulos(resp, rotulos: list[str]) -> list:
+    """
+    Estima a confiança de cada rótulo a partir dos logprobs dos tokens escolhidos pelo modelo:
+    a probabilidade de um rótulo é exp(soma dos logprobs dos tokens que o compõem).
+    Os rótulos são localizados em sequência no texto gerado. Sem logprobs por token,
+    usa avg_logprobs da resposta; sem nenhum dos dois, retorna None para cada rótulo.
+    """
+    try:
+        candidato = resp.candidates[0]
+    except (AttributeError, IndexError, TypeError):
+        return [None] * len(rotulos)
 
+    escolhidos = getattr(getattr(candidato, "logprobs_result", None), "chosen_candidates", None)
+    if not escolhidos:
+        media = getattr(candidato, "avg_logprobs", None)
+        return [round(math.exp(media), 4) if media is not None else None] * len(rotulos)
+
+    # Reconstrói o texto gerado guardando o intervalo de cada token
+    texto, intervalos = "", []
+    for token in escolhidos:
+        inicio = len(texto)
+        texto += token.token or ""
+        intervalos.append((inicio, len(texto), token.log_probability or 0.0))
+
+    confiancas, cursor = [], 0
+    for rotulo in rotulos:
+        posicao = texto.find(rotulo, cursor)
+        if posicao < 0:
+            confiancas.append(None)
+            continue
+        fim = posicao + len(rotulo)
+        soma = sum(logprob for inicio, final, logprob in intervalos if inicio < fim and final > posicao)
+        confiancas.append(round(math.exp(soma), 4))
+        cursor = fim
+    return confiancas
+
+def _pedido_classificacao(texto_limpo: str) -> tuple[str, dict]:
+    """
+    Monta o prompt e a configuração da classificação de um email.
+    O prompt inclui exemplos claros para orientar a IA e restringe a resposta a apenas um dos dois termos.
+    """
+    texto_limpo = ajustar(texto_limpo, "classificacao")
+    prompt = f"""
+Classifique este email em 'Produtivo' ou 'Improdutivo':
+
+{EXEMPLOS_CLASSIFICACAO}
 O email que você deve analisar é o seguinte: "{texto_limpo}"
 
 A classificação deve ser apenas os termos 'Produtivo' ou 'Improdutivo'. Não inclua explicações ou justificativas.
@@ -47,24 +135,181 @@ Saída esperada: "Classificação: [Produtivo/Improdutivo]"""
         "type": "string",
         "enum": ["Produtivo", "Improdutivo"]
     }
+    return prompt, {
+        "response_mime_type": "text/x.enum",
+        "response_schema": response_schema,
+        "response_logprobs": True
+    }
+
+def _interpretar_classificacao(resp, prompt: str) -> tuple[str, float | None]:
+    registrar_uso("classificacao", resp, estimar_tokens(prompt))
+    # Usa apenas a última linha da resposta, que deve conter a classificação
+    categoria = resp.text.strip().splitlines()[-1]
+    return categoria, _confiancas_rotulos(resp, [categoria])[0]
+
+def classify_email_gemini(texto_limpo: str) -> tuple[str, float | None]:
+    """
+    Classifica um email como 'Produtivo' ou 'Improdutivo' usando o modelo Gemini.
+    Retorna (categoria, confiança), com a confiança derivada dos logprobs do modelo.
+    """
+    prompt, config = _pedido_classificacao(texto_limpo)
     # Chama o modelo Gemini para classificar o email
-    resp = client.models.generate_content(
-        model=MODEL,
-        contents=[{"text": prompt}],
-        config={
-            "response_mime_type": "text/x.enum",
-            "response_schema": response_schema
+    resp = _gerar("classificacao", contents=[{"text": prompt}], config=config)
+    return _interpretar_classificacao(resp, prompt)
+
+async def classify_email_gemini_async(texto_limpo: str) -> tuple[str, float | None]:
+    """Versão assíncrona de classify_email_gemini."""
+    prompt, config = _pedido_classificacao(texto_limpo)
+    resp = await _gerar_async("classificacao", contents=[{"text": prompt}], config=config)
+    return _interpretar_classificacao(resp, prompt)
+
+def _dividir_em_lotes(texts: list[str]) -> list[list[int]]:
+    """Agrupa os índices dos textos em lotes que respeitam o orçamento de tokens e o limite de itens."""
+    lotes, atual, tokens = [], [], 0
+    for indice, texto in enumerate(texts):
+        # Margem para o rótulo "Email N:" e as aspas de cada item
+        custo = estimar_tokens(texto) + 8
+        if atual and (tokens + custo > BATCH_TOKEN_BUDGET or len(atual) >= BATCH_MAX_ITENS):
+            lotes.append(atual)
+            atual, tokens = [], 0
+        atual.append(indice)
+        tokens += custo
+    if atual:
+        lotes.append(atual)
+    return lotes
+
+def _pedido_lote(texts: list[str]) -> tuple[str, dict]:
+    """Monta o prompt e a configuração da classificação de um lote de emails em uma única chamada estruturada."""
+    emails = "\n\n".join(f'Email {i}: "{texto}"' for i, texto in enumerate(texts))
+    prompt = f"""
+Classifique cada um dos emails abaixo em 'Produtivo' ou 'Improdutivo':
+
+{EXEMPLOS_CLASSIFICACAO}
+Os emails que você deve analisar são os seguintes:
+
+{emails}
+
+Retorne um item para cada email, com o número do email em "indice" e a classificação em "categoria".
+A classificação deve ser apenas os termos 'Produtivo' ou 'Improdutivo'. Não inclua explicações ou justificativas."""
+    # Define o schema esperado: uma lista de pares (índice, categoria)
+    response_schema = {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "indice": {"type": "integer"},
+                "categoria": {"type": "string", "enum": ["Produtivo", "Improdutivo"]}
+            },
+            "required": ["indice", "categoria"]
         }
+    }
+    return prompt, {
+        "response_mime_type": "application/json",
+        "response_schema": response_schema,
+        "response_logprobs": True
+    }
+
+def _interpretar_lote(resp, prompt: str, texts: list[str]) -> dict[int, tuple]:
+    """
+    Retorna {posição no lote: (categoria, confiança)} apenas para os itens válidos da saída;
+    levanta ValueError se a saída não for um JSON utilizável.
+    """
+    registrar_uso(f"lote ({len(texts)} emails)", resp, estimar_tokens(prompt))
+
+    try:
+        itens = json.loads(resp.text)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Saída do lote não é um JSON válido: {e}")
+    if not isinstance(itens, list):
+        raise ValueError("Saída do lote não é uma lista")
+
+    itens = [item for item in itens if isinstance(item, dict)]
+    # Os rótulos aparecem no texto gerado na mesma ordem dos itens da lista
+    confiancas = _confiancas_rotulos(
+        resp, [item.get("categoria") for item in itens if item.get("categoria") in ("Produtivo", "Improdutivo")]
     )
-    # Retorna apenas a última linha da resposta, que deve conter a classificação
-    return resp.text.strip().splitlines()[-1]
 
-def generate_reply_gemini(categoria: str, texto_original: str, remetente: str) -> str:
+    categorias = {}
+    for item in itens:
+        indice = item.get("indice")
+        categoria = item.get("categoria")
+        if categoria not in ("Produtivo", "Improdutivo"):
+            continue
+        confianca = confiancas.pop(0)
+        if isinstance(indice, int) and 0 <= indice < len(texts):
+            categorias.setdefault(indice, (categoria, confianca))
+    return categorias
+
+def _classificar_lote_gemini(texts: list[str]) -> dict[int, tuple]:
+    """Classifica um lote de emails em uma única chamada (ver _interpretar_lote)."""
+    prompt, config = _pedido_lote(texts)
+    resp = _gerar("lote", contents=[{"text": prompt}], config=config)
+    return _interpretar_lote(resp, prompt, texts)
+
+async def _classificar_lote_gemini_async(texts: list[str]) -> dict[int, tuple]:
+    prompt, config = _pedido_lote(texts)
+    resp = await _gerar_async("lote", contents=[{"text": prompt}], config=config)
+    return _interpretar_lote(resp, prompt, texts)
+
+def classify_emails_batch(texts: list[str]) -> list[tuple]:
     """
-    Gera uma resposta automática para o email, adaptando o tom e o formato conforme a categoria.
+    Classifica vários emails pré-processados, pagando o prompt few-shot uma vez por lote.
+    Os textos são divididos em lotes pelo orçamento de tokens; itens ausentes ou malformados
+    na saída de um lote são reclassificados individualmente com classify_email_gemini.
+    Retorna uma lista de (categoria, confiança) na ordem dos textos.
+    """
+    # Cada email do lote é limitado ao orçamento por item antes do empacotamento
+    texts = [ajustar(texto, "lote_item") for texto in texts]
+    categorias = [None] * len(texts)
+
+    for lote in _dividir_em_lotes(texts):
+        try:
+            parcial = _classificar_lote_gemini([texts[i] for i in lote])
+        except ValueError as e:
+            print(f"Saída do lote inválida, classificando item a item: {str(e)}")
+            parcial = {}
+        for posicao, indice in enumerate(lote):
+            categorias[indice] = parcial.get(posicao)
+
+    # Fallback por item para o que o lote não resolveu
+    for indice, categoria in enumerate(categorias):
+        if categoria is None:
+            categorias[indice] = classify_email_gemini(texts[indice])
+
+    return categorias
+
+async def classify_emails_batch_async(texts: list[str]) -> list[tuple]:
+    """Versão assíncrona de classify_emails_batch: os lotes e os fallbacks por item vão à API ao mesmo tempo."""
+    texts = [ajustar(texto, "lote_item") for texto in texts]
+    categorias = [None] * len(texts)
+
+    lotes = _dividir_em_lotes(texts)
+    parciais = await asyncio.gather(
+        *(_classificar_lote_gemini_async([texts[i] for i in lote]) for lote in lotes), return_exceptions=True
+    )
+    for lote, parcial in zip(lotes, parciais):
+        if isinstance(parcial, ValueError):
+            print(f"Saída do lote inválida, classificando item a item: {str(parcial)}")
+            parcial = {}
+        elif isinstance(parcial, BaseException):
+            raise parcial
+        for posicao, indice in enumerate(lote):
+            categorias[indice] = parcial.get(posicao)
+
+    pendentes = [indice for indice, categoria in enumerate(categorias) if categoria is None]
+    resultados = await asyncio.gather(*(classify_email_gemini_async(texts[indice]) for indice in pendentes))
+    for indice, categoria in zip(pendentes, resultados):
+        categorias[indice] = categoria
+
+    return categorias
+
+def _pedido_resposta(categoria: str, texto_original: str, remetente: str) -> str:
+    """
+    Monta o prompt da resposta automática, adaptando o tom e o formato conforme a categoria.
     - Para emails produtivos: resposta formal e objetiva.
     - Para improdutivos: resposta educada e breve.
     """
+    texto_original = ajustar(texto_original, "resposta")
     if categoria.lower() == "produtivo":
         # Prompt para resposta formal e direta, para emails produtivos
         reply_prompt = f"""
@@ -99,10 +344,87 @@ def generate_reply_gemini(categoria: str, texto_original: str, remetente: str) -
     Atenciosamente,
     {remetente}.
     """
+    return reply_prompt
+
+def generate_reply_gemini(categoria: str, texto_original: str, remetente: str) -> str:
+    """Gera uma resposta automática para o email (ver _pedido_resposta)."""
+    reply_prompt = _pedido_resposta(categoria, texto_original, remetente)
     # Chama o modelo Gemini para gerar a resposta automática
-    resp = client.models.generate_content(
-        model=MODEL,
-        contents=[{"text": reply_prompt}]
-    )
+    resp = _gerar("resposta", contents=[{"text": reply_prompt}])
+    registrar_uso("resposta", resp, estimar_tokens(reply_prompt))
     # Retorna a resposta gerada, já formatada
     return resp.text.strip()
+
+async def generate_reply_gemini_async(categoria: str, texto_original: str, remetente: str) -> str:
+    """Versão assíncrona de generate_reply_gemini."""
+    reply_prompt = _pedido_resposta(categoria, texto_original, remetente)
+    resp = await _gerar_async("resposta", contents=[{"text": reply_prompt}])
+    registrar_uso("resposta", resp, estimar_tokens(reply_prompt))
+    return resp.text.strip()
+
+def _pedido_combinado(texto_limpo: str, texto_original: str, remetente: str) -> tuple[str, dict]:
+    """Monta o prompt e a configuração da chamada única de classificação + resposta."""
+    texto_limpo = ajustar(texto_limpo, "classificacao")
+    texto_original = ajustar(texto_original, "combinado")
+    prompt = f"""
+Você é um assistente profissional. Classifique o email abaixo em 'Produtivo' ou 'Improdutivo' e redija a resposta automática.
+
+{EXEMPLOS_CLASSIFICACAO}
+Versão pré-processada do email (use para classificar): "{texto_limpo}"
+
+Email original (use para responder): "{texto_original}"
+
+Regras para a resposta:
+- Se PRODUTIVO: resposta formal automática, curta (no máximo 100 palavras), respondendo diretamente as informações solicitadas pelo email.
+  NÃO inclua lacunas entre colchetes, do tipo [inserir data]/[inserir nome da etapa]/[inserir documento/item] SOB NENHUMA CIRCUNSTÂNCIA.
+  Formato: "Prezado(a) cliente (inclua o nome do cliente se ele foi enviado no corpo do email)," + texto da resposta + duas quebras de linha + "Atenciosamente,\n{remetente}."
+- Se IMPRODUTIVO: "Prezado(a)," + uma frase de agradecimento ou retribuição do que foi desejado + "Atenciosamente,\n{remetente}."
+"""
+    # Define o schema esperado: categoria restrita aos dois termos e resposta em texto
+    response_schema = {
+        "type": "object",
+        "properties": {
+            "categoria": {"type": "string", "enum": ["Produtivo", "Improdutivo"]},
+            "resposta": {"type": "string"}
+        },
+        "required": ["categoria", "resposta"]
+    }
+    return prompt, {
+        "response_mime_type": "application/json",
+        "response_schema": response_schema,
+        "response_logprobs": True
+    }
+
+def _interpretar_combinado(resp, prompt: str) -> tuple[str, str, float | None]:
+    """Valida a saída combinada; levanta ValueError se ela não for utilizável."""
+    registrar_uso("combinado", resp, estimar_tokens(prompt))
+
+    try:
+        dados = json.loads(resp.text)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Saída combinada não é um JSON válido: {e}")
+
+    categoria = dados.get("categoria") if isinstance(dados, dict) else None
+    resposta = dados.get("resposta") if isinstance(dados, dict) else None
+    if categoria not in ("Produtivo", "Improdutivo") or not isinstance(resposta, str) or not resposta.strip():
+        raise ValueError(f"Saída combinada inválida: {resp.text[:200]}")
+
+    return categoria, resposta.strip(), _confiancas_rotulos(resp, [categoria])[0]
+
+def classify_and_reply_gemini(texto_limpo: str, texto_original: str, remetente: str) -> tuple[str, str, float | None]:
+    """
+    Classifica o email e gera a resposta automática em uma única chamada ao Gemini.
+    A saída estruturada (JSON schema) traz a categoria e a resposta; se ela não passar na
+    validação, levanta ValueError para que o chamador use o fluxo de duas chamadas.
+    Retorna (categoria, resposta, confiança da categoria).
+    """
+    prompt, config = _pedido_combinado(texto_limpo, texto_original, remetente)
+    resp = _gerar("combinado", contents=[{"text": prompt}], config=config)
+    return _interpretar_combinado(resp, prompt)
+
+async def classify_and_reply_gemini_async(texto_limpo: str, texto_original: str,
+                                          remetente: str) -> tuple[str, str, float | None]:
+    """Versão assíncrona de classify_and_reply_gemini."""
+    prompt, config = _pedido_combinado(texto_limpo, texto_original, remetente)
+    resp = await _gerar_async("combinado", contents=[{"text": prompt}], config=config)
+    return _interpretar_combinado(resp, prompt)
@@ -0,0 +1,230 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+from google.genai import errors
+
+# Prazo de cada tentativa e prazo total da chamada (incluindo retentativas), em segundos
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 20))
+GEMINI_DEADLINE = float(os.getenv("GEMINI_DEADLINE", 45))
+# Retentativas com backoff exponencial e jitter completo: espera aleatória em [0, base * 2^n], até o máximo
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 3))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", 0.5))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", 8))
+# Circuit breaker: abre após N falhas seguidas e deixa passar uma chamada de teste após o intervalo
+GEMINI_CB_FAILURES = int(os.getenv("GEMINI_CB_FAILURES", 5))
+GEMINI_CB_RESET = float(os.getenv("GEMINI_CB_RESET", 30))
+
+# Códigos HTTP que indicam falha temporária da API (limite de requisições, sobrecarga, timeout)
+CODIGOS_RETENTAVEIS = {408, 429, 500, 502, 503, 504}
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+
+class GeminiIndisponivel(Exception):
+    """O Gemini não pôde ser usado: circuito aberto ou prazo da chamada esgotado."""
+
+
+class CircuitoAberto(GeminiIndisponivel):
+    """O circuito está aberto: a chamada falha imediatamente, sem ir à API."""
+
+
+def erro_retentavel(erro: Exception) -> bool:
+    """Falhas temporárias (rede, timeout, 429 e 5xx), que justificam nova tentativa e contam para o circuito."""
+    if isinstance(erro, errors.APIError):
+        return erro.code in CODIGOS_RETENTAVEIS
+    return isinstance(erro, (httpx.TimeoutException, httpx.TransportError, ConnectionError, TimeoutError,
+                             asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker com três estados:
+    - fechado: chamadas passam normalmente; `limite_falhas` falhas seguidas abrem o circuito;
+    - aberto: chamadas são rejeitadas até passar `tempo_reabertura` segundos;
+    - meio_aberto: uma única chamada de teste passa; sucesso fecha o circuito, falha o reabre.
+    """
+
+    def __init__(self, limite_falhas: int, tempo_reabertura: float):
+        self.limite_falhas = limite_falhas
+        self.tempo_reabertura = tempo_reabertura
+        self._estado = FECHADO
+        self._falhas = 0
+        self._aberto_em = 0.0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+        self.transicoes = {FECHADO: 0, ABERTO: 0, MEIO_ABERTO: 0}
+
+    def _mudar(self, estado):
+        if estado != self._estado:
+            self._estado = estado
+            self.transicoes[estado] += 1
+            print(f"Circuito do Gemini: {estado}")
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            if self._estado == ABERTO and time.monotonic() - self._aberto_em >= self.tempo_reabertura:
+                return MEIO_ABERTO
+            return self._estado
+
+    def permitir(self) -> bool:
+        """Indica se uma chamada pode ir à API agora (no meio aberto, só a chamada de teste)."""
+        with self._lock:
+            if self._estado == ABERTO:
+                if time.monotonic() - self._aberto_em < self.tempo_reabertura:
+                    return False
+                self._mudar(MEIO_ABERTO)
+            if self._estado == MEIO_ABERTO:
+                if self._teste_em_andamento:
+                    return False
+                self._teste_em_andamento = True
+            return True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._teste_em_andamento = False
+            self._mudar(FECHADO)
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._teste_em_andamento = False
+            if self._estado == MEIO_ABERTO or self._falhas >= self.limite_falhas:
+                self._aberto_em = time.monotonic()
+                self._mudar(ABERTO)
+
+    def liberar(self):
+        """Encerra uma chamada que não conta como sucesso nem falha (ex.: erro de requisição inválida)."""
+        with self._lock:
+            self._teste_em_andamento = False
+
+
+circuito = CircuitBreaker(GEMINI_CB_FAILURES, GEMINI_CB_RESET)
+
+_lock_metricas = threading.Lock()
+_metricas = {}
+
+
+def _contar(chamada: str, evento: str, quantidade: int = 1):
+    with _lock_metricas:
+        por_chamada = _metricas.setdefault(chamada, {})
+        por_chamada[evento] = por_chamada.get(evento, 0) + quantidade
+
+
+def _iniciar_tentativa(chamada: str, prazo: float) -> float:
+    """Consulta o circuito antes de cada tentativa e retorna o timeout dela."""
+    if not circuito.permitir():
+        _contar(chamada, "rejeitadas")
+        raise CircuitoAberto("Gemini temporariamente indisponível (circuito aberto)")
+    return min(GEMINI_TIMEOUT, prazo - time.monotonic())
+
+
+def _registrar_sucesso(chamada: str, inicio: float):
+    circuito.registrar_sucesso()
+    _contar(chamada, "sucessos")
+    _contar(chamada, "latencia_total_ms", int((time.monotonic() - inicio) * 1000))
+
+
+def _registrar_falha(chamada: str, erro: Exception) -> bool:
+    """Contabiliza a falha da tentativa. Retorna False se o erro não é retentável (deve ser propagado)."""
+    if not erro_retentavel(erro):
+        circuito.liberar()
+        _contar(chamada, "erros")
+        return False
+    circuito.registrar_falha()
+    _contar(chamada, "falhas")
+    return True
+
+
+def _proxima_espera(chamada: str, numero: int, prazo: float, erro: Exception):
+    """Espera antes da próxima tentativa, ou None se não há mais tentativas ou o prazo não comporta."""
+    espera = random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * 2 ** numero))
+    if numero == GEMINI_MAX_RETRIES or time.monotonic() + espera >= prazo:
+        return None
+    _contar(chamada, "retentativas")
+    print(f"Falha temporária no Gemini [{chamada}] ({str(erro)}), nova tentativa em {espera:.2f}s")
+    return espera
+
+
+def _esgotado(chamada: str, tentativas: int, erro: Exception) -> GeminiIndisponivel:
+    _contar(chamada, "esgotadas")
+    return GeminiIndisponivel(f"Gemini indisponível após {tentativas} tentativa(s): {str(erro)}")
+
+
+def executar(chamada: str, tentativa):
+    """
+    Executa `tentativa(timeout_segundos)` com prazo total GEMINI_DEADLINE, retentativas com
+    backoff exponencial e jitter em erros temporários e o circuit breaker compartilhado.
+    Levanta CircuitoAberto sem chamar a API quando o circuito está aberto e GeminiIndisponivel
+    quando o prazo se esgota; outros erros (ex.: requisição inválida) são propagados sem retentativa.
+    """
+    prazo = time.monotonic() + GEMINI_DEADLINE
+    _contar(chamada, "chamadas")
+
+    for numero in range(GEMINI_MAX_RETRIES + 1):
+        timeout = _iniciar_tentativa(chamada, prazo)
+        inicio = time.monotonic()
+        try:
+            resultado = tentativa(timeout)
+        except Exception as e:
+            if not _registrar_falha(chamada, e):
+                raise
+            ultimo_erro = e
+        else:
+            _registrar_sucesso(chamada, inicio)
+            return resultado
+
+        espera = _proxima_espera(chamada, numero, prazo, ultimo_erro)
+        if espera is None:
+            break
+        time.sleep(espera)
+
+    raise _esgotado(chamada, numero + 1, ultimo_erro) from ultimo_erro
+
+
+async def executar_async(chamada: str, tentativa):
+    """
+    Versão assíncrona de executar, para o modo ASGI: `tentativa(timeout_segundos)` é uma corrotina,
+    interrompida também por asyncio.wait_for ao fim do timeout, e as esperas entre tentativas não
+    bloqueiam o event loop. O circuito e as métricas são os mesmos do modo síncrono.
+    """
+    prazo = time.monotonic() + GEMINI_DEADLINE
+    _contar(chamada, "chamadas")
+
+    for numero in range(GEMINI_MAX_RETRIES + 1):
+        timeout = _iniciar_tentativa(chamada, prazo)
+        inicio = time.monotonic()
+        try:
+            resultado = await asyncio.wait_for(tentativa(timeout), timeout=max(timeout, 0.001))
+        except Exception as e:
+            if not _registrar_falha(chamada, e):
+                raise
+            ultimo_erro = e
+        else:
+            _registrar_sucesso(chamada, inicio)
+            return resultado
+
+        espera = _proxima_espera(chamada, numero, prazo, ultimo_erro)
+        if espera is None:
+            break
+        await asyncio.sleep(espera)
+
+    raise _esgotado(chamada, numero + 1, ultimo_erro) from ultimo_erro
+
+
+def estatisticas() -> dict:
+    """Estado do circuito, transições de estado e contadores por tipo de chamada."""
+    with _lock_metricas:
+        por_chamada = {chamada: dict(eventos) for chamada, eventos in _metricas.items()}
+    return {
+        "circuito": circuito.estado,
+        "transicoes": dict(circuito.transicoes),
+        "chamadas": por_chamada,
+    }
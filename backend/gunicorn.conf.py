@@ -0,0 +1,21 @@
+import os
+
+from preprocess import preload
+
+# Configuração do gunicorn para produção: gunicorn -c gunicorn.conf.py app:app
+# Modo ASGI (rotas de I/O assíncronas, ver asgi.py):
+#   gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:application
+# (no modo ASGI, `threads` não se aplica; as rotas do Flask usam ASGI_WSGI_THREADS)
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Carrega a aplicação no processo master antes do fork dos workers
+preload_app = True
+
+
+def when_ready(server):
+    # Modelos de NLP carregados uma vez no master e compartilhados por copy-on-write com os workers
+    tempos = preload()
+    server.log.info(f"Recursos de NLP pré-carregados: {tempos}")
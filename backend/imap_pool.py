@@ -0,0 +1,79 @@
+import imaplib
+import os
+from contextlib import contextmanager
+
+from connection_pool import ConnectionPool
+
+# Servidor IMAP (configurável para apontar para um servidor local de testes)
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_SSL = os.getenv("IMAP_SSL", "true").lower() == "true"
+IMAP_PORT = int(os.getenv("IMAP_PORT", 993 if IMAP_SSL else 143))
+IMAP_TIMEOUT = float(os.getenv("IMAP_TIMEOUT", 30))
+
+# Política do pool de sessões IMAP (o Gmail encerra sessões ociosas após cerca de 30 minutos)
+IMAP_POOL_IDLE_TIMEOUT = float(os.getenv("IMAP_POOL_IDLE_TIMEOUT", 300))
+IMAP_POOL_HEALTH_CHECK_APOS = float(os.getenv("IMAP_POOL_HEALTH_CHECK_AFTER", 5))
+IMAP_POOL_MAX_POR_USUARIO = int(os.getenv("IMAP_POOL_MAX_PER_USER", 2))
+IMAP_POOL_MAX_TOTAL = int(os.getenv("IMAP_POOL_MAX_TOTAL", 20))
+
+# Erros que indicam sessão perdida: vale reconectar e tentar de novo
+ERROS_CONEXAO = (imaplib.IMAP4.abort, ConnectionError, TimeoutError)
+
+
+class IMAPPool(ConnectionPool):
+    """Pool de sessões IMAP já autenticadas (conexão TLS + LOGIN feitos uma vez por sessão)."""
+
+    def _conectar(self, credenciais):
+        usuario, senha = credenciais
+        if IMAP_SSL:
+            mail = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT, timeout=IMAP_TIMEOUT)
+        else:
+            mail = imaplib.IMAP4(IMAP_HOST, IMAP_PORT, timeout=IMAP_TIMEOUT)
+        try:
+            mail.login(usuario, senha)
+        except Exception:
+            mail.shutdown()
+            raise
+        return mail
+
+    def _saudavel(self, conexao) -> bool:
+        # NOOP mantém a sessão viva no servidor e confirma que ela ainda responde
+        try:
+            return conexao.noop()[0] == "OK"
+        except (imaplib.IMAP4.error, OSError):
+            return False
+
+    def _fechar(self, conexao):
+        try:
+            conexao.logout()
+        except (imaplib.IMAP4.error, OSError):
+            conexao.shutdown()
+
+
+imap_pool = IMAPPool(
+    idle_timeout=IMAP_POOL_IDLE_TIMEOUT,
+    health_check_apos=IMAP_POOL_HEALTH_CHECK_APOS,
+    max_por_chave=IMAP_POOL_MAX_POR_USUARIO,
+    max_total=IMAP_POOL_MAX_TOTAL
+)
+
+
+@contextmanager
+def sessao_imap(user):
+    """Empresta uma sessão IMAP autenticada do usuário. A caixa é selecionada por quem a usa."""
+    with imap_pool.conexao((IMAP_HOST, user.email), (user.email, user.smtp_password)) as mail:
+        yield mail
+
+
+def com_caixa_entrada(user, operacao):
+    """
+    Executa `operacao(mail)` em uma sessão do pool. Se a sessão cair no meio (ex.: o servidor
+    encerrou a conexão ociosa), ela é descartada e a operação é repetida uma vez em uma sessão nova.
+    A operação deve ser segura para repetir (apenas leituras na caixa).
+    """
+    try:
+        with sessao_imap(user) as mail:
+            return operacao(mail)
+    except ERROS_CONEXAO:
+        with sessao_imap(user) as mail:
+            return operacao(mail)
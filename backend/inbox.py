@@ -0,0 +1,212 @@
+import email
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from bodystructure import escolher_parte_texto, linhas_fetch, parse_bodystructure
+from classifier import iterar_classificacoes
+from inbox_parse import extrair_bruto
+from preprocess import preprocess_batch
+
+# Processos para o parsing MIME das mensagens da caixa de entrada (por worker do servidor). O padrão (1)
+# extrai na própria thread: cada mensagem leva frações de milissegundo, e um processo novo leva segundos
+# para subir. Com mais processos, o pool só é usado a partir de INBOX_PROCESS_MIN_MESSAGES mensagens.
+INBOX_WORKERS = int(os.getenv("INBOX_WORKERS", 1))
+INBOX_PROCESS_MIN_MESSAGES = int(os.getenv("INBOX_PROCESS_MIN_MESSAGES", 200))
+
+# Caixa sincronizada (as sessões IMAP vêm do pool em imap_pool.py)
+IMAP_MAILBOX = os.getenv("IMAP_MAILBOX", "INBOX")
+
+# Modo de download: "parcial" busca BODYSTRUCTURE e depois só a parte de texto (até IMAP_FETCH_MAX_BYTES),
+# sem trafegar anexos; "completo" baixa a mensagem RFC822 inteira
+IMAP_FETCH_MODE = os.getenv("IMAP_FETCH_MODE", "parcial")
+IMAP_FETCH_MAX_BYTES = int(os.getenv("IMAP_FETCH_MAX_BYTES", 64 * 1024))
+
+# Pool de processos criado sob demanda e reaproveitado entre requisições
+_process_pool = None
+_lock_pool = threading.Lock()
+
+
+def _get_process_pool():
+    # spawn, como na extração de PDF (utils.py): o servidor já tem threads (outbox, jobs, chamadas ao
+    # Gemini) e um fork poderia herdar um lock adquirido no meio e travar o processo filho. Os filhos
+    # só importam inbox_parse (e email_body/bodystructure), não o classificador nem o spaCy.
+    global _process_pool
+    if _process_pool is None:
+        with _lock_pool:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(max_workers=INBOX_WORKERS,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+def selecionar_caixa(mail):
+    """Seleciona a caixa de entrada e retorna (quantidade de mensagens, UIDVALIDITY)."""
+    result, exists = mail.select(IMAP_MAILBOX)
+    if result != "OK":
+        raise RuntimeError(f"Falha no SELECT: {result}")
+    _, uidvalidity = mail.response("UIDVALIDITY")
+    return int(exists[-1]), int(uidvalidity[-1])
+
+
+def _uids_da_resposta(resposta):
+    uids = []
+    for item in resposta:
+        linha = item[0] if isinstance(item, tuple) else item
+        if isinstance(linha, bytes):
+            encontrado = re.search(rb"UID (\d+)", linha)
+            if encontrado:
+                uids.append(int(encontrado.group(1)))
+    return uids
+
+
+def uids_recentes(mail, total, quantidade):
+    """
+    UIDs das últimas `quantidade` mensagens, sem transferir a lista completa da caixa:
+    busca apenas o UID da faixa final de números de sequência.
+    """
+    if total == 0 or quantidade <= 0:
+        return []
+    result, resposta = mail.fetch(f"{max(1, total - quantidade + 1)}:{total}", "(UID)")
+    if result != "OK":
+        raise RuntimeError(f"Falha no FETCH: {result}")
+    return sorted(_uids_da_resposta(resposta))
+
+
+def uids_novos(mail, ultimo_uid):
+    """UIDs maiores que `ultimo_uid` (mensagens que chegaram desde a última sincronização)."""
+    result, data = mail.uid("SEARCH", None, f"UID {ultimo_uid + 1}:*")
+    if result != "OK":
+        raise RuntimeError(f"Falha no UID SEARCH: {result}")
+    # "n:*" sempre inclui a última mensagem, mesmo que seu UID seja menor que n
+    return sorted(u for u in (int(i) for i in data[0].split()) if u > ultimo_uid)
+
+
+def conjunto_sequencia(ids) -> str:
+    """Compacta ids (números de sequência ou UIDs) em um sequence set (ex.: [1, 2, 3, 7] -> '1:3,7')."""
+    numeros = sorted(int(i) for i in ids)
+    faixas = []
+    inicio = anterior = numeros[0]
+    for n in numeros[1:]:
+        if n != anterior + 1:
+            faixas.append(f"{inicio}:{anterior}" if inicio != anterior else str(inicio))
+            inicio = n
+        anterior = n
+    faixas.append(f"{inicio}:{anterior}" if inicio != anterior else str(inicio))
+    return ",".join(faixas)
+
+
+def _fetch_por_uid(mail, uids, itens):
+    """UID FETCH em um único comando; retorna {uid: conteúdo do literal}."""
+    result, resposta = mail.uid("FETCH", conjunto_sequencia(uids), itens)
+    if result != "OK":
+        raise RuntimeError(f"Falha no UID FETCH: {result}")
+
+    por_uid = {}
+    literal = None
+    for item in resposta:
+        if isinstance(item, tuple):
+            cabecalho, literal = item
+        else:
+            # O servidor pode enviar o UID depois do literal: "... {n}" literal " UID 42)"
+            cabecalho = item
+        uid = re.search(rb"UID (\d+)", cabecalho or b"")
+        if uid and literal is not None:
+            por_uid[int(uid.group(1))] = literal
+            literal = None
+    return por_uid
+
+
+def buscar_message_ids(mail, uids):
+    """Busca apenas o cabeçalho Message-ID de cada UID. Retorna {uid: message_id ou None}."""
+    if not uids:
+        return {}
+    cabecalhos = _fetch_por_uid(mail, uids, "(UID BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])")
+    message_ids = {}
+    for uid in uids:
+        valor = email.message_from_bytes(cabecalhos.get(uid) or b"").get("Message-ID")
+        message_ids[uid] = valor.strip() if valor else None
+    return message_ids
+
+
+def buscar_partes_texto(mail, uids):
+    """
+    Download parcial: um UID FETCH de BODYSTRUCTURE para escolher a parte de texto de cada mensagem
+    e um UID FETCH de BODY.PEEK[parte]<0.N> por número de parte (normalmente um ou dois).
+    Retorna, na ordem dos UIDs, tuplas (subtipo, encoding, charset, conteúdo truncado) ou None
+    quando a mensagem não tem parte de texto.
+    """
+    result, resposta = mail.uid("FETCH", conjunto_sequencia(uids), "(UID BODYSTRUCTURE)")
+    if result != "OK":
+        raise RuntimeError(f"Falha no UID FETCH: {result}")
+
+    partes = {}
+    for linha in linhas_fetch(resposta):
+        uid = re.search(rb"UID (\d+)", linha)
+        if uid:
+            partes[int(uid.group(1))] = escolher_parte_texto(parse_bodystructure(linha))
+
+    # Agrupa os UIDs pelo número da parte para buscar cada grupo em um único comando
+    por_parte = {}
+    for uid, parte in partes.items():
+        if parte:
+            por_parte.setdefault(parte[0], []).append(uid)
+
+    conteudos = {}
+    for numero, grupo in por_parte.items():
+        conteudos.update(_fetch_por_uid(mail, grupo, f"(UID BODY.PEEK[{numero}]<0.{IMAP_FETCH_MAX_BYTES}>)"))
+
+    itens = []
+    for uid in uids:
+        parte = partes.get(int(uid))
+        conteudo = conteudos.get(int(uid))
+        itens.append((parte[1], parte[2], parte[3], conteudo) if parte and conteudo else None)
+    return itens
+
+
+def buscar_mensagens(mail, uids):
+    """
+    Baixa as mensagens dos UIDs recebidos, na mesma ordem, conforme IMAP_FETCH_MODE:
+    partes de texto truncadas (parcial) ou bytes RFC822 completos, com um único UID FETCH
+    (BODY.PEEK não marca as mensagens como lidas).
+    """
+    if not uids:
+        return []
+    if IMAP_FETCH_MODE == "parcial":
+        return buscar_partes_texto(mail, uids)
+    por_uid = _fetch_por_uid(mail, uids, "(UID BODY.PEEK[])")
+    return [por_uid.get(int(u)) for u in uids]
+
+
+def extrair_corpos(raws) -> list[str]:
+    """
+    Corpos limpos das mensagens, na ordem de `raws`. Lotes grandes (INBOX_PROCESS_MIN_MESSAGES) são
+    distribuídos entre INBOX_WORKERS processos; os demais são extraídos na thread atual.
+    """
+    if INBOX_WORKERS > 1 and len(raws) >= INBOX_PROCESS_MIN_MESSAGES:
+        return list(_get_process_pool().map(extrair_bruto, raws, chunksize=16))
+    return [extrair_bruto(raw) for raw in raws]
+
+
+def iterar_mensagens(raws, remetente, app, user_id=None):
+    """
+    Pipeline em estágios para uma lista de mensagens baixadas por buscar_mensagens:
+    1. extração do corpo (parsing MIME ou decodificação da parte de texto), ver extrair_corpos;
+    2. pré-processamento de todos os corpos em lote (preprocess_batch);
+    3. reuso de quase-duplicatas do usuário, classificação (em lote) e respostas com concorrência
+       limitada (ver iterar_classificacoes).
+    Gera tuplas (indice, corpo, categoria, resposta, confiança, erro) na ordem original, assim que cada
+    email fica pronto. Emails sem corpo são gerados com corpo vazio e sem categoria.
+    """
+    corpos = extrair_corpos(raws)
+    validos = [corpo for corpo in corpos if corpo]
+    resultados = iterar_classificacoes(list(zip(validos, preprocess_batch(validos))), remetente, app, user_id)
+    for indice, corpo in enumerate(corpos):
+        if not corpo:
+            yield indice, corpo, None, None, None, None
+            continue
+        _, categoria, resposta, confianca, erro = next(resultados)
+        yield indice, corpo, categoria, resposta, confianca, erro
+
@@ -0,0 +1,20 @@
+import email
+
+from bodystructure import decodificar_parte
+from email_body import extrair_corpo, limpar_corpo
+
+# Extração do corpo das mensagens da caixa de entrada. Fica fora de inbox.py para que os processos do
+# pool de parsing (spawn) importem só este módulo, sem o classificador, o spaCy e o banco.
+
+
+def extrair_bruto(item):
+    """
+    Etapa de CPU: extração do corpo em texto, a partir da mensagem RFC822 completa ou de uma
+    parte de texto baixada no modo parcial (tupla (subtipo, encoding, charset, conteúdo)).
+    """
+    if not item:
+        return ""
+    if isinstance(item, tuple):
+        subtipo, encoding, charset, conteudo = item
+        return limpar_corpo(decodificar_parte(conteudo, encoding, charset), html=subtipo == "html")
+    return extrair_corpo(email.message_from_bytes(item))
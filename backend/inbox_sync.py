@@ -0,0 +1,89 @@
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from imap_pool import com_caixa_entrada
+from inbox import IMAP_MAILBOX, buscar_mensagens, buscar_message_ids, selecionar_caixa, uids_novos, uids_recentes
+from models import EmailRecord, InboxSyncState
+
+
+def planejar_sincronizacao(mail, user_id: int, quantidade: int):
+    """
+    Decide quais mensagens da caixa de entrada precisam ser classificadas.
+    - Primeira sincronização (ou UIDVALIDITY diferente): as últimas `quantidade` mensagens.
+    - Demais: apenas mensagens com UID acima da marca salva, das mais antigas para as mais novas e
+      limitadas a `quantidade`. A marca só avança até o último UID considerado, então o que passar do
+      limite fica para a próxima sincronização (nenhuma mensagem nova fica abaixo da marca sem ser classificada).
+    Mensagens cujo Message-ID já foi classificado para o usuário são descartadas antes do download.
+    Retorna (uids a baixar, {uid: message_id}, (uidvalidity, último UID considerado)).
+    """
+    total, uidvalidity = selecionar_caixa(mail)
+    estado = db.session.get(InboxSyncState, (user_id, IMAP_MAILBOX))
+
+    if estado is None or estado.uidvalidity != uidvalidity:
+        uids = uids_recentes(mail, total, quantidade)
+        ultimo_uid = 0
+    else:
+        uids = uids_novos(mail, estado.last_uid)[:quantidade] if quantidade > 0 else []
+        ultimo_uid = estado.last_uid
+
+    message_ids = buscar_message_ids(mail, uids)
+    conhecidos = ja_classificados(user_id, [m for m in message_ids.values() if m])
+
+    pendentes = []
+    for uid in uids:
+        message_id = message_ids[uid]
+        if message_id:
+            if message_id in conhecidos:
+                continue
+            conhecidos.add(message_id)
+        pendentes.append(uid)
+
+    return pendentes, message_ids, (uidvalidity, max(uids, default=ultimo_uid))
+
+
+def baixar_novas(user, quantidade: int):
+    """
+    Planeja a sincronização e baixa as mensagens pendentes (um único UID FETCH) em uma sessão
+    IMAP do pool do usuário, devolvida antes da classificação.
+    Retorna (uids, {uid: message_id}, (uidvalidity, último UID), mensagens brutas na ordem dos uids).
+    """
+    def sincronizar(mail):
+        uids, message_ids, marca = planejar_sincronizacao(mail, user.id, quantidade)
+        return uids, message_ids, marca, buscar_mensagens(mail, uids)
+
+    return com_caixa_entrada(user, sincronizar)
+
+
+def ja_classificados(user_id: int, message_ids) -> set:
+    """Message-IDs que já possuem EmailRecord do usuário."""
+    if not message_ids:
+        return set()
+    linhas = db.session.query(EmailRecord.message_id).filter(
+        EmailRecord.user_id == user_id, EmailRecord.message_id.in_(message_ids)
+    )
+    return {message_id for (message_id,) in linhas}
+
+
+def avancar_marca(user_id: int, uidvalidity: int, ultimo_uid: int):
+    """Atualiza a marca d'água do usuário. Não faz commit: deve ir na mesma transação dos registros."""
+    estado = db.session.get(InboxSyncState, (user_id, IMAP_MAILBOX))
+    if estado is None:
+        estado = InboxSyncState(user_id=user_id, mailbox=IMAP_MAILBOX)
+        db.session.add(estado)
+    elif estado.uidvalidity == uidvalidity:
+        ultimo_uid = max(ultimo_uid, estado.last_uid)
+    estado.uidvalidity = uidvalidity
+    estado.last_uid = ultimo_uid
+
+
+def adicionar_sem_duplicar(registro: EmailRecord) -> bool:
+    """
+    Adiciona o registro em um savepoint. Se outra sincronização concorrente já gravou o mesmo
+    Message-ID, a restrição única falha e o registro é descartado. Retorna se foi adicionado.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.add(registro)
+        return True
+    except IntegrityError:
+        return False
@@ -0,0 +1,95 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database import db
+from inbox import iterar_mensagens
+from inbox_sync import adicionar_sem_duplicar, avancar_marca, baixar_novas
+from models import EmailRecord, InboxJob, User
+
+# Quantidade de jobs de caixa de entrada executados simultaneamente por processo
+JOB_WORKERS = int(os.getenv("INBOX_JOB_WORKERS", 2))
+
+# Executor em background: os jobs rodam fora das threads que atendem requisições
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="inbox-job")
+
+
+def submeter_job_inbox(app, user_id: int, quantidade: int) -> InboxJob:
+    """Registra um job de classificação da caixa de entrada e o agenda no executor."""
+    job = InboxJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        status="pendente",
+        quantity=quantidade,
+        items=[]
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _executor.submit(_executar_job, app, job.id)
+    return job
+
+
+def _atualizar_item(job, indice, **campos):
+    # Reatribui a lista para o SQLAlchemy detectar a alteração na coluna JSON
+    itens = list(job.items)
+    itens[indice] = {**itens[indice], **campos}
+    job.items = itens
+
+
+def _executar_job(app, job_id: str):
+    """Executa o job: busca as mensagens e persiste cada resultado assim que fica pronto."""
+    with app.app_context():
+        job = db.session.get(InboxJob, job_id)
+        user = db.session.get(User, job.user_id)
+
+        job.status = "executando"
+        db.session.commit()
+
+        try:
+            uids, message_ids, (uidvalidity, ultimo_uid), raws = baixar_novas(user, job.quantity)
+
+            job.total = len(uids)
+            job.items = [{"email_id": str(uid), "status": "pendente"} for uid in uids]
+            db.session.commit()
+
+            primeira_falha = None
+            for indice, corpo, categoria, resposta, confianca, erro in iterar_mensagens(raws, user.nome, app, user.id):
+                if erro is not None:
+                    _atualizar_item(job, indice, status="erro", error=str(erro))
+                    primeira_falha = uids[indice] if primeira_falha is None else primeira_falha
+                elif not corpo:
+                    _atualizar_item(job, indice, status="ignorado")
+                else:
+                    registro = EmailRecord(
+                        user_id=user.id,
+                        email_text=corpo,
+                        classification=categoria,
+                        suggested_response=resposta,
+                        confidence=confianca,
+                        message_id=message_ids[uids[indice]]
+                    )
+                    if adicionar_sem_duplicar(registro):
+                        _atualizar_item(job, indice, status="classificado", id=registro.id, categoria=categoria,
+                                        confidence=confianca)
+                    else:
+                        _atualizar_item(job, indice, status="ignorado")
+
+                # Resultado parcial e progresso gravados juntos, a cada mensagem
+                job.processed += 1
+                db.session.commit()
+
+            # A marca para antes da primeira mensagem com erro, para que ela seja tentada de novo;
+            # as seguintes, já gravadas, são descartadas pelo Message-ID
+            avancar_marca(user.id, uidvalidity, ultimo_uid if primeira_falha is None else primeira_falha - 1)
+            job.status = "concluido"
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro no job {job_id} da caixa de entrada: {str(e)}")
+            job.status = "erro"
+            job.error = str(e)
+
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
@@ -0,0 +1,198 @@
+import os
+import threading
+import zlib
+
+import numpy as np
+from pdfminer.high_level import extract_text
+
+from models import EmailRecord
+from preprocess import preprocess_batch
+
+# Configuração do classificador local (sobrescrevível via variáveis de ambiente)
+LOCAL_CLASSIFIER_PATH = os.getenv(
+    "LOCAL_CLASSIFIER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "local_classifier.npz")
+)
+# Confiança mínima para responder sem consultar o Gemini
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", 0.9))
+# Dimensão do espaço de features (hashing trick)
+N_FEATURES = 2 ** 18
+
+CATEGORIAS = ("Improdutivo", "Produtivo")
+
+# Casos de teste rotulados pelo nome do arquivo (produtivo.txt, improdutivo.pdf, ...)
+CASOS_TESTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "casos_teste")
+
+
+def _indices_hash(texto_limpo: str) -> np.ndarray:
+    """Mapeia unigramas e bigramas do texto pré-processado para índices do espaço de features."""
+    tokens = texto_limpo.split()
+    termos = tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+    # crc32 é estável entre processos (ao contrário de hash(), que usa salt)
+    return np.fromiter(
+        (zlib.crc32(t.encode("utf-8")) % N_FEATURES for t in termos), dtype=np.int64, count=len(termos)
+    )
+
+
+def _vetorizar(texto_limpo: str, idf: np.ndarray):
+    """Vetor TF-IDF esparso (índices, valores) normalizado pela norma L2."""
+    indices, contagens = np.unique(_indices_hash(texto_limpo), return_counts=True)
+    valores = (1.0 + np.log(contagens)) * idf[indices]
+    norma = np.linalg.norm(valores)
+    if norma > 0:
+        valores = valores / norma
+    return indices, valores
+
+
+class LocalClassifier:
+    """
+    Modelo linear (regressão logística) sobre bag-of-words com hashing e TF-IDF.
+    A inferência é um produto escalar esparso em NumPy; o treino usa gradiente descendente
+    em lote, com pesos por classe para compensar desbalanceamento.
+    """
+
+    def __init__(self, pesos: np.ndarray, vies: float, idf: np.ndarray):
+        self.pesos = pesos
+        self.vies = vies
+        self.idf = idf
+
+    def prob_produtivo(self, texto_limpo: str) -> float:
+        indices, valores = _vetorizar(texto_limpo, self.idf)
+        z = float(self.pesos[indices] @ valores) + self.vies
+        return float(1.0 / (1.0 + np.exp(-z)))
+
+    def prever(self, texto_limpo: str) -> tuple[str, float]:
+        """Retorna (categoria, confiança), com a confiança em [0.5, 1]."""
+        p = self.prob_produtivo(texto_limpo)
+        return (CATEGORIAS[1], p) if p >= 0.5 else (CATEGORIAS[0], 1.0 - p)
+
+    @classmethod
+    def treinar(cls, textos_limpos, categorias, epocas: int = 300, taxa: float = 1.0, l2: float = 1e-4):
+        amostras = [(t, c) for t, c in zip(textos_limpos, categorias) if t.strip() and c in CATEGORIAS]
+        rotulos = np.array([CATEGORIAS.index(c) for _, c in amostras], dtype=np.float64)
+        if len(set(rotulos)) < 2:
+            raise ValueError("São necessários exemplos das duas categorias para treinar o classificador local")
+
+        # IDF suavizado a partir da frequência de documentos de cada feature
+        df = np.zeros(N_FEATURES)
+        for texto, _ in amostras:
+            df[np.unique(_indices_hash(texto))] += 1
+        n = len(amostras)
+        idf = np.log((1 + n) / (1 + df)) + 1.0
+
+        # Matriz esparsa em formato CSR (índices, valores e início de cada linha)
+        linhas = [_vetorizar(texto, idf) for texto, _ in amostras]
+        indices = np.concatenate([i for i, _ in linhas])
+        valores = np.concatenate([v for _, v in linhas])
+        tamanhos = np.array([len(i) for i, _ in linhas])
+        inicios = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+
+        # Peso por amostra inversamente proporcional à frequência da classe
+        positivos = rotulos.sum()
+        peso_amostra = np.where(rotulos == 1, n / (2 * positivos), n / (2 * (n - positivos)))
+
+        pesos = np.zeros(N_FEATURES)
+        vies = 0.0
+        for _ in range(epocas):
+            z = np.add.reduceat(pesos[indices] * valores, inicios) + vies
+            erro = (1.0 / (1.0 + np.exp(-z)) - rotulos) * peso_amostra
+            gradiente = np.zeros(N_FEATURES)
+            np.add.at(gradiente, indices, valores * np.repeat(erro, tamanhos))
+            pesos -= taxa * (gradiente / n + l2 * pesos)
+            vies -= taxa * erro.mean()
+
+        return cls(pesos, vies, idf)
+
+    def salvar(self, caminho: str = LOCAL_CLASSIFIER_PATH):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        np.savez_compressed(caminho, pesos=self.pesos, vies=np.array([self.vies]), idf=self.idf)
+
+    @classmethod
+    def carregar(cls, caminho: str = LOCAL_CLASSIFIER_PATH):
+        dados = np.load(caminho)
+        return cls(dados["pesos"], float(dados["vies"][0]), dados["idf"])
+
+
+_modelo = None
+_modelo_carregado = False
+_lock = threading.Lock()
+
+
+def get_modelo():
+    """Carrega o modelo salvo em disco na primeira chamada. Retorna None se não houver modelo treinado."""
+    global _modelo, _modelo_carregado
+    if not _modelo_carregado:
+        with _lock:
+            if not _modelo_carregado:
+                if os.path.exists(LOCAL_CLASSIFIER_PATH):
+                    try:
+                        _modelo = LocalClassifier.carregar()
+                    except Exception as e:
+                        print(f"Erro ao carregar classificador local: {str(e)}")
+                _modelo_carregado = True
+    return _modelo
+
+
+def definir_modelo(modelo):
+    """Substitui o modelo em uso neste processo (ex.: logo após um novo treino)."""
+    global _modelo, _modelo_carregado
+    with _lock:
+        _modelo = modelo
+        _modelo_carregado = True
+
+
+def classificar_local(texto_limpo: str, limiar: float = LOCAL_CLASSIFIER_THRESHOLD):
+    """
+    Classifica com o modelo local quando a confiança supera `limiar` (LOCAL_CLASSIFIER_THRESHOLD por padrão;
+    0 aceita qualquer previsão, como no fallback com o Gemini indisponível).
+    Retorna (categoria, confiança), ou None quando o email deve seguir para o Gemini.
+    """
+    modelo = get_modelo()
+    if modelo is None or not texto_limpo.strip():
+        return None
+    categoria, confianca = modelo.prever(texto_limpo)
+    return (categoria, round(confianca, 4)) if confianca >= limiar else None
+
+
+def carregar_exemplos_rotulados():
+    """
+    Reúne os exemplos de treino: o histórico de EmailRecord (exige contexto de aplicação)
+    e os arquivos de casos_teste. Retorna (textos_originais, categorias).
+    """
+    textos, categorias = [], []
+
+    for registro in EmailRecord.query.filter(EmailRecord.classification.in_(CATEGORIAS)).yield_per(500):
+        textos.append(registro.email_text)
+        categorias.append(registro.classification)
+
+    if os.path.isdir(CASOS_TESTE_DIR):
+        for nome in sorted(os.listdir(CASOS_TESTE_DIR)):
+            caminho = os.path.join(CASOS_TESTE_DIR, nome)
+            rotulo = "Improdutivo" if nome.lower().startswith("improdutivo") else (
+                "Produtivo" if nome.lower().startswith("produtivo") else None)
+            if rotulo is None:
+                continue
+            if nome.lower().endswith(".txt"):
+                with open(caminho, encoding="utf-8", errors="ignore") as f:
+                    textos.append(f.read())
+            elif nome.lower().endswith(".pdf"):
+                textos.append(extract_text(caminho))
+            else:
+                continue
+            categorias.append(rotulo)
+
+    return textos, categorias
+
+
+def treinar_do_historico() -> dict:
+    """Treina o classificador local com os exemplos rotulados, salva em disco e passa a usá-lo."""
+    textos, categorias = carregar_exemplos_rotulados()
+    modelo = LocalClassifier.treinar(preprocess_batch(textos), categorias)
+    modelo.salvar()
+    definir_modelo(modelo)
+    return {
+        "exemplos": len(textos),
+        "produtivos": categorias.count("Produtivo"),
+        "improdutivos": categorias.count("Improdutivo"),
+        "caminho": LOCAL_CLASSIFIER_PATH,
+    }
@@ -0,0 +1,34 @@
+"""Cria tabela classification_cache
+
+Revision ID: 3f9a1c2d7e41
+Revises: b5eb46019409
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2d7e41'
+down_revision = 'b5eb46019409'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('classification_cache',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('classification', sa.String(length=50), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+    with op.batch_alter_table('classification_cache', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_classification_cache_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('classification_cache', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_classification_cache_created_at'))
+
+    op.drop_table('classification_cache')
@@ -0,0 +1,28 @@
+"""Índices em email_records para classification e created_at
+
+Revision ID: 5a7d3e9f1b60
+Revises: d41f6a0b2c87
+Create Date: 2026-10-18 12:03:51.208447
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7d3e9f1b60'
+down_revision = 'd41f6a0b2c87'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_email_records_classification'), ['classification'], unique=False)
+        batch_op.create_index(batch_op.f('ix_email_records_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_email_records_created_at'))
+        batch_op.drop_index(batch_op.f('ix_email_records_classification'))
@@ -0,0 +1,42 @@
+"""Cria tabela inbox_jobs
+
+Revision ID: 8c2e5b7a9d13
+Revises: 3f9a1c2d7e41
+Create Date: 2026-10-18 10:04:17.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2e5b7a9d13'
+down_revision = '3f9a1c2d7e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inbox_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('items', sa.JSON(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('inbox_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_inbox_jobs_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('inbox_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_inbox_jobs_user_id'))
+
+    op.drop_table('inbox_jobs')
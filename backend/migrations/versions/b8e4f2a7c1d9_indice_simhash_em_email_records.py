@@ -0,0 +1,39 @@
+"""Índice SimHash de quase-duplicatas em email_records
+
+Revision ID: b8e4f2a7c1d9
+Revises: f3a8d2c6e915
+Create Date: 2026-10-18 17:52:31.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e4f2a7c1d9'
+down_revision = 'f3a8d2c6e915'
+branch_labels = None
+depends_on = None
+
+BANDAS = range(4)
+
+
+def upgrade():
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('simhash', sa.BigInteger(), nullable=True))
+        for banda in BANDAS:
+            batch_op.add_column(sa.Column(f'simhash_band_{banda}', sa.Integer(), nullable=True))
+        for banda in BANDAS:
+            batch_op.create_index(f'ix_email_records_user_id_simhash_band_{banda}',
+                                  ['user_id', f'simhash_band_{banda}'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        for banda in BANDAS:
+            batch_op.drop_index(f'ix_email_records_user_id_simhash_band_{banda}')
+        batch_op.drop_column('simhash_band_3')
+        batch_op.drop_column('simhash_band_2')
+        batch_op.drop_column('simhash_band_1')
+        batch_op.drop_column('simhash_band_0')
+        batch_op.drop_column('simhash')
@@ -0,0 +1,41 @@
+"""Sincronização incremental IMAP: inbox_sync_state e message_id em email_records
+
+Revision ID: c62d8e1f4a97
+Revises: a9c3f1e6b2d4
+Create Date: 2026-10-18 15:03:37.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c62d8e1f4a97'
+down_revision = 'a9c3f1e6b2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inbox_sync_state',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('mailbox', sa.String(length=255), nullable=False),
+    sa.Column('uidvalidity', sa.BigInteger(), nullable=False),
+    sa.Column('last_uid', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'mailbox')
+    )
+
+    # Registros já existentes ficam sem message_id (NULL não conflita na restrição única)
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('message_id', sa.String(length=998), nullable=True))
+        batch_op.create_unique_constraint('uq_email_records_user_id_message_id', ['user_id', 'message_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_email_records_user_id_message_id', type_='unique')
+        batch_op.drop_column('message_id')
+
+    op.drop_table('inbox_sync_state')
@@ -0,0 +1,32 @@
+"""Adiciona confidence em email_records e classification_cache
+
+Revision ID: d41f6a0b2c87
+Revises: 8c2e5b7a9d13
+Create Date: 2026-10-18 11:21:06.774310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f6a0b2c87'
+down_revision = '8c2e5b7a9d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('confidence', sa.Float(), nullable=True))
+
+    with op.batch_alter_table('classification_cache', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('confidence', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('classification_cache', schema=None) as batch_op:
+        batch_op.drop_column('confidence')
+
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.drop_column('confidence')
@@ -0,0 +1,26 @@
+"""Adiciona edited em email_records (resposta editada pelo usuário)
+
+Revision ID: d7a1c5e3f802
+Revises: b8e4f2a7c1d9
+Create Date: 2026-10-18 21:14:52.318406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a1c5e3f802'
+down_revision = 'b8e4f2a7c1d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('edited', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.drop_column('edited')
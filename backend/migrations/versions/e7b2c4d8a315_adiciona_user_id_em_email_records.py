@@ -0,0 +1,56 @@
+"""Adiciona user_id em email_records com índice (user_id, created_at)
+
+Revision ID: e7b2c4d8a315
+Revises: 5a7d3e9f1b60
+Create Date: 2026-10-18 13:40:12.664085
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b2c4d8a315'
+down_revision = '5a7d3e9f1b60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_email_records_user_id_users', 'users', ['user_id'], ['id'])
+        batch_op.create_index('ix_email_records_user_id_created_at', ['user_id', 'created_at'], unique=False)
+
+    # Backfill onde a posse é conhecida
+    conn = op.get_bind()
+
+    # 1. Registros criados por jobs da caixa de entrada pertencem ao dono do job
+    jobs = conn.execute(sa.text("SELECT user_id, items FROM inbox_jobs")).fetchall()
+    for user_id, items in jobs:
+        if isinstance(items, str):
+            items = json.loads(items)
+        ids = [item["id"] for item in items or [] if isinstance(item, dict) and item.get("id")]
+        if ids:
+            conn.execute(
+                sa.text("UPDATE email_records SET user_id = :user_id WHERE user_id IS NULL AND id IN :ids")
+                .bindparams(sa.bindparam("ids", expanding=True)),
+                {"user_id": user_id, "ids": ids}
+            )
+
+    # 2. Com um único usuário cadastrado, todos os registros restantes são dele
+    usuarios = conn.execute(sa.text("SELECT id FROM users")).fetchall()
+    if len(usuarios) == 1:
+        conn.execute(
+            sa.text("UPDATE email_records SET user_id = :user_id WHERE user_id IS NULL"),
+            {"user_id": usuarios[0][0]}
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('email_records', schema=None) as batch_op:
+        batch_op.drop_index('ix_email_records_user_id_created_at')
+        batch_op.drop_constraint('fk_email_records_user_id_users', type_='foreignkey')
+        batch_op.drop_column('user_id')
@@ -0,0 +1,37 @@
+"""Cria tabela reply_cache
+
+Revision ID: f3a8d2c6e915
+Revises: c62d8e1f4a97
+Create Date: 2026-10-18 16:41:09.227310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8d2c6e915'
+down_revision = 'c62d8e1f4a97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reply_cache',
+    sa.Column('cache_key', sa.String(length=64), nullable=False),
+    sa.Column('classification', sa.String(length=50), nullable=False),
+    sa.Column('sender', sa.String(length=120), nullable=False),
+    sa.Column('response', sa.Text(), nullable=False),
+    sa.Column('edited', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('cache_key')
+    )
+    with op.batch_alter_table('reply_cache', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_reply_cache_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reply_cache', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_reply_cache_created_at'))
+
+    op.drop_table('reply_cache')
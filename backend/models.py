@@ -6,11 +6,33 @@ from werkzeug.security import check_password_hash, generate_password_hash
 class EmailRecord(db.Model):
     __tablename__ = 'email_records'
     """Modelo para armazenar emails classificados"""
+    # Consultas por usuário (listagem, exclusão) ficam restritas às linhas do próprio usuário
+    __table_args__ = (
+        db.Index('ix_email_records_user_id_created_at', 'user_id', 'created_at'),
+        # Um mesmo email da caixa de entrada (Message-ID) nunca é classificado duas vezes para o usuário
+        db.UniqueConstraint('user_id', 'message_id', name='uq_email_records_user_id_message_id'),
+        # Índice de quase-duplicatas (SimHash em 4 bandas de 16 bits, ver similarity.py)
+        db.Index('ix_email_records_user_id_simhash_band_0', 'user_id', 'simhash_band_0'),
+        db.Index('ix_email_records_user_id_simhash_band_1', 'user_id', 'simhash_band_1'),
+        db.Index('ix_email_records_user_id_simhash_band_2', 'user_id', 'simhash_band_2'),
+        db.Index('ix_email_records_user_id_simhash_band_3', 'user_id', 'simhash_band_3'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     email_text = db.Column(db.Text, nullable=False)
-    classification = db.Column(db.String(50), nullable=False)
+    classification = db.Column(db.String(50), nullable=False, index=True)
     suggested_response = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    confidence = db.Column(db.Float, nullable=True)
+    message_id = db.Column(db.String(998), nullable=True)
+    # Resposta sugerida editada pelo usuário (tem preferência no reuso de quase-duplicatas)
+    edited = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Preenchidos automaticamente no insert (similarity.py)
+    simhash = db.Column(db.BigInteger, nullable=True)
+    simhash_band_0 = db.Column(db.Integer, nullable=True)
+    simhash_band_1 = db.Column(db.Integer, nullable=True)
+    simhash_band_2 = db.Column(db.Integer, nullable=True)
+    simhash_band_3 = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     def __repr__(self):
         return f"<EmailRecord {self.id} - {self.classification}>"
@@ -32,3 +54,112 @@ class User(db.Model):
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
+
+
+class ClassificationCacheEntry(db.Model):
+    __tablename__ = 'classification_cache'
+    """Modelo para o cache persistente de classificações (chave: hash do texto pré-processado)"""
+    content_hash = db.Column(db.String(64), primary_key=True)
+    classification = db.Column(db.String(50), nullable=False)
+    confidence = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ClassificationCacheEntry {self.content_hash[:12]} - {self.classification}>"
+
+
+class ReplyCacheEntry(db.Model):
+    __tablename__ = 'reply_cache'
+    """Modelo para o cache persistente de respostas (chave: categoria + hash do texto pré-processado + remetente)"""
+    cache_key = db.Column(db.String(64), primary_key=True)
+    classification = db.Column(db.String(50), nullable=False)
+    sender = db.Column(db.String(120), nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    # Respostas editadas pelo usuário não expiram
+    edited = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ReplyCacheEntry {self.cache_key[:12]} - {self.classification}>"
+
+
+class InboxJob(db.Model):
+    __tablename__ = 'inbox_jobs'
+    """Modelo para jobs assíncronos de classificação da caixa de entrada"""
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    quantity = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    items = db.Column(db.JSON, nullable=False, default=list)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "quantidade": self.quantity,
+            "total": self.total,
+            "processados": self.processed,
+            "itens": self.items,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<InboxJob {self.id} - {self.status}>"
+
+
+class InboxSyncState(db.Model):
+    __tablename__ = 'inbox_sync_state'
+    """Modelo para a marca d'água da sincronização IMAP de cada usuário (último UID visto por UIDVALIDITY)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    mailbox = db.Column(db.String(255), primary_key=True)
+    uidvalidity = db.Column(db.BigInteger, nullable=False)
+    last_uid = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<InboxSyncState {self.user_id} {self.mailbox} - {self.uidvalidity}:{self.last_uid}>"
+
+
+class OutboundEmail(db.Model):
+    __tablename__ = 'outbound_emails'
+    """Modelo para a fila persistente de emails de saída (outbox)"""
+    __table_args__ = (
+        db.Index('ix_outbound_emails_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_outbound_emails_sender_sent_at', 'sender', 'sent_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    sender = db.Column(db.String(120), nullable=False)
+    recipient = db.Column(db.String(320), nullable=False)
+    subject = db.Column(db.String(998), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "to": self.recipient,
+            "subject": self.subject,
+            "status": self.status,
+            "attempts": self.attempts,
+            "next_attempt_at": self.next_attempt_at.isoformat() if self.status == 'pendente' else None,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat(),
+            "sent_at": self.sent_at.isoformat() if self.sent_at else None,
+        }
+
+    def __repr__(self):
+        return f"<OutboundEmail {self.id} - {self.status}>"
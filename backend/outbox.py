@@ -0,0 +1,180 @@
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from sqlalchemy import and_, func, or_
+
+from database import db
+from models import OutboundEmail, User
+from smtp_pool import enviar_varios
+
+# Workers que drenam a fila em cada processo
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 1))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 5))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+# Mensagens "enviando" há mais tempo que isso são consideradas abandonadas (ex.: processo reiniciado)
+OUTBOX_LOCK_TIMEOUT = timedelta(seconds=int(os.getenv("OUTBOX_LOCK_TIMEOUT", 600)))
+
+# Retentativas com backoff exponencial: base * 2^tentativas (+ jitter), até o máximo de tentativas
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 6))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 30))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", 3600))
+
+# Limites por conta remetente (padrões compatíveis com as cotas de envio do Gmail)
+OUTBOX_RATE_PER_MINUTE = int(os.getenv("OUTBOX_RATE_PER_MINUTE", 20))
+OUTBOX_RATE_PER_DAY = int(os.getenv("OUTBOX_RATE_PER_DAY", 500))
+
+_acordar = threading.Event()
+_lock = threading.Lock()
+_pid_workers = None
+
+
+def enfileirar_email(remetente: str, destinatario: str, assunto: str, corpo: str, user_id=None,
+                     commit: bool = True) -> OutboundEmail:
+    """
+    Registra um email na outbox. Com user_id, o envio usa as credenciais SMTP do usuário;
+    sem ele, usa a conta do sistema (SMTP_SENDER_EMAIL/SMTP_SENDER_PASSWORD).
+    """
+    mensagem = OutboundEmail(
+        user_id=user_id,
+        sender=remetente,
+        recipient=destinatario,
+        subject=assunto,
+        body=corpo,
+        status="pendente",
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(mensagem)
+    if commit:
+        db.session.commit()
+        _acordar.set()
+    return mensagem
+
+
+def notificar():
+    """Acorda os workers para processar mensagens recém-enfileiradas."""
+    _acordar.set()
+
+
+def garantir_workers(app):
+    """
+    Inicia os workers da outbox neste processo, se ainda não estiverem rodando.
+    Verifica o PID porque threads não sobrevivem ao fork dos workers do servidor.
+    """
+    global _pid_workers
+    if _pid_workers == os.getpid() or OUTBOX_WORKERS <= 0:
+        return
+    with _lock:
+        if _pid_workers == os.getpid():
+            return
+        for numero in range(OUTBOX_WORKERS):
+            threading.Thread(target=_loop, args=(app,), name=f"outbox-{numero}", daemon=True).start()
+        _pid_workers = os.getpid()
+
+
+def _loop(app):
+    while True:
+        _acordar.wait(OUTBOX_POLL_INTERVAL)
+        _acordar.clear()
+        with app.app_context():
+            try:
+                while _processar_lote():
+                    pass
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erro no worker da outbox: {str(e)}")
+
+
+def _backoff(tentativas: int) -> timedelta:
+    atraso = min(OUTBOX_BACKOFF_BASE * (2 ** (tentativas - 1)), OUTBOX_BACKOFF_MAX)
+    return timedelta(seconds=atraso * random.uniform(0.8, 1.2))
+
+
+def _reservar_lote(agora):
+    """Reserva mensagens prontas para envio. SKIP LOCKED evita que dois workers peguem a mesma linha."""
+    mensagens = (
+        OutboundEmail.query
+        .filter(or_(
+            and_(OutboundEmail.status == "pendente", OutboundEmail.next_attempt_at <= agora),
+            and_(OutboundEmail.status == "enviando", OutboundEmail.locked_at < agora - OUTBOX_LOCK_TIMEOUT),
+        ))
+        .order_by(OutboundEmail.next_attempt_at)
+        .limit(OUTBOX_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for mensagem in mensagens:
+        mensagem.status = "enviando"
+        mensagem.locked_at = agora
+    db.session.commit()
+    return mensagens
+
+
+def _envios_desde(remetente: str, desde) -> int:
+    return (
+        db.session.query(func.count(OutboundEmail.id))
+        .filter(OutboundEmail.sender == remetente, OutboundEmail.status == "enviado", OutboundEmail.sent_at >= desde)
+        .scalar()
+    )
+
+
+def _credenciais(mensagem):
+    if mensagem.user_id is None:
+        return os.getenv("SMTP_SENDER_EMAIL"), os.getenv("SMTP_SENDER_PASSWORD")
+    user = db.session.get(User, mensagem.user_id)
+    return mensagem.sender, user.smtp_password if user else None
+
+
+def _processar_lote() -> bool:
+    """Envia um lote da outbox. Retorna False quando não há mais nada pronto para envio."""
+    agora = datetime.utcnow()
+    mensagens = _reservar_lote(agora)
+    if not mensagens:
+        return False
+
+    chave = lambda m: (m.sender, m.user_id or 0)
+    for _, grupo in groupby(sorted(mensagens, key=chave), key=chave):
+        grupo = list(grupo)
+
+        # Respeita os limites da conta: o que exceder volta para a fila
+        disponiveis = max(0, min(
+            OUTBOX_RATE_PER_MINUTE - _envios_desde(grupo[0].sender, agora - timedelta(minutes=1)),
+            OUTBOX_RATE_PER_DAY - _envios_desde(grupo[0].sender, agora - timedelta(days=1)),
+        ))
+        adiadas = grupo[disponiveis:]
+        grupo = grupo[:disponiveis]
+        for mensagem in adiadas:
+            mensagem.status = "pendente"
+            mensagem.locked_at = None
+            mensagem.next_attempt_at = agora + timedelta(minutes=1)
+
+        if not grupo:
+            continue
+
+        usuario, senha = _credenciais(grupo[0])
+        try:
+            # Uma única sessão SMTP autenticada para todas as mensagens da conta
+            erros = enviar_varios(usuario, senha, [(m.recipient, m.subject, m.body) for m in grupo])
+        except Exception as e:
+            erros = [e] * len(grupo)
+
+        for mensagem, erro in zip(grupo, erros):
+            mensagem.locked_at = None
+            if erro is None:
+                mensagem.status = "enviado"
+                mensagem.sent_at = datetime.utcnow()
+                mensagem.last_error = None
+                continue
+            mensagem.attempts += 1
+            mensagem.last_error = str(erro)
+            if mensagem.attempts >= OUTBOX_MAX_ATTEMPTS:
+                mensagem.status = "falhou"
+            else:
+                mensagem.status = "pendente"
+                mensagem.next_attempt_at = datetime.utcnow() + _backoff(mensagem.attempts)
+
+    db.session.commit()
+    return True
@@ -1,27 +1,159 @@
+import gc
+import hashlib
+import os
+import threading
+import time
+
 import nltk, spacy
 from nltk.corpus import stopwords
-from nltk.stem import RSLPStemmer
 
-# Faz o download dos recursos necessários do NLTK: tokenizador e stopwords
-nltk.download('punkt')
-nltk.download('punkt_tab')
-nltk.download('stopwords')
-nltk.download('rslp')
+from utils import LRUCache
+
+# Diretório local com os recursos do NLTK; são baixados uma única vez (python preprocess.py),
+# nunca durante a inicialização da aplicação
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data"))
+if NLTK_DATA_DIR not in nltk.data.path:
+    nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+RECURSOS_NLTK = ['stopwords']
+SPACY_MODEL = os.getenv("SPACY_MODEL", "pt_core_news_md")
+# Componentes do spaCy que não são usados na lematização
+COMPONENTES_DESATIVADOS = ["parser", "ner"]
+
+# Processamento em lote com nlp.pipe: processos e tamanho de lote
+PREPROCESS_N_PROCESS = int(os.getenv("PREPROCESS_N_PROCESS", 1))
+PREPROCESS_BATCH_SIZE = int(os.getenv("PREPROCESS_BATCH_SIZE", 64))
+# Memoização de entradas repetidas (newsletters, felicitações, avisos automáticos), pelo sha256 do texto;
+# resultados maiores que PREPROCESS_CACHE_MAX_CHARS não são guardados, para limitar a memória por worker
+PREPROCESS_CACHE_SIZE = int(os.getenv("PREPROCESS_CACHE_SIZE", 4096))
+PREPROCESS_CACHE_MAX_CHARS = int(os.getenv("PREPROCESS_CACHE_MAX_CHARS", 8000))
+
+_lock = threading.Lock()
+_stop_words = None
+_nlp_spacy = None
+_memo = LRUCache(PREPROCESS_CACHE_SIZE)
+
+# Tempo (em segundos) gasto para carregar cada recurso neste processo
+tempos_carregamento = {}
+
+
+def baixar_recursos():
+    """Baixa para NLTK_DATA_DIR os recursos do NLTK e instala o modelo spaCy, se ainda não estiver instalado."""
+    for recurso in RECURSOS_NLTK:
+        nltk.download(recurso, download_dir=NLTK_DATA_DIR, quiet=True)
+    if not spacy.util.is_package(SPACY_MODEL):
+        from spacy.cli import download
+        download(SPACY_MODEL)
+
+
+def _carregar(nome, carregador):
+    inicio = time.perf_counter()
+    try:
+        recurso = carregador()
+    except LookupError:
+        raise LookupError(f"Recurso '{nome}' não encontrado em {NLTK_DATA_DIR}. Execute: python preprocess.py")
+    tempos_carregamento[nome] = round(time.perf_counter() - inicio, 3)
+    print(f"Recurso de NLP '{nome}' carregado em {tempos_carregamento[nome]}s")
+    return recurso
+
+
+def get_stop_words():
+    """Conjunto de stopwords em português, carregado na primeira chamada."""
+    global _stop_words
+    if _stop_words is None:
+        with _lock:
+            if _stop_words is None:
+                _stop_words = _carregar("stopwords", lambda: set(stopwords.words('portuguese')))
+    return _stop_words
+
+
+def get_nlp():
+    """Pipeline spaCy para português, carregado na primeira chamada sem os componentes não usados."""
+    global _nlp_spacy
+    if _nlp_spacy is None:
+        with _lock:
+            if _nlp_spacy is None:
+                _nlp_spacy = _carregar(SPACY_MODEL, lambda: spacy.load(SPACY_MODEL, disable=COMPONENTES_DESATIVADOS))
+    return _nlp_spacy
+
+
+def preload():
+    """
+    Carrega todos os recursos de NLP no processo atual. Em servidores com fork (gunicorn com
+    preload_app), chamar antes de criar os workers faz com que o modelo seja compartilhado
+    entre eles por copy-on-write. gc.freeze evita que o coletor de lixo toque nessas páginas.
+    """
+    get_stop_words()
+    get_nlp()
+    gc.collect()
+    gc.freeze()
+    return dict(tempos_carregamento)
+
+
+def status_carregamento() -> dict:
+    """Resumo do estado dos recursos de NLP para monitoramento (cold start)."""
+    return {
+        "carregado": _nlp_spacy is not None,
+        "tempos_carregamento_s": dict(tempos_carregamento),
+    }
+
+
+def _lemas(doc, stop_words) -> str:
+    # Uma única tokenização (a do spaCy): mantém palavras alfabéticas que não são stopwords
+    return " ".join(token.lemma_ for token in doc if token.is_alpha and token.lower_ not in stop_words)
+
+
+def _chave_memo(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _memorizar(chave: str, resultado: str):
+    if len(resultado) <= PREPROCESS_CACHE_MAX_CHARS:
+        _memo.set(chave, resultado)
 
-# Cria um conjunto de stopwords em português
-stop_words = set(stopwords.words('portuguese'))
-# Inicializa o stemmer para português
-stemmer = RSLPStemmer()
-# Carrega o modelo de linguagem spaCy para português
-nlp_spacy = spacy.load("pt_core_news_md")
 
 def preprocess_pt(text):
-    # Tokenização
-    tokens = nltk.word_tokenize(text.lower(), language='portuguese')
-    tokens = [t for t in tokens if t.isalpha() and t not in stop_words]
-    # Stemming com NLTK
-    stems = [stemmer.stem(t) for t in tokens]
-    # Lematização com spaCy
-    doc = nlp_spacy(" ".join(tokens))
-    lemmas = [token.lemma_ for token in doc]
-    return " ".join(lemmas)
+    chave = _chave_memo(text)
+    resultado = _memo.get(chave)
+    if resultado is None:
+        resultado = _lemas(get_nlp()(text.lower()), get_stop_words())
+        _memorizar(chave, resultado)
+    return resultado
+
+
+def preprocess_batch(texts, n_process: int = PREPROCESS_N_PROCESS, batch_size: int = PREPROCESS_BATCH_SIZE):
+    """
+    Pré-processa vários textos de uma vez com nlp.pipe. Entradas repetidas ou já vistas
+    são resolvidas pela memoização; as demais passam uma única vez pelo pipeline.
+    Retorna os textos pré-processados na ordem de entrada.
+    """
+    resultados = {}
+    pendentes = []
+    for text in texts:
+        if text in resultados:
+            continue
+        memorizado = _memo.get(_chave_memo(text))
+        resultados[text] = memorizado
+        if memorizado is None:
+            pendentes.append(text)
+
+    if pendentes:
+        stop_words = get_stop_words()
+        docs = get_nlp().pipe(
+            (text.lower() for text in pendentes),
+            n_process=n_process if len(pendentes) > 1 else 1,
+            batch_size=batch_size
+        )
+        for text, doc in zip(pendentes, docs):
+            resultados[text] = _lemas(doc, stop_words)
+            _memorizar(_chave_memo(text), resultados[text])
+
+    return [resultados[text] for text in texts]
+
+
+if __name__ == "__main__":
+    # Prepara o ambiente: baixa os recursos e mede o tempo de carregamento a frio
+    baixar_recursos()
+    inicio = time.perf_counter()
+    preload()
+    print(f"Cold start dos recursos de NLP: {time.perf_counter() - inicio:.3f}s {tempos_carregamento}")
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, or_, select
+
+from classification_cache import chave_conteudo, identificadores
+from database import db
+from models import ReplyCacheEntry
+from utils import LRUCache
+
+# Configuração do cache de respostas (sobrescrevível via variáveis de ambiente)
+REPLY_CACHE_MAX_ITENS = int(os.getenv("REPLY_CACHE_SIZE", 1024))
+REPLY_CACHE_TTL_SEGUNDOS = int(os.getenv("REPLY_CACHE_TTL", 30 * 24 * 3600))
+
+
+def chave_resposta(categoria: str, texto_limpo: str, texto_original: str, remetente: str, user_id: int = None) -> str:
+    """
+    Chave do cache: categoria, impressão digital do texto pré-processado (chave_conteudo), números e
+    códigos do texto original, dono da conta e remetente. Os identificadores entram porque o
+    pré-processamento os descarta: "contrato 123" e "contrato 456" não podem dividir a mesma resposta.
+    Com o user_id, a resposta editada por um usuário não vaza para outra conta de mesmo nome de exibição.
+    """
+    dono = "" if user_id is None else str(user_id)
+    numeros = ",".join(sorted(identificadores(texto_original)))
+    partes = f"{categoria}|{chave_conteudo(texto_limpo)}|{numeros}|{dono}|{remetente.strip().lower()}"
+    return hashlib.sha256(partes.encode("utf-8")).hexdigest()
+
+
+class ReplyCache:
+    """
+    Cache de respostas geradas em dois níveis (memória LRU e tabela reply_cache), como o
+    ClassificationCache. Respostas editadas pelo usuário substituem a entrada e não expiram.
+    """
+
+    def __init__(self, max_itens: int = REPLY_CACHE_MAX_ITENS, ttl_segundos: int = REPLY_CACHE_TTL_SEGUNDOS):
+        self.ttl_segundos = ttl_segundos
+        self.memoria = LRUCache(max_itens, ttl_segundos)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.templates = 0
+
+    def _contar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def get(self, chave: str):
+        """Retorna a resposta para a chave, ou None em caso de miss."""
+        resposta = self.memoria.get(chave)
+        if resposta is None:
+            try:
+                limite = datetime.utcnow() - timedelta(seconds=self.ttl_segundos)
+                # Conexão própria: não interfere na sessão da requisição
+                with db.engine.connect() as conn:
+                    resposta = conn.execute(
+                        select(ReplyCacheEntry.response)
+                        .where(ReplyCacheEntry.cache_key == chave)
+                        .where(or_(ReplyCacheEntry.created_at >= limite, ReplyCacheEntry.edited.is_(True)))
+                    ).scalar()
+            except Exception as e:
+                print(f"Erro ao consultar cache de respostas: {str(e)}")
+            if resposta is not None:
+                self.memoria.set(chave, resposta)
+
+        self._contar("hits" if resposta is not None else "misses")
+        return resposta
+
+    def set(self, chave: str, categoria: str, remetente: str, resposta: str, editada: bool = False):
+        try:
+            with db.engine.begin() as conn:
+                if not editada:
+                    # Uma resposta gerada nunca sobrescreve a edição do usuário
+                    editada_antes = conn.execute(
+                        select(ReplyCacheEntry.edited).where(ReplyCacheEntry.cache_key == chave)
+                    ).scalar()
+                    if editada_antes:
+                        return
+                conn.execute(delete(ReplyCacheEntry).where(ReplyCacheEntry.cache_key == chave))
+                conn.execute(insert(ReplyCacheEntry).values(
+                    cache_key=chave,
+                    classification=categoria,
+                    sender=remetente,
+                    response=resposta,
+                    edited=editada,
+                    created_at=datetime.utcnow()
+                ))
+        except Exception as e:
+            print(f"Erro ao gravar cache de respostas: {str(e)}")
+        self.memoria.set(chave, resposta)
+
+    def registrar_template(self):
+        """Conta uma resposta resolvida por template local (sem cache nem Gemini)."""
+        self._contar("templates")
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "respostas_por_template": self.templates,
+                "itens_memoria": len(self.memoria),
+                "max_itens_memoria": self.memoria.max_itens,
+                "ttl_segundos": self.ttl_segundos,
+            }
+
+
+# Instância única usada pela aplicação
+reply_cache = ReplyCache()
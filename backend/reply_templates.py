@@ -0,0 +1,58 @@
+import hashlib
+import os
+
+# Gera respostas para emails improdutivos localmente, a partir de modelos prontos, sem chamar o Gemini
+REPLY_TEMPLATES_IMPRODUTIVO = os.getenv("REPLY_TEMPLATES_IMPRODUTIVO", "true").lower() == "true"
+
+# Frases de agradecimento/retribuição por assunto (o formato segue o prompt de resposta improdutiva)
+FRASES_IMPRODUTIVO = {
+    "festas": [
+        "Agradecemos as felicitações e desejamos a você também boas festas e um próspero ano novo!",
+        "Muito obrigado pela mensagem! Retribuímos os votos de boas festas e de um excelente ano novo.",
+        "Agradecemos o carinho e desejamos a você e aos seus um período de festas repleto de alegrias.",
+    ],
+    "aniversario": [
+        "Muito obrigado pelas felicitações e pela lembrança!",
+        "Agradecemos de coração a mensagem de aniversário e o carinho.",
+    ],
+    "agradecimento": [
+        "Nós é que agradecemos! Ficamos à disposição sempre que precisar.",
+        "Ficamos felizes em ajudar. Conte conosco sempre que precisar!",
+        "Agradecemos o retorno e permanecemos à disposição.",
+    ],
+    "geral": [
+        "Agradecemos a sua mensagem e o contato.",
+        "Muito obrigado pela mensagem! Desejamos a você um ótimo dia.",
+        "Agradecemos o contato e retribuímos os votos.",
+    ],
+}
+
+# Lemas (saída do preprocess_pt) que indicam o assunto do email, verificados nesta ordem.
+# "agradecimento" vem antes de "festas" para que um obrigado com votos no final não vire felicitação.
+# Termos com espaço (ex.: "ano novo") só casam como bigrama: "ano" ou "novo" soltos são genéricos demais.
+PALAVRAS_ASSUNTO = {
+    "agradecimento": {"obrigar", "obrigado", "agradecer", "agradecimento", "grato", "gratidão", "apoio", "ajuda"},
+    "aniversario": {"aniversário", "aniversariar", "parabém", "parabéns"},
+    "festas": {"natal", "natalino", "ano novo", "páscoa", "festa", "réveillon"},
+}
+
+MODELO_RESPOSTA = "Prezado(a),\n\n{frase}\n\nAtenciosamente,\n{remetente}."
+
+
+def _assunto(texto_limpo: str) -> str:
+    tokens = texto_limpo.lower().split()
+    palavras = set(tokens) | {" ".join(par) for par in zip(tokens, tokens[1:])}
+    for assunto, chaves in PALAVRAS_ASSUNTO.items():
+        if palavras & chaves:
+            return assunto
+    return "geral"
+
+
+def renderizar_improdutivo(texto_limpo: str, remetente: str) -> str:
+    """
+    Monta a resposta de um email improdutivo com uma frase do assunto detectado.
+    A frase é escolhida pelo hash do texto: o mesmo email sempre recebe a mesma resposta.
+    """
+    frases = FRASES_IMPRODUTIVO[_assunto(texto_limpo)]
+    indice = int(hashlib.sha256(texto_limpo.encode("utf-8")).hexdigest(), 16) % len(frases)
+    return MODELO_RESPOSTA.format(frase=frases[indice], remetente=remetente)
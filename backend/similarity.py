@@ -0,0 +1,164 @@
+import hashlib
+import os
+from collections import Counter
+
+from sqlalchemy import event, or_
+
+from classification_cache import identificadores
+from database import db
+from models import EmailRecord
+from preprocess import preprocess_pt
+
+# SimHash de 64 bits dividido em 4 bandas de 16 bits (LSH): dois emails a distância de Hamming <= 3
+# têm pelo menos uma banda idêntica, então a busca só examina quem coincide em alguma banda (via índice)
+SIMHASH_BITS = 64
+SIMHASH_BANDAS = 4
+BITS_POR_BANDA = SIMHASH_BITS // SIMHASH_BANDAS
+DISTANCIA_MAXIMA_INDEXAVEL = SIMHASH_BANDAS - 1
+
+# Distância máxima para reaproveitar classificação e resposta de um email anterior (negativo desativa o reuso)
+SIMHASH_REUSE_DISTANCE = min(int(os.getenv("SIMHASH_REUSE_DISTANCE", 3)), DISTANCIA_MAXIMA_INDEXAVEL)
+# Limite de candidatos examinados por busca (emails que coincidem em alguma banda)
+SIMHASH_MAX_CANDIDATOS = int(os.getenv("SIMHASH_MAX_CANDIDATES", 500))
+
+COLUNAS_BANDA = [EmailRecord.simhash_band_0, EmailRecord.simhash_band_1,
+                 EmailRecord.simhash_band_2, EmailRecord.simhash_band_3]
+
+
+def _hash_feature(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(texto_limpo: str) -> int | None:
+    """
+    SimHash de 64 bits da saída do preprocess_pt (lemas sem stopwords), com cada termo ponderado
+    pela frequência. Só unigramas: bigramas dobram o peso de cada palavra trocada e afastam
+    demais emails curtos que diferem só em um nome ou número.
+    """
+    features = Counter(texto_limpo.lower().split())
+    if not features:
+        return None
+
+    pesos = [0] * SIMHASH_BITS
+    for feature, peso in features.items():
+        h = _hash_feature(feature)
+        for bit in range(SIMHASH_BITS):
+            pesos[bit] += peso if h >> bit & 1 else -peso
+    return sum(1 << bit for bit, peso in enumerate(pesos) if peso > 0)
+
+
+def bandas(valor: int) -> list[int]:
+    mascara = (1 << BITS_POR_BANDA) - 1
+    return [valor >> (BITS_POR_BANDA * i) & mascara for i in range(SIMHASH_BANDAS)]
+
+
+def _para_coluna(valor: int) -> int:
+    # BIGINT é com sinal: guarda os 64 bits em complemento de dois
+    return valor - (1 << 64) if valor >= 1 << 63 else valor
+
+
+def _da_coluna(valor: int) -> int:
+    return valor + (1 << 64) if valor < 0 else valor
+
+
+def distancia(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def indexar(registro: EmailRecord, texto_limpo: str):
+    """Preenche o SimHash e as bandas do registro (o índice é atualizado junto com o insert)."""
+    valor = simhash(texto_limpo)
+    registro.simhash = _para_coluna(valor) if valor is not None else None
+    for i, banda in enumerate(bandas(valor) if valor is not None else [None] * SIMHASH_BANDAS):
+        setattr(registro, f"simhash_band_{i}", banda)
+
+
+@event.listens_for(EmailRecord, "before_insert")
+def _indexar_ao_inserir(mapper, connection, registro):
+    # Indexação incremental: todo EmailRecord novo entra no índice. O preprocess_pt é memoizado,
+    # então o texto que acabou de ser classificado não é processado de novo
+    if registro.simhash is None and registro.email_text:
+        indexar(registro, preprocess_pt(registro.email_text))
+
+
+def buscar_similares(user_id: int, valor: int, max_distancia: int = DISTANCIA_MAXIMA_INDEXAVEL,
+                     limite: int = 10, excluir_id: int = None):
+    """
+    Emails do usuário a até `max_distancia` bits do SimHash `valor`, do mais parecido ao menos.
+    Só examina os registros que coincidem em alguma banda (consulta pelos índices (user_id, banda)).
+    Retorna pares (id, distância).
+    """
+    filtros = [coluna == banda for coluna, banda in zip(COLUNAS_BANDA, bandas(valor))]
+    consulta = db.session.query(EmailRecord.id, EmailRecord.simhash).filter(EmailRecord.user_id == user_id,
+                                                                            or_(*filtros))
+    if excluir_id is not None:
+        consulta = consulta.filter(EmailRecord.id != excluir_id)
+
+    encontrados = []
+    for registro_id, candidato in consulta.order_by(EmailRecord.id.desc()).limit(SIMHASH_MAX_CANDIDATOS):
+        d = distancia(valor, _da_coluna(candidato))
+        if d <= max_distancia:
+            encontrados.append((registro_id, d))
+    encontrados.sort(key=lambda item: item[1])
+    return encontrados[:limite]
+
+
+def similares_do_registro(registro: EmailRecord, max_distancia: int = DISTANCIA_MAXIMA_INDEXAVEL,
+                          limite: int = 10):
+    """Emails do mesmo usuário parecidos com o registro (que não entra no resultado). Retorna pares (id, distância)."""
+    if registro.simhash is not None:
+        valor = _da_coluna(registro.simhash)
+    else:
+        # Registro anterior ao índice (ainda não indexado por `flask indexar-similares`)
+        valor = simhash(preprocess_pt(registro.email_text))
+    if not valor:
+        return []
+    return buscar_similares(registro.user_id, valor, max_distancia, limite, excluir_id=registro.id)
+
+
+def reaproveitar_similar(user_id: int, texto_limpo: str, texto_original: str):
+    """
+    Procura um email anterior do usuário quase idêntico (até SIMHASH_REUSE_DISTANCE bits) e
+    retorna (categoria, resposta, confiança) dele, ou None. Um registro cuja resposta foi editada
+    pelo usuário (edited) tem preferência sobre os demais, mesmo que uma quase-duplicata mais
+    recente ou mais próxima tenha recebido uma resposta gerada.
+    O SimHash ignora números, então um email Produtivo só é reaproveitado se tiver os mesmos
+    identificadores (números de contrato, chamado etc.) do email novo; Improdutivos não têm essa exigência.
+    """
+    if user_id is None or SIMHASH_REUSE_DISTANCE < 0:
+        return None
+    valor = simhash(texto_limpo)
+    if valor is None:
+        return None
+    encontrados = buscar_similares(user_id, valor, SIMHASH_REUSE_DISTANCE)
+    if not encontrados:
+        return None
+    ids = [registro_id for registro_id, _ in encontrados]
+    registros = {r.id: r for r in EmailRecord.query.filter(EmailRecord.id.in_(ids))}
+    candidatos = [registros[registro_id] for registro_id in ids if registro_id in registros]
+    novos = identificadores(texto_original)
+    candidatos = [r for r in candidatos
+                  if r.classification == "Improdutivo" or identificadores(r.email_text) == novos]
+    if not candidatos:
+        return None
+    # sorted é estável: entre os editados (e entre os demais) mantém a ordem por distância
+    registro = sorted(candidatos, key=lambda r: not r.edited)[0]
+    return registro.classification, registro.suggested_response, registro.confidence
+
+
+def indexar_pendentes(tamanho_lote: int = 500) -> int:
+    """Indexa os registros antigos sem SimHash (backfill). Retorna a quantidade indexada."""
+    from preprocess import preprocess_batch
+
+    total = 0
+    while True:
+        registros = EmailRecord.query.filter(EmailRecord.simhash.is_(None)).limit(tamanho_lote).all()
+        if not registros:
+            return total
+        for registro, texto_limpo in zip(registros, preprocess_batch([r.email_text or "" for r in registros])):
+            indexar(registro, texto_limpo)
+            if registro.simhash is None:
+                # Texto sem palavras: marca com 0 para não voltar à fila
+                registro.simhash = 0
+        db.session.commit()
+        total += len(registros)
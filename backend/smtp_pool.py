@@ -0,0 +1,112 @@
+import os
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from connection_pool import ConnectionPool
+
+# Servidor SMTP (configurável para apontar para um servidor local de testes, ex.: aiosmtpd)
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
+
+# Política do pool de conexões SMTP
+SMTP_POOL_IDLE_TIMEOUT = float(os.getenv("SMTP_POOL_IDLE_TIMEOUT", 120))
+SMTP_POOL_HEALTH_CHECK_APOS = float(os.getenv("SMTP_POOL_HEALTH_CHECK_AFTER", 5))
+SMTP_POOL_MAX_POR_USUARIO = int(os.getenv("SMTP_POOL_MAX_PER_USER", 2))
+SMTP_POOL_MAX_TOTAL = int(os.getenv("SMTP_POOL_MAX_TOTAL", 20))
+
+# Erros que indicam conexão perdida: vale reconectar e tentar de novo
+ERROS_CONEXAO = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class SMTPPool(ConnectionPool):
+    """Pool de sessões SMTP já autenticadas (STARTTLS + login feitos uma vez por conexão)."""
+
+    def _conectar(self, credenciais):
+        usuario, senha = credenciais
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        try:
+            if SMTP_STARTTLS:
+                server.starttls()
+            if senha:
+                server.login(usuario, senha)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _saudavel(self, conexao) -> bool:
+        try:
+            return conexao.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _fechar(self, conexao):
+        try:
+            conexao.quit()
+        except (smtplib.SMTPException, OSError):
+            conexao.close()
+
+
+smtp_pool = SMTPPool(
+    idle_timeout=SMTP_POOL_IDLE_TIMEOUT,
+    health_check_apos=SMTP_POOL_HEALTH_CHECK_APOS,
+    max_por_chave=SMTP_POOL_MAX_POR_USUARIO,
+    max_total=SMTP_POOL_MAX_TOTAL
+)
+
+
+def montar_mensagem(remetente: str, destinatario: str, assunto: str, corpo: str) -> str:
+    msg = MIMEMultipart()
+    msg["From"] = remetente
+    msg["To"] = destinatario
+    msg["Subject"] = assunto
+    msg.attach(MIMEText(corpo, "plain"))
+    return msg.as_string()
+
+
+def validar_credenciais(usuario: str, senha: str):
+    """Abre uma sessão nova (fora do pool) só para testar o login. Levanta exceção se falhar."""
+    server = smtp_pool._conectar((usuario, senha))
+    smtp_pool._fechar(server)
+
+
+def enviar_varios(usuario: str, senha: str, mensagens):
+    """
+    Envia várias mensagens pela mesma sessão autenticada do pool.
+    `mensagens` são tuplas (destinatario, assunto, corpo). Se a conexão cair no meio,
+    reconecta e tenta a mensagem atual mais uma vez. Retorna uma lista com None (enviada)
+    ou a exceção de cada mensagem, na ordem de entrada. Falhas de login são propagadas.
+    """
+    mensagens = list(mensagens)
+    resultados = []
+    chave = (SMTP_HOST, usuario)
+    indice = 0
+    reconectou = False
+
+    while indice < len(mensagens):
+        try:
+            with smtp_pool.conexao(chave, (usuario, senha)) as server:
+                while indice < len(mensagens):
+                    destinatario, assunto, corpo = mensagens[indice]
+                    try:
+                        server.sendmail(usuario, destinatario, montar_mensagem(usuario, destinatario, assunto, corpo))
+                        resultados.append(None)
+                    except ERROS_CONEXAO:
+                        raise
+                    except smtplib.SMTPException as e:
+                        # Erro da mensagem (ex.: destinatário recusado): a sessão continua válida
+                        resultados.append(e)
+                    indice += 1
+                    reconectou = False
+        except ERROS_CONEXAO as e:
+            # A conexão já foi descartada pelo pool; a próxima volta do laço abre outra
+            if reconectou:
+                resultados.append(e)
+                indice += 1
+            reconectou = not reconectou
+
+    return resultados
+
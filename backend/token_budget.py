@@ -0,0 +1,66 @@
+import os
+import re
+
+from email_body import remover_citacoes
+
+# Limite de tokens do texto do email enviado em cada tipo de chamada ao LLM
+# (o restante do prompt — instruções e exemplos — não entra nessa conta)
+LIMITES_TOKENS = {
+    "classificacao": int(os.getenv("GEMINI_MAX_TOKENS_CLASSIFY", 1500)),
+    "lote_item": int(os.getenv("GEMINI_MAX_TOKENS_BATCH_ITEM", 600)),
+    "resposta": int(os.getenv("GEMINI_MAX_TOKENS_REPLY", 3000)),
+    "combinado": int(os.getenv("GEMINI_MAX_TOKENS_COMBINED", 3000)),
+}
+# Fração do orçamento mantida do início do texto; o restante vem do final
+PROPORCAO_INICIO = float(os.getenv("GEMINI_TRUNCATE_HEAD_RATIO", 0.7))
+MARCADOR_CORTE = "\n[...]\n"
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa aproximada de tokens (cerca de 4 caracteres por token em português)."""
+    return len(texto) // 4 + 1
+
+
+def _cortar_em_palavra(texto: str, limite: int, do_final: bool = False) -> str:
+    """Corta o texto em até `limite` caracteres sem partir palavras."""
+    if do_final:
+        trecho = texto[-limite:]
+        espaco = re.search(r"\s", trecho)
+        return trecho[espaco.end():] if espaco and espaco.start() < limite // 4 else trecho
+    trecho = texto[:limite]
+    espaco = max(trecho.rfind(" "), trecho.rfind("\n"))
+    return trecho[:espaco] if espaco > limite * 3 // 4 else trecho
+
+
+def truncar(texto: str, max_tokens: int) -> str:
+    """
+    Ajusta o texto ao orçamento de tokens. Primeiro descarta o histórico citado (respostas
+    anteriores, encaminhamentos e assinatura); se ainda não couber, mantém o início e o final
+    do texto — onde costumam estar o pedido e o fechamento — e corta o meio.
+    """
+    if estimar_tokens(texto) <= max_tokens:
+        return texto
+
+    texto = remover_citacoes(texto) or texto
+    if estimar_tokens(texto) <= max_tokens:
+        return texto
+
+    caracteres = max_tokens * 4 - len(MARCADOR_CORTE)
+    inicio = int(caracteres * PROPORCAO_INICIO)
+    return (_cortar_em_palavra(texto, inicio) + MARCADOR_CORTE
+            + _cortar_em_palavra(texto, caracteres - inicio, do_final=True))
+
+
+def ajustar(texto: str, chamada: str) -> str:
+    """Aplica ao texto o limite configurado para o tipo de chamada (ver LIMITES_TOKENS)."""
+    return truncar(texto, LIMITES_TOKENS[chamada])
+
+
+def registrar_uso(chamada: str, resp, tokens_estimados: int = None):
+    """Registra no log os tokens de entrada e saída informados pelo Gemini (usage_metadata) para a chamada."""
+    uso = getattr(resp, "usage_metadata", None)
+    entrada = getattr(uso, "prompt_token_count", None)
+    saida = getattr(uso, "candidates_token_count", None)
+    total = getattr(uso, "total_token_count", None)
+    estimativa = f" estimado_texto={tokens_estimados}" if tokens_estimados is not None else ""
+    print(f"Uso de tokens [{chamada}]: entrada={entrada} saida={saida} total={total}{estimativa}")
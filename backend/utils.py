@@ -1,24 +1,161 @@
-from pdfminer.high_level import extract_text  
+import email
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from pdfminer.high_level import extract_pages
+from pdfminer.layout import LTTextContainer
+
+from email_body import extrair_corpo
+
+# Limites para arquivos enviados pelo usuário
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+# PDFs: páginas lidas no máximo e texto suficiente para classificar (a extração para ao atingi-lo)
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 20))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", 20000))
+# Tempo limite (s) da extração de PDF em um subprocesso; 0 extrai no próprio processo, sem limite
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", 0))
+
+
+class ArquivoInvalido(ValueError):
+    """Arquivo enviado acima dos limites ou cuja extração falhou/excedeu o tempo limite."""
+
+
+class LRUCache:
+    """
+    Cache em memória com limite de itens (LRU) e tempo de vida opcional por entrada.
+    Seguro para uso concorrente entre threads do servidor.
+    """
+
+    def __init__(self, max_itens: int, ttl_segundos: int | None = None):
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em is not None and expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor):
+        expira_em = time.monotonic() + self.ttl_segundos if self.ttl_segundos is not None else None
+        with self._lock:
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._itens)
+
+
+
+def _copiar_com_limite(origem, destino, limite: int = UPLOAD_MAX_BYTES):
+    """Copia o stream em blocos, sem carregá-lo inteiro na memória, falhando se passar do limite."""
+    copiados = 0
+    while True:
+        bloco = origem.read(64 * 1024)
+        if not bloco:
+            return copiados
+        copiados += len(bloco)
+        if copiados > limite:
+            raise ArquivoInvalido(f"Arquivo maior que o limite de {limite / (1024 * 1024):g} MB")
+        destino.write(bloco)
+
+
+def _ler_com_limite(origem, limite: int = UPLOAD_MAX_BYTES) -> bytes:
+    conteudo = origem.read(limite + 1)
+    if len(conteudo) > limite:
+        raise ArquivoInvalido(f"Arquivo maior que o limite de {limite / (1024 * 1024):g} MB")
+    return conteudo
+
+
+def extrair_texto_pdf(arquivo, max_paginas: int = PDF_MAX_PAGES, max_caracteres: int = PDF_MAX_CHARS) -> str:
+    """
+    Extrai o texto de um PDF (caminho ou arquivo binário) página a página, lendo no máximo
+    `max_paginas` e parando assim que houver `max_caracteres` de texto.
+    """
+    partes, total = [], 0
+    for pagina in extract_pages(arquivo, maxpages=max_paginas):
+        for elemento in pagina:
+            if isinstance(elemento, LTTextContainer):
+                texto = elemento.get_text()
+                partes.append(texto)
+                total += len(texto)
+        if total >= max_caracteres:
+            break
+    return "".join(partes)[:max_caracteres]
+
+
+def _extrair_pdf_no_subprocesso(caminho, fila):
+    try:
+        fila.put(("ok", extrair_texto_pdf(caminho)))
+    except Exception as e:
+        fila.put(("erro", str(e)))
+
+
+def _extrair_pdf_com_tempo_limite(caminho: str, tempo_limite: float) -> str:
+    """
+    Extrai o PDF em um subprocesso (spawn, sem herdar o estado do servidor) e o encerra se
+    passar do tempo limite, para que um PDF patológico não prenda o worker.
+    """
+    contexto = multiprocessing.get_context("spawn")
+    fila = contexto.Queue()
+    processo = contexto.Process(target=_extrair_pdf_no_subprocesso, args=(caminho, fila), daemon=True)
+    processo.start()
+    try:
+        # Lê o resultado antes do join: o subprocesso só termina depois de esvaziar a fila
+        status, resultado = fila.get(timeout=tempo_limite)
+    except queue.Empty:
+        processo.terminate()
+        raise ArquivoInvalido(f"Tempo limite de {tempo_limite:g}s excedido ao extrair o PDF")
+    finally:
+        processo.join()
+
+    if status == "erro":
+        raise ArquivoInvalido(f"Falha ao extrair o texto do PDF: {resultado}")
+    return resultado
 
 
 def extract_email_text(file_storage):
     """
     Extrai o texto de um arquivo enviado pelo usuário.
-    Suporta arquivos .txt e .pdf. Retorna string vazia para outros formatos.
+    Suporta arquivos .txt, .eml e .pdf, respeitando UPLOAD_MAX_BYTES. Retorna string vazia para
+    outros formatos e levanta ArquivoInvalido se o arquivo passar dos limites.
     """
     # Obtém o nome do arquivo em minúsculas
     filename = file_storage.filename.lower()
-    # Lê o conteúdo do arquivo em bytes
-    content = file_storage.read()
     # Se for um arquivo de texto simples (.txt), decodifica para string
     if filename.endswith(".txt"):
-        return content.decode('utf-8', errors='ignore')
-    # Se for um PDF, extrai o texto usando pdfminer
+        return _ler_com_limite(file_storage.stream).decode('utf-8', errors='ignore')
+    # Se for um email salvo (.eml), extrai o corpo como nas mensagens da caixa de entrada
+    elif filename.endswith(".eml"):
+        return extrair_corpo(email.message_from_bytes(_ler_com_limite(file_storage.stream)))
+    # Se for um PDF, copia para um arquivo temporário (sem carregá-lo na memória) e extrai o texto
     elif filename.endswith(".pdf"):
-        from io import BytesIO  
-        fluxo = BytesIO(content)
-        texto = extract_text(fluxo)  # Extrai o texto do PDF
-        return texto
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as temporario:
+            _copiar_com_limite(file_storage.stream, temporario)
+            temporario.flush()
+            if PDF_TIMEOUT > 0:
+                return _extrair_pdf_com_tempo_limite(temporario.name, PDF_TIMEOUT)
+            try:
+                return extrair_texto_pdf(temporario.name)
+            except Exception as e:
+                raise ArquivoInvalido(f"Falha ao extrair o texto do PDF: {str(e)}")
     # Para outros formatos, retorna string vazia
     else:
         return ""
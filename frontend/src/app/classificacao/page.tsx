@@ -63,15 +63,17 @@ export default function EmailClassifier() {
   const [isAutoClassifying, setIsAutoClassifying] = useState(false)
   const [autoClassifyError, setAutoClassifyError] = useState<string | null>(null)
   const [autoClassifySuccess, setAutoClassifySuccess] = useState<string | null>(null)
+  const [autoClassifyProgress, setAutoClassifyProgress] = useState<string | null>(null)
 
   const handleFileChange = (event: React.ChangeEvent<HTMLInputElement>) => {
     const file = event.target.files?.[0]
     if (file) {
-      if (file.type === "text/plain" || file.type === "application/pdf") {
+      // .eml costuma chegar como message/rfc822 ou sem tipo, então também olha a extensão
+      if (file.type === "text/plain" || file.type === "application/pdf" || file.name.toLowerCase().endsWith(".eml")) {
         setSelectedFile(file)
         setError(null)
       } else {
-        setError("Por favor, selecione apenas arquivos .txt ou .pdf")
+        setError("Por favor, selecione apenas arquivos .txt, .eml ou .pdf")
         setSelectedFile(null)
       }
     }
@@ -183,6 +185,7 @@ export default function EmailClassifier() {
         body: JSON.stringify({
           suggested_response: editedResponse,
         }),
+        credentials: "include",
       })
 
       if (!response.ok) {
@@ -243,7 +246,8 @@ export default function EmailClassifier() {
     setIsAutoClassifying(true)
     try {
       const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:5000"
-      const response = await fetch(`${backendUrl}/api/classificar-inbox`, {
+      // Versão em streaming (NDJSON): cada e-mail chega assim que é classificado
+      const response = await fetch(`${backendUrl}/api/classificar-inbox/stream?format=ndjson`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -252,13 +256,47 @@ export default function EmailClassifier() {
         credentials: "include", // Importante para enviar o cookie de sessão
       })
 
-      const data = await response.json()
-
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => ({}))
         throw new Error(data.error || "Erro ao classificar e-mails automaticamente.")
       }
 
-      setAutoClassifySuccess(data.message || `${data.classificados.length} e-mails classificados com sucesso!`)
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ""
+      let total = 0
+      let recebidos = 0
+      let resumo: { message?: string } | null = null
+      let erroFatal: string | null = null
+
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const linhas = buffer.split("\n")
+        buffer = linhas.pop() ?? ""
+
+        for (const linha of linhas) {
+          if (!linha.trim()) continue
+          const evento = JSON.parse(linha)
+          if (evento.tipo === "inicio") {
+            total = evento.total
+          } else if (evento.tipo === "email") {
+            recebidos += 1
+          } else if (evento.tipo === "erro" && evento.indice === undefined) {
+            erroFatal = evento.error
+          } else if (evento.tipo === "resumo") {
+            resumo = evento
+          }
+          setAutoClassifyProgress(`${recebidos} de ${total} e-mails classificados...`)
+        }
+      }
+
+      if (erroFatal) {
+        throw new Error(erroFatal)
+      }
+
+      setAutoClassifySuccess(resumo?.message || `${recebidos} e-mails classificados com sucesso!`)
       setTimeout(() => {
         setIsAutoClassifyModalOpen(false)
         setNumEmailsToClassify(5) // Reset para o valor padrão
@@ -271,6 +309,7 @@ export default function EmailClassifier() {
       setAutoClassifyError(err.message || "Erro de conexão ao classificar e-mails. Tente novamente.")
     } finally {
       setIsAutoClassifying(false)
+      setAutoClassifyProgress(null)
     }
   }
 
@@ -410,13 +449,13 @@ export default function EmailClassifier() {
                   <TabsContent value="file" className="space-y-4">
                     <div>
                       <Label htmlFor="file-upload" className="text-sm font-medium text-gray-800">
-                        Arquivo do Email (.txt ou .pdf)
+                        Arquivo do Email (.txt, .eml ou .pdf)
                       </Label>
                       <div className="mt-2">
                         <Input
                           id="file-upload"
                           type="file"
-                          accept=".txt,.pdf"
+                          accept=".txt,.eml,.pdf"
                           onChange={handleFileChange}
                           className="cursor-pointer bg-white border-gray-300 text-gray-900"
                         />
@@ -637,6 +676,11 @@ export default function EmailClassifier() {
                 <AlertDescription className="text-green-800">{autoClassifySuccess}</AlertDescription>
               </Alert>
             )}
+            {autoClassifyProgress && (
+              <Alert className="border-blue-200 bg-blue-50">
+                <AlertDescription className="text-blue-800">{autoClassifyProgress}</AlertDescription>
+              </Alert>
+            )}
             <div className="grid grid-cols-4 items-center gap-4">
               <Label htmlFor="num-emails" className="text-right text-gray-800">
                 Quantidade:
@@ -29,6 +29,9 @@ export default function RespostasSugeridas() {
   const [respostas, setRespostas] = useState<Resposta[]>([])
   const [loading, setLoading] = useState(true)
   const [erro, setErro] = useState<string | null>(null)
+  // Cursor da próxima página (header X-Next-Cursor do backend)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
 
   // Estados para o modal de encaminhamento
   const [isForwardModalOpen, setIsForwardModalOpen] = useState(false)
@@ -52,14 +55,23 @@ export default function RespostasSugeridas() {
   const [deleteAllError, setDeleteAllError] = useState<string | null>(null)
   const [deleteAllSuccess, setDeleteAllSuccess] = useState<string | null>(null)
 
+  const fetchPagina = async (cursor: string | null) => {
+    const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:5000"
+    const params = new URLSearchParams({ limit: "20" })
+    if (cursor) params.set("cursor", cursor)
+    const res = await fetch(`${backendUrl}/api/respostas?${params.toString()}`, {
+      credentials: "include", // As respostas são do usuário logado
+    })
+    if (!res.ok) throw new Error("Erro ao buscar respostas")
+    const data: Resposta[] = await res.json()
+    setNextCursor(res.headers.get("X-Next-Cursor"))
+    return data
+  }
+
   useEffect(() => {
     const fetchRespostas = async () => {
       try {
-        const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:5000"
-        const res = await fetch(`${backendUrl}/api/respostas`)
-        if (!res.ok) throw new Error("Erro ao buscar respostas")
-        const data = await res.json()
-        setRespostas(data)
+        setRespostas(await fetchPagina(null))
       } catch (err) {
         setErro("Não foi possível carregar as respostas.")
         console.error(err)
@@ -71,6 +83,20 @@ export default function RespostasSugeridas() {
     fetchRespostas()
   }, [])
 
+  const carregarMais = async () => {
+    if (!nextCursor) return
+    setIsLoadingMore(true)
+    try {
+      const data = await fetchPagina(nextCursor)
+      setRespostas((prev) => [...prev, ...data])
+    } catch (err) {
+      console.error("Erro ao carregar mais respostas:", err)
+      alert("Erro ao carregar mais respostas.")
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }
+
   const excluirResposta = async (id: number) => {
     const confirmado = confirm("Tem certeza que deseja excluir esta resposta?")
     if (!confirmado) return
@@ -79,6 +105,7 @@ export default function RespostasSugeridas() {
       const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:5000"
       const res = await fetch(`${backendUrl}/api/respostas/${id}`, {
         method: "DELETE",
+        credentials: "include",
       })
 
       if (!res.ok) {
@@ -175,6 +202,7 @@ export default function RespostasSugeridas() {
           "Content-Type": "application/json",
         },
         body: JSON.stringify({ nova_resposta: editedResponseText }),
+        credentials: "include",
       })
 
       if (!res.ok) {
@@ -218,6 +246,7 @@ export default function RespostasSugeridas() {
       const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:5000"
       const res = await fetch(`${backendUrl}/api/respostas`, {
         method: "DELETE",
+        credentials: "include",
       })
 
       if (!res.ok) {
@@ -226,6 +255,7 @@ export default function RespostasSugeridas() {
       }
 
       setRespostas([]) // Limpa todas as respostas no frontend
+      setNextCursor(null)
       setDeleteAllSuccess("Todas as respostas foram excluídas com sucesso!")
       setTimeout(() => {
         setDeleteAllSuccess(null)
@@ -354,6 +384,13 @@ export default function RespostasSugeridas() {
                 </Card>
               ))
             )}
+            {nextCursor && (
+              <div className="flex justify-center">
+                <Button variant="outline" onClick={carregarMais} disabled={isLoadingMore}>
+                  {isLoadingMore ? <Loader2 className="h-4 w-4 animate-spin" /> : "Carregar mais"}
+                </Button>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -51,6 +51,12 @@ cd backend
 echo -e "${BLUE}🐍 Instalando dependências Python...${NC}"
 pip3 install -r requirements.txt || { echo -e "${YELLOW}⚠️ Instalando com --user...${NC}"; pip3 install --user -r requirements.txt; }
 
+# 📚 Recursos de NLP (baixados uma única vez, nunca durante a inicialização do app)
+if [ ! -d "nltk_data" ]; then
+    echo -e "${BLUE}📚 Baixando recursos de NLP...${NC}"
+    python3 preprocess.py
+fi
+
 # 🌐 Variáveis Flask
 export FLASK_APP=backend.app:app
 export FLASK_ENV=development